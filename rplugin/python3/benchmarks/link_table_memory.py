@@ -0,0 +1,74 @@
+"""Measure the memory of parsed links with tracemalloc.
+
+Parses --lines synthetic lines of four links each and compares what the
+parse results hold on to:
+
+- links: a list of (line_num, Link), as iter_links_from_lines yields them
+- table: a LinkTable, the columns the index worker keeps and sends
+- columns: LinkTable.to_columns(), the json serializable lists the scan
+  cache stores
+
+The strings of the links are counted too, they are parsed while traced.
+
+Run from rplugin/python3:
+
+    python benchmarks/link_table_memory.py [--lines 25000]
+"""
+import argparse
+import gc
+import os.path as osp
+import random
+import sys
+import tracemalloc
+from typing import Any
+from typing import Callable
+
+sys.path.insert(0, osp.dirname(osp.dirname(osp.abspath(__file__))))
+
+from progirl.markdown import LinkTable  # noqa: E402
+from progirl.markdown import iter_links_from_lines  # noqa: E402
+
+
+def build_lines(line_count: int, seed: int) -> list[str]:
+    rnd = random.Random(seed)
+    return [
+            " ".join(f"see [note {rnd.randrange(3000)}]"
+                     f"(notes/n{rnd.randrange(3000)}.md) and"
+                     for _ in range(4))
+            for _ in range(line_count)
+    ]
+
+
+def traced_size(fn: Callable[[], Any]) -> tuple[int, Any]:
+    """Return the memory still allocated by `fn` when it returns, and its
+    result, which holds on to that memory."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = fn()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return size, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=25000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    lines = build_lines(args.lines, args.seed)
+    link_count = len(LinkTable.from_lines(lines))
+    print(f"{link_count} links on {len(lines)} lines")
+    for label, fn in (
+            ("links", lambda: list(iter_links_from_lines(lines))),
+            ("table", lambda: LinkTable.from_lines(lines)),
+            ("columns", lambda: LinkTable.from_lines(lines).to_columns()),
+    ):
+        size, _ = traced_size(fn)
+        print(f"  {label:<8} {size / 1e6:7.1f} MB"
+              f"  {size / link_count:6.1f} B/link")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Time the check_links rescan of a synthetic collection.
+
+Builds a collection of --notes notes, then times the worker's check_links
+op in this process:
+
+- no cache: every note is read, parsed and checked (an in memory cache)
+- cold: first scan with the on disk cache, which writes the cache
+- warm: nothing changed since the last scan
+- touched: every note got a new mtime but the same content, like after a
+  checkout or a sync
+
+Run from rplugin/python3:
+
+    python benchmarks/rescan.py [--notes 5000] [--dir DIR]
+"""
+import argparse
+import os
+import os.path as osp
+import random
+import shutil
+import sys
+import tempfile
+import time
+from typing import Callable
+
+sys.path.insert(0, osp.dirname(osp.dirname(osp.abspath(__file__))))
+
+from progirl.worker.server import _op_check_links  # noqa: E402
+
+_EXTENSION = ".md"
+_SUBDIRS = 20
+
+
+def _note_text(rnd: random.Random, notes: int, links: int) -> str:
+    lines = [f"# Note {rnd.randrange(notes)}", ""]
+    refs = []
+    for n in range(links):
+        # one in ten targets doesn't exist
+        target_num = rnd.randrange(notes + notes // 10)
+        target = f"../d{target_num % _SUBDIRS}/n{target_num}{_EXTENSION}"
+        if n % 4 == 0:
+            lines.append(f"see [note {target_num}][{n}] for more")
+            refs.append(f"[{n}]: {target}")
+        else:
+            lines.append(f"see [note {target_num}]({target}) for more")
+        if n % 8 == 0:
+            lines.append("<https://example.com/page>")
+    return "\n".join(lines + [""] + refs) + "\n"
+
+
+def build_collection(root: str, notes: int, links: int, seed: int) -> str:
+    rnd = random.Random(seed)
+    notes_path = osp.join(root, "notes")
+    for note_num in range(notes):
+        dir_path = osp.join(notes_path, f"d{note_num % _SUBDIRS}")
+        os.makedirs(dir_path, exist_ok=True)
+        with open(osp.join(dir_path, f"n{note_num}{_EXTENSION}"), "w") as f:
+            f.write(_note_text(rnd, notes, links))
+    return notes_path
+
+
+def touch_notes(notes_path: str):
+    for dir_path, _, filenames in os.walk(notes_path):
+        for filename in filenames:
+            path_str = osp.join(dir_path, filename)
+            mtime_ns = os.stat(path_str).st_mtime_ns + 1_000_000_000
+            os.utime(path_str, ns=(mtime_ns, mtime_ns))
+
+
+def _timed(label: str, fn: Callable[[], list]):
+    start = time.perf_counter()
+    broken = fn()
+    print(f"  {label:<10} {time.perf_counter() - start:7.2f} s"
+          f"  ({len(broken)} broken links)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notes", type=int, default=5000)
+    parser.add_argument("--links", type=int, default=80,
+                        help="links per note")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--dir", help="where to build (and keep) the "
+                        "collection, a temporary directory by default")
+    args = parser.parse_args()
+    root = args.dir or tempfile.mkdtemp(prefix="progirl-bench-")
+    try:
+        _run(root, args)
+    finally:
+        if args.dir is None:
+            shutil.rmtree(root)
+
+
+def _run(root: str, args: argparse.Namespace):
+    notes_path = build_collection(root, args.notes, args.links, args.seed)
+    print(f"{args.notes} notes, {args.links} links per note in {root}")
+    op_args = {
+            "notes_path": notes_path,
+            "extension": _EXTENSION,
+            "collections": {},
+    }
+    cached_args = dict(op_args, cache_dir=osp.join(root, ".pkb"))
+
+    def progress(done: int, total: int):
+        pass
+
+    _timed("no cache", lambda: _op_check_links(op_args, progress))
+    _timed("cold", lambda: _op_check_links(cached_args, progress))
+    _timed("warm", lambda: _op_check_links(cached_args, progress))
+    touch_notes(notes_path)
+    _timed("touched", lambda: _op_check_links(cached_args, progress))
+
+
+if __name__ == "__main__":
+    main()
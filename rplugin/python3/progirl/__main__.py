@@ -0,0 +1,3 @@
+from progirl.cli import main
+
+raise SystemExit(main())
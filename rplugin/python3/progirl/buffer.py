@@ -1,10 +1,87 @@
 import re
+from typing import Iterable
+from typing import Iterator
+from typing import NamedTuple
 from typing import Pattern
 
 import pynvim
 from pynvim.api import Buffer
 
 _VALID_PATH_PATTERN: Pattern = re.compile(r"^[\w./-]+$")
+# Lines are fetched in windows that start small and double in size so that
+# searches which stop early read only a few lines while full scans still
+# take few round trips.
+_MIN_CHUNK_SIZE = 16
+_MAX_CHUNK_SIZE = 1024
+
+
+class BufferMatch(NamedTuple):
+    line_num: int
+    pattern: Pattern
+    match: re.Match
+
+
+def _iter_chunk_bounds(start: int, end: int,
+                       reverse: bool) -> Iterator[tuple[int, int]]:
+    chunk_size = _MIN_CHUNK_SIZE
+    while start < end:
+        if reverse:
+            chunk_start, chunk_end = max(start, end - chunk_size), end
+            end = chunk_start
+        else:
+            chunk_start, chunk_end = start, min(end, start + chunk_size)
+            start = chunk_end
+        yield chunk_start, chunk_end
+        chunk_size = min(chunk_size * 2, _MAX_CHUNK_SIZE)
+
+
+def iter_buffer_lines(
+        buffer: Buffer,
+        start: int = 0,
+        end: int | None = None,
+        reverse: bool = False
+) -> Iterator[tuple[int, str]]:
+    """Lazily yield (line_num, line) for 0 based lines [start, end)."""
+    if reverse:
+        # the first window read backwards must end inside the buffer
+        line_count = buffer.api.line_count()
+        end = line_count if end is None else min(end, line_count)
+    elif end is None:
+        # Read forward until a short chunk marks the end of the buffer,
+        # which saves the line count round trip.
+        end = 2**31 - 1
+    for chunk_start, chunk_end in _iter_chunk_bounds(start, end, reverse):
+        lines = buffer.api.get_lines(chunk_start, chunk_end, False)
+        numbered_lines = list(enumerate(lines, start=chunk_start))
+        yield from reversed(numbered_lines) if reverse else numbered_lines
+        if (not reverse) and (len(lines) < chunk_end - chunk_start):
+            break
+
+
+def _compile_patterns(patterns: Iterable[Pattern | str]) -> list[Pattern]:
+    return [
+            pattern if isinstance(pattern, Pattern) else re.compile(pattern)
+            for pattern in patterns
+    ]
+
+
+def search_buffer(
+        buffer: Buffer,
+        patterns: Iterable[Pattern | str],
+        start: int = 0,
+        end: int | None = None,
+        reverse: bool = False
+) -> Iterator[BufferMatch]:
+    """Lazily yield every match of any of `patterns` in lines [start, end).
+
+    Matches are yielded line by line (last line first when `reverse`),
+    within a line by pattern order and then by position.
+    """
+    compiled_patterns = _compile_patterns(patterns)
+    for line_num, line in iter_buffer_lines(buffer, start, end, reverse):
+        for pattern in compiled_patterns:
+            for match_ in pattern.finditer(line):
+                yield BufferMatch(line_num, pattern, match_)
 
 
 class ProGirlBufferRe:
@@ -25,13 +102,10 @@ class ProGirlBufferRe:
 
         self._last_pattern = pattern
 
-        buffer = self._buffer
-        for line, linenum in zip(buffer, range(len(buffer))):
-            match_ = re.search(pattern, line)
-            if match_ is not None:
-                self._last_match = match_
-                self._last_match_line_num = linenum
-                break
+        buffer_match = next(search_buffer(self._buffer, [pattern]), None)
+        if buffer_match is not None:
+            self._last_match = buffer_match.match
+            self._last_match_line_num = buffer_match.line_num
         else:
             self._last_match = None
             self._last_match_line_num = None
@@ -68,3 +142,30 @@ class ProGirlBuffer:
     def re(self, pattern: Pattern | str | None = None) -> ProGirlBufferRe:
         self._re._do_search(pattern)
         return self._re
+
+    def lines(
+            self,
+            start: int = 0,
+            end: int | None = None,
+            reverse: bool = False
+    ) -> Iterator[tuple[int, str]]:
+        return iter_buffer_lines(self._buffer, start, end, reverse)
+
+    def search(
+            self,
+            patterns: Iterable[Pattern | str],
+            start: int = 0,
+            end: int | None = None,
+            reverse: bool = False
+    ) -> Iterator[BufferMatch]:
+        return search_buffer(self._buffer, patterns, start, end, reverse)
+
+    def search_from_cursor(
+            self, patterns: Iterable[Pattern | str], reverse: bool = False
+    ) -> Iterator[BufferMatch]:
+        """Search from the current window's cursor line to the buffer end,
+        or back to the buffer start when `reverse`."""
+        cursor_line_num = self._vim.current.window.cursor[0] - 1
+        if reverse:
+            return self.search(patterns, end=cursor_line_num + 1, reverse=True)
+        return self.search(patterns, start=cursor_line_num)
@@ -0,0 +1,266 @@
+"""Headless entry point for batch pkb operations (`python -m progirl`).
+
+The config is read from a json file holding the same variables as the
+`g:progirl_*` vim variables (without the `g:`), e.g.
+`{"progirl_collections": [{"name": "notes", "path": "~/pkb/notes"}]}`.
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+import os.path as osp
+import sys
+from typing import Any
+from typing import Callable
+from typing import Iterable
+from typing import Iterator
+
+from progirl.export import export_collection
+from progirl.globals import config
+from progirl.markdown import LinkRefType
+from progirl.markdown import iter_links_from_lines
+from progirl.markdown import ref_targets_map_from_lines
+from progirl.path import durable_batch
+from progirl.path import resolve_path_with_context
+from progirl.path import validate_path
+from progirl.pkbm import create_note_headless
+from progirl.pkbm import get_collection_by_c_id
+from progirl.pkbm import get_collection_by_path
+from progirl.pkbm import load_config_from_vars
+from progirl.pkbm import pack_notes
+from progirl.pkbm import resolve_uri_in_collection
+from progirl.pkbm.exceptions import CollectionError
+from progirl.uri import URI
+from progirl.worker.scan import iter_note_paths
+from progirl.worker.scan import read_note_lines
+
+CONFIG_ENV_VAR = "PROGIRL_CONFIG"
+_LOCAL_PROTOCOLS = ["file", "local"]
+
+# (line_num, col, target, resolved path or None when unresolvable)
+LinkReport = tuple[int, int, str, str | None]
+
+
+def _load_raw_config(config_path: str | None) -> dict[str, Any]:
+    config_path = config_path or os.environ.get(CONFIG_ENV_VAR)
+    if config_path is None:
+        return {}
+    with open(osp.expanduser(config_path)) as f:
+        return json.load(f)
+
+
+def _iter_paths(paths: Iterable[str]) -> Iterator[str]:
+    for path_str in paths:
+        path_str = resolve_path_with_context(path_str, real=True)
+        if osp.isdir(path_str):
+            collection = get_collection_by_path(path_str)
+            extension = collection.extension if collection else ".md"
+            yield from sorted(iter_note_paths(path_str, extension))
+        else:
+            yield path_str
+
+
+def _resolve_link_target(target: str, path_str: str) -> str | None:
+    uri = URI(target)
+    context_pwd = osp.dirname(path_str)
+    if uri.protocol in _LOCAL_PROTOCOLS:
+        return validate_path(resolve_path_with_context(uri.body, context_pwd))
+    if uri.protocol in config.collections:
+        collection = config.collections[uri.protocol]
+    elif uri.protocol == "":
+        collection = get_collection_by_path(path_str)
+        if collection is None:
+            collection = get_collection_by_c_id(config.active_c_id)
+    else:
+        return None
+    return resolve_uri_in_collection(uri, collection, context_pwd)
+
+
+def _file_ref_targets(path_str: str) -> tuple[str, dict[str, str]]:
+    return path_str, ref_targets_map_from_lines(read_note_lines(path_str))
+
+
+def _file_links(path_str: str) -> tuple[str, list[LinkReport]]:
+    lines = read_note_lines(path_str)
+    ref_targets_map = ref_targets_map_from_lines(lines)
+    reports = []
+    for line_num, link in iter_links_from_lines(lines):
+        if link.ref_type is LinkRefType.REF_TARGET:
+            continue
+        target = (
+                ref_targets_map.get(link.target, "")
+                if link.ref_type is LinkRefType.REF_SOURCE else link.target
+        )
+        if target == "" or URI(target).protocol in ("http", "https"):
+            continue
+        resolved = _resolve_link_target(target, path_str)
+        if (resolved is not None) and not osp.exists(resolved):
+            resolved = None
+        reports.append((line_num, link.start, target, resolved))
+    return path_str, reports
+
+
+def _map_files(
+        args: argparse.Namespace, raw_config: dict[str, Any],
+        func: Callable[[str], Any]
+) -> Iterator[Any]:
+    paths = list(_iter_paths(args.paths))
+    if args.jobs == 1:
+        yield from map(func, paths)
+        return
+    with ProcessPoolExecutor(
+            max_workers=args.jobs,
+            initializer=load_config_from_vars,
+            initargs=(raw_config, )
+    ) as executor:
+        yield from executor.map(func, paths, chunksize=16)
+
+
+def _cmd_create(args: argparse.Namespace, raw_config: dict[str, Any]) -> int:
+    titles = args.title if args.title else sys.stdin.read().splitlines()
+    prefix = [args.collection] if args.collection else []
+    status = 0
+    with durable_batch():
+        for title in titles:
+            if title.strip() == "":
+                continue
+            try:
+                note_info = create_note_headless(prefix + title.split())
+            except (CollectionError, OSError) as err:
+                print(f"error: {err}", file=sys.stderr)
+                status = 1
+                continue
+            print(note_info.path_str)
+    return status
+
+
+def _cmd_refs(args: argparse.Namespace, raw_config: dict[str, Any]) -> int:
+    ref_maps = dict(_map_files(args, raw_config, _file_ref_targets))
+    json.dump(ref_maps, sys.stdout, indent=2)
+    print()
+    return 0
+
+
+def _cmd_links(args: argparse.Namespace, raw_config: dict[str, Any]) -> int:
+    status = 0
+    for path_str, reports in _map_files(args, raw_config, _file_links):
+        for line_num, col, target, resolved in reports:
+            if resolved is None:
+                status = 1
+            elif args.broken:
+                continue
+            print(
+                    f"{path_str}:{line_num + 1}:{col + 1}: {target} -> "
+                    f"{resolved if resolved is not None else 'BROKEN'}"
+            )
+    return status
+
+
+def _cmd_pack(args: argparse.Namespace, raw_config: dict[str, Any]) -> int:
+    notes_path = resolve_path_with_context(args.notes_path, real=True)
+    collection = get_collection_by_path(notes_path)
+    extension = collection.extension if collection else ".md"
+    try:
+        count = pack_notes(notes_path, extension, args.archive)
+    except OSError as err:
+        print(f"error: {err}", file=sys.stderr)
+        return 1
+    print(f"packed {count} notes into {args.archive}")
+    return 0
+
+
+def _cmd_export(args: argparse.Namespace, raw_config: dict[str, Any]) -> int:
+    c_id = args.collection or config.active_c_id
+    try:
+        stats = export_collection(
+                c_id,
+                raw_config,
+                out_path=args.output,
+                jobs=args.jobs,
+                full=args.full
+        )
+    except (CollectionError, OSError) as err:
+        print(f"error: {err}", file=sys.stderr)
+        return 1
+    for rel_path, error in stats.errors:
+        print(f"{rel_path}: {error}", file=sys.stderr)
+    print(f"{c_id}: {stats}")
+    return 1 if stats.errors else 0
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="progirl")
+    parser.add_argument(
+            "-c",
+            "--config",
+            help=f"json config file (default: ${CONFIG_ENV_VAR})"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    create_parser = subparsers.add_parser(
+            "create", help="create notes, titles are read from stdin if none"
+    )
+    create_parser.add_argument("-C", "--collection", help="collection id")
+    create_parser.add_argument("title", nargs="*")
+    create_parser.set_defaults(func=_cmd_create)
+
+    for name, func, help_ in (
+            ("refs", _cmd_refs, "print the ref targets map of notes as json"),
+            ("links", _cmd_links, "resolve the links of notes"),
+    ):
+        file_parser = subparsers.add_parser(name, help=help_)
+        file_parser.add_argument(
+                "-j",
+                "--jobs",
+                type=int,
+                default=os.cpu_count(),
+                help="number of worker processes"
+        )
+        file_parser.add_argument("paths", nargs="+", metavar="path")
+        file_parser.set_defaults(func=func)
+    subparsers.choices["links"].add_argument(
+            "--broken", action="store_true", help="only report broken links"
+    )
+
+    pack_parser = subparsers.add_parser(
+            "pack", help="pack the notes of a directory into an archive"
+    )
+    pack_parser.add_argument("notes_path")
+    pack_parser.add_argument("archive")
+    pack_parser.set_defaults(func=_cmd_pack)
+
+    export_parser = subparsers.add_parser(
+            "export", help="export a collection as static html"
+    )
+    export_parser.add_argument("-C", "--collection", help="collection id")
+    export_parser.add_argument(
+            "-o",
+            "--output",
+            help="output directory (default: the collection export_path)"
+    )
+    export_parser.add_argument(
+            "-j",
+            "--jobs",
+            type=int,
+            default=os.cpu_count(),
+            help="number of worker processes"
+    )
+    export_parser.add_argument(
+            "--full",
+            action="store_true",
+            help="render every note, not only the changed ones"
+    )
+    export_parser.set_defaults(func=_cmd_export)
+
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = _build_parser().parse_args(argv)
+    try:
+        raw_config = _load_raw_config(args.config)
+        load_config_from_vars(raw_config)
+    except (CollectionError, OSError, ValueError) as err:
+        print(f"error: {err}", file=sys.stderr)
+        return 2
+    return args.func(args, raw_config)
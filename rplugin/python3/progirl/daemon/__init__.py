@@ -0,0 +1,6 @@
+from .client import DaemonClient
+from .client import DaemonError
+from .client import find_notes
+from .client import get_daemon_client
+from .client import is_daemon_enabled
+from .client import resolve_uri_as_path
@@ -0,0 +1,3 @@
+from progirl.daemon.server import main
+
+raise SystemExit(main())
@@ -0,0 +1,68 @@
+"""Socket location and authentication of the index daemon.
+
+Requests and responses are pickles, so a client must never talk to a
+daemon that isn't its user's own and vice versa. Both sides authenticate
+each other with a per user key (multiprocessing.connection's challenge,
+done before anything is unpickled). The key lives next to the socket in
+a directory only the user can write to, so nobody else can read the key
+or put a socket of their own in its place.
+"""
+import os
+import os.path as osp
+import stat
+import tempfile
+from typing import Callable
+
+_AUTHKEY_SIZE = 32
+_SOCKET_NAME = "progirl-daemon.sock"
+
+
+def _check_private(path_str: str, is_type: Callable[[int], bool],
+                   mode: int):
+    st = os.lstat(path_str)
+    if ((not is_type(st.st_mode)) or (st.st_uid != os.getuid())
+            or (stat.S_IMODE(st.st_mode) != mode)):
+        raise PermissionError(
+                f"refusing {path_str}: it must be owned by uid {os.getuid()} "
+                f"with mode {mode:o}"
+        )
+
+
+def default_address() -> str:
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir is None:
+        runtime_dir = osp.join(tempfile.gettempdir(), f"progirl-{os.getuid()}")
+        os.makedirs(runtime_dir, mode=0o700, exist_ok=True)
+    return osp.join(runtime_dir, _SOCKET_NAME)
+
+
+def _create_authkey(key_path: str):
+    fd, tmp_path = tempfile.mkstemp(dir=osp.dirname(key_path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(os.urandom(_AUTHKEY_SIZE))
+        # fails if the other side created it meanwhile, theirs is kept
+        os.link(tmp_path, key_path)
+    except FileExistsError:
+        pass
+    finally:
+        os.unlink(tmp_path)
+
+
+def get_authkey(address: str) -> bytes:
+    """Return the authentication key of the daemon at `address`, creating
+    it if needed.
+
+    :raise PermissionError: if the socket directory or the key file could
+        be accessed by another user
+    """
+    _check_private(osp.dirname(address) or ".", stat.S_ISDIR, 0o700)
+    key_path = address + ".key"
+    if not osp.lexists(key_path):
+        _create_authkey(key_path)
+    _check_private(key_path, stat.S_ISREG, 0o600)
+    with open(key_path, "rb") as f:
+        authkey = f.read()
+    if len(authkey) != _AUTHKEY_SIZE:
+        raise PermissionError(f"refusing {key_path}: invalid key")
+    return authkey
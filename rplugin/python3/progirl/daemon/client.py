@@ -0,0 +1,206 @@
+import atexit
+import itertools
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+from multiprocessing.connection import Connection
+import os
+import os.path as osp
+import subprocess
+import sys
+import threading
+import time
+from typing import Any
+
+import pynvim
+
+from progirl.daemon.auth import default_address
+from progirl.daemon.auth import get_authkey
+from progirl.pkbm import get_current_c_id
+from progirl.pkbm import on_config_reloaded
+from progirl.pkbm import resolve as pkbm_resolve
+from progirl.uri import URI
+from progirl.worker.protocol import OP_SHUTDOWN
+from progirl.worker.protocol import Request
+from progirl.worker.protocol import ResponseKind
+
+_CONNECT_TIMEOUT = 3.0
+_CONFIG_VARS = ["progirl_pkb_prefix", "progirl_collections"]
+
+
+class DaemonError(Exception):
+    pass
+
+
+# a daemon error is echoed once until the daemon works again
+_reported_error = False
+
+
+def _spawn_daemon(address: str):
+    package_parent = osp.dirname(osp.dirname(osp.abspath(__file__)))
+    python_path = os.pathsep.join(
+            filter(None, (osp.dirname(package_parent),
+                          os.environ.get("PYTHONPATH")))
+    )
+    subprocess.Popen(
+            [sys.executable, "-m", "progirl.daemon", address],
+            env={
+                    **os.environ, "PYTHONPATH": python_path
+            },
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+    )
+
+
+class DaemonClient:
+    """Connection to the shared index daemon, started on demand."""
+    _conn: Connection | None
+    _config_key: str | None
+
+    def __init__(self, address: str | None = None):
+        self._address = address or default_address()
+        self._conn = None
+        self._config_key = None
+        self._raw_config: dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._req_ids = itertools.count(1)
+
+    def _connect(self) -> Connection:
+        if self._conn is not None:
+            return self._conn
+        try:
+            authkey = get_authkey(self._address)
+        except OSError as err:
+            raise DaemonError(f"daemon not started: {err}")
+        deadline = time.monotonic() + _CONNECT_TIMEOUT
+        spawned = False
+        while True:
+            try:
+                self._conn = Client(
+                        self._address, family="AF_UNIX", authkey=authkey
+                )
+                break
+            except AuthenticationError:
+                raise DaemonError(
+                        f"{self._address} is not served by your daemon"
+                )
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise DaemonError(f"can't connect to {self._address}")
+                if not spawned:
+                    _spawn_daemon(self._address)
+                    spawned = True
+                time.sleep(0.05)
+        return self._conn
+
+    def _request(self, op: str, args: dict[str, Any]) -> Any:
+        conn = self._connect()
+        try:
+            conn.send(Request(next(self._req_ids), op, args))
+            response = conn.recv()
+        except (EOFError, OSError) as err:
+            self._conn = None
+            self._config_key = None
+            raise DaemonError(f"daemon connection lost: {err}")
+        if response.kind is not ResponseKind.RESULT:
+            raise DaemonError(response.payload)
+        return response.payload
+
+    def request(self, op: str, args: dict[str, Any]) -> Any:
+        with self._lock:
+            for tries in range(2):
+                try:
+                    if self._config_key is None:
+                        self._config_key = self._request(
+                                "load_config", {"raw_config": self._raw_config}
+                        )
+                    return self._request(
+                            op, {
+                                    **args, "config_key": self._config_key
+                            }
+                    )
+                except DaemonError:
+                    # The daemon may have exited between two requests, the
+                    # retry reconnects and restarts it.
+                    if tries > 0 or self._conn is not None:
+                        raise
+
+    def load_config(self, vim: pynvim.Nvim):
+        with self._lock:
+            self._raw_config = {
+                    name: vim.vars[name]
+                    for name in _CONFIG_VARS if name in vim.vars
+            }
+            self._config_key = None
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    self._conn.send(Request(0, OP_SHUTDOWN, {}))
+                except OSError:
+                    pass
+                self._conn.close()
+                self._conn = None
+
+
+_daemon_client: DaemonClient | None = None
+
+
+def is_daemon_enabled(vim: pynvim.Nvim) -> bool:
+    return bool(vim.vars.get("progirl_use_daemon", False))
+
+
+def get_daemon_client(vim: pynvim.Nvim) -> DaemonClient:
+    global _daemon_client
+    if _daemon_client is None:
+        _daemon_client = DaemonClient(vim.vars.get("progirl_daemon_socket"))
+        _daemon_client.load_config(vim)
+        # The daemon keeps a state per config, a new config gets its own.
+        on_config_reloaded(lambda c_ids: _daemon_client.load_config(vim))
+        atexit.register(_daemon_client.close)
+    return _daemon_client
+
+
+def resolve_uri_as_path(
+        vim: pynvim.Nvim,
+        uri: URI,
+        context_pwd: str | None = None
+) -> str | None:
+    """URI resolver for g:progirl_uri_resolvers backed by the daemon,
+    resolving in process while the daemon can't be reached."""
+    global _reported_error
+    try:
+        path_str = get_daemon_client(vim).request(
+                "resolve", {
+                        "uri": str(uri),
+                        "context_pwd": context_pwd,
+                        "c_id": get_current_c_id(vim, check_cb=True),
+                }
+        )
+    except DaemonError as err:
+        if not _reported_error:
+            _reported_error = True
+            # may run off the main thread
+            vim.async_call(
+                    vim.api.echo,
+                    [[f"progirl daemon: {err}, resolving without it"]], True,
+                    {}
+            )
+        return pkbm_resolve.resolve_uri_as_path(vim, uri, context_pwd)
+    _reported_error = False
+    return path_str
+
+
+def find_notes(vim: pynvim.Nvim, query: str, c_id: str | None = None,
+               limit: int = 100) -> list[str]:
+    if c_id is None:
+        c_id = get_current_c_id(vim, check_cb=True)
+    return get_daemon_client(vim).request(
+            "find_notes", {
+                    "c_id": c_id,
+                    "query": query,
+                    "limit": limit
+            }
+    )
@@ -0,0 +1,295 @@
+"""Shared index daemon (`python -m progirl.daemon SOCKET_PATH`).
+
+Serves collection metadata, URI resolution and note lookups to every
+plugin instance over a unix socket. Requests are pickled, so the socket is
+only accessible by its owner and both ends authenticate each other first
+(see progirl.daemon.auth).
+"""
+import hashlib
+import json
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+from multiprocessing.connection import Connection
+from multiprocessing.connection import Listener
+import os
+import os.path as osp
+import sys
+import threading
+from typing import Any
+from typing import Callable
+
+from progirl.daemon.auth import get_authkey
+from progirl.globals import config
+from progirl.pkbm import load_config_from_vars
+from progirl.pkbm import order_collections
+from progirl.pkbm import resolve_uri_federated
+from progirl.pkbm import resolve_uri_in_collection
+from progirl.uri import URI
+from progirl.utils import AttrDict
+from progirl.worker.protocol import OP_SHUTDOWN
+from progirl.worker.protocol import Request
+from progirl.worker.protocol import Response
+from progirl.worker.protocol import ResponseKind
+from progirl.worker.scan import iter_note_paths
+
+_IDLE_SHUTDOWN_DELAY = 30.0
+
+
+class _RWLock:
+    """Single writer / multiple readers lock, waiting writers block new
+    readers so that writes are not starved."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    def acquire_read(self):
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._cond:
+            self._readers -= 1
+            if self._readers == 0:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+
+    def release_write(self):
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+
+class _CollectionsState:
+    collections: AttrDict
+    pkb_prefix: str
+    # collection id to note paths relative to the collection notes path
+    note_indexes: dict[str, list[str]]
+
+    def __init__(self, collections: AttrDict, pkb_prefix: str):
+        self.collections = collections
+        self.pkb_prefix = pkb_prefix
+        self.note_indexes = {}
+
+
+def config_key(raw_config: dict[str, Any]) -> str:
+    raw_json = json.dumps(raw_config, sort_keys=True, default=str)
+    return hashlib.sha1(raw_json.encode()).hexdigest()
+
+
+class _IndexDaemon:
+    _states: dict[str, _CollectionsState]
+
+    def __init__(self, address: str, authkey: bytes):
+        self._address = address
+        self._authkey = authkey
+        self._lock = _RWLock()
+        self._states = {}
+        self._clients = 0
+        self._clients_lock = threading.Lock()
+        self._shutdown = False
+
+    def _read(self, func: Callable[[], Any]) -> Any:
+        self._lock.acquire_read()
+        try:
+            return func()
+        finally:
+            self._lock.release_read()
+
+    def _write(self, func: Callable[[], Any]) -> Any:
+        self._lock.acquire_write()
+        try:
+            return func()
+        finally:
+            self._lock.release_write()
+
+    def _op_load_config(self, args: dict[str, Any]) -> str:
+        raw_config = args["raw_config"]
+        key = config_key(raw_config)
+
+        def load():
+            if key not in self._states:
+                load_config_from_vars(raw_config)
+                # Shallow copies, collection values are immutable.
+                collections = AttrDict({
+                        c_id: AttrDict(collection)
+                        for c_id, collection in config.collections.items()
+                })
+                self._states[key] = _CollectionsState(
+                        collections, config.pkb_prefix
+                )
+
+        if self._read(lambda: key not in self._states):
+            self._write(load)
+        return key
+
+    def _state(self, args: dict[str, Any]) -> _CollectionsState:
+        return self._states[args["config_key"]]
+
+    def _op_resolve(self, args: dict[str, Any]) -> str | None:
+
+        def resolve():
+            state = self._state(args)
+            collections = state.collections
+            uri = URI(args["uri"])
+            if uri.protocol == state.pkb_prefix + "*":
+                return resolve_uri_federated(
+                        uri,
+                        order_collections(collections.values(), args["c_id"]),
+                        args.get("context_pwd")
+                )
+            collection = collections.get(uri.protocol or args["c_id"])
+            if collection is None:
+                return None
+            return resolve_uri_in_collection(
+                    uri, collection, args.get("context_pwd")
+            )
+
+        return self._read(resolve)
+
+    def _note_index(self, args: dict[str, Any]) -> list[str]:
+        c_id = args["c_id"]
+        note_index = self._read(
+                lambda: self._state(args).note_indexes.get(c_id)
+        )
+        if note_index is not None:
+            return note_index
+        collection = self._read(lambda: self._state(args).collections[c_id])
+        # The walk runs without holding the lock, concurrent builders for
+        # the same collection just race to store the same result.
+        notes_path = collection.notes_path
+        note_index = sorted(
+                osp.relpath(path_str, notes_path) for path_str in
+                iter_note_paths(notes_path, collection.extension)
+        )
+        return self._write(
+                lambda: self._state(args).note_indexes.
+                setdefault(c_id, note_index)
+        )
+
+    def _op_find_notes(self, args: dict[str, Any]) -> list[str]:
+        words = args["query"].lower().split()
+        limit = args.get("limit", 100)
+        notes_path = self._read(
+                lambda: self._state(args).collections[args["c_id"]].notes_path
+        )
+        matches = [
+                rel_path for rel_path in self._note_index(args)
+                if all(word in rel_path.lower() for word in words)
+        ]
+        matches.sort(key=lambda rel_path: len(osp.basename(rel_path)))
+        return [osp.join(notes_path, rel_path) for rel_path in matches[:limit]]
+
+    def _op_invalidate(self, args: dict[str, Any]):
+
+        def invalidate():
+            for state in self._states.values():
+                state.note_indexes.pop(args["c_id"], None)
+
+        self._write(invalidate)
+
+    def _handle(self, request: Request) -> Response:
+        op = getattr(self, f"_op_{request.op}", None)
+        if op is None:
+            return Response(
+                    request.req_id, ResponseKind.ERROR,
+                    f"unknown operation: {request.op}"
+            )
+        try:
+            result = op(request.args)
+        except Exception as err:
+            return Response(request.req_id, ResponseKind.ERROR, repr(err))
+        return Response(request.req_id, ResponseKind.RESULT, result)
+
+    def _serve_client(self, conn: Connection):
+        with self._clients_lock:
+            self._clients += 1
+        try:
+            while True:
+                request = conn.recv()
+                if request.op == OP_SHUTDOWN:
+                    break
+                conn.send(self._handle(request))
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+            with self._clients_lock:
+                self._clients -= 1
+                if self._clients == 0:
+                    timer = threading.Timer(
+                            _IDLE_SHUTDOWN_DELAY, self._shutdown_if_idle
+                    )
+                    timer.daemon = True
+                    timer.start()
+
+    def _shutdown_if_idle(self):
+        with self._clients_lock:
+            if self._clients > 0 or self._shutdown:
+                return
+            self._shutdown = True
+        # Wake up the accept() call in serve().
+        Client(self._address, family="AF_UNIX",
+               authkey=self._authkey).close()
+
+    def serve(self):
+        # private from the moment it is bound
+        old_umask = os.umask(0o077)
+        try:
+            listener = Listener(
+                    self._address, family="AF_UNIX", authkey=self._authkey
+            )
+        finally:
+            os.umask(old_umask)
+        try:
+            while True:
+                try:
+                    conn = listener.accept()
+                except (AuthenticationError, OSError):
+                    continue
+                if self._shutdown:
+                    conn.close()
+                    break
+                threading.Thread(
+                        target=self._serve_client, args=(conn, ), daemon=True
+                ).start()
+        finally:
+            listener.close()
+
+
+def main(argv: list[str] | None = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    address = argv[0]
+    try:
+        authkey = get_authkey(address)
+    except OSError as err:
+        print(f"progirl daemon: {err}", file=sys.stderr)
+        return 1
+    if osp.exists(address):
+        try:
+            Client(address, family="AF_UNIX", authkey=authkey).close()
+        except AuthenticationError:
+            print(f"progirl daemon: {address} is served by someone else",
+                  file=sys.stderr)
+            return 1
+        except OSError:
+            os.unlink(address)  # stale socket of a dead daemon
+        else:
+            return 0  # another daemon is already serving
+    try:
+        _IndexDaemon(address, authkey).serve()
+    except OSError as err:
+        print(f"progirl daemon: {err}", file=sys.stderr)
+        return 1
+    return 0
@@ -0,0 +1,5 @@
+from .build import ExportStats
+from .build import export_collection
+from .build import export_notes
+from .render import render_html
+from .render import render_note
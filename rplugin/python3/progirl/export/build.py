@@ -0,0 +1,229 @@
+"""Incremental static html export of a collection.
+
+The export directory holds a manifest with the content hash and the link
+dependencies (the note paths a note links to, existing or not) of every
+exported note. A rebuild renders the notes whose content changed plus the
+notes linking to added or removed notes, as their links now resolve
+differently, and removes the pages of removed notes.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
+import multiprocessing
+import os
+import os.path as osp
+import shutil
+import threading
+from typing import Any
+from typing import Iterable
+from typing import Iterator
+
+import pynvim
+
+from progirl.export.render import RenderResult
+from progirl.export.render import html_rel_path
+from progirl.export.render import render_note
+from progirl.export.render import renderer_name
+from progirl.pkbm import get_collection_by_c_id
+from progirl.pkbm import get_current_c_id
+from progirl.pkbm import is_archive_collection
+from progirl.pkbm import load_config_from_vars
+from progirl.pkbm.exceptions import CollectionError
+from progirl.worker.scan import iter_note_paths
+
+MANIFEST_NAME = ".progirl-manifest.json"
+_MANIFEST_VERSION = 1
+_CONFIG_VARS = ["progirl_pkb_prefix", "progirl_collections"]
+
+
+class ExportStats:
+    rendered: int
+    skipped: int
+    removed: int
+    errors: list[tuple[str, str]]
+
+    def __init__(self):
+        self.rendered = 0
+        self.skipped = 0
+        self.removed = 0
+        self.errors = []
+
+    def __str__(self) -> str:
+        return (f"{self.rendered} rendered, {self.skipped} unchanged, "
+                f"{self.removed} removed, {len(self.errors)} errors")
+
+
+def _hash_file(path_str: str) -> str:
+    with open(path_str, "rb") as f:
+        return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+
+
+def _load_manifest(out_path: str) -> dict[str, dict[str, Any]]:
+    try:
+        with open(osp.join(out_path, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if ((manifest.get("version") != _MANIFEST_VERSION)
+            or (manifest.get("renderer") != renderer_name())):
+        return {}
+    return manifest.get("notes", {})
+
+
+def _save_manifest(out_path: str, notes: dict[str, dict[str, Any]]):
+    manifest_path = osp.join(out_path, MANIFEST_NAME)
+    tmp_path = manifest_path + "~"
+    with open(tmp_path, "w") as f:
+        json.dump({
+                "version": _MANIFEST_VERSION,
+                "renderer": renderer_name(),
+                "notes": notes,
+        }, f)
+    os.replace(tmp_path, manifest_path)
+
+
+def _dirty_notes(hashes: dict[str, str],
+                 old_notes: dict[str, dict[str, Any]]) -> set[str]:
+    added = hashes.keys() - old_notes.keys()
+    removed = old_notes.keys() - hashes.keys()
+    dirty = {
+            rel_path
+            for rel_path, hash_ in hashes.items()
+            if old_notes.get(rel_path, {}).get("hash") != hash_
+    }
+    moved = added | removed
+    for rel_path, note in old_notes.items():
+        if (rel_path in hashes) and not moved.isdisjoint(note["deps"]):
+            dirty.add(rel_path)
+    return dirty
+
+
+def _map_render(c_id: str, rel_paths: list[str], out_path: str,
+                raw_config: dict[str, Any],
+                jobs: int) -> Iterator[RenderResult]:
+    if (jobs == 1) or (len(rel_paths) < 2):
+        for rel_path in rel_paths:
+            yield render_note(c_id, rel_path, out_path)
+        return
+    # spawn, the plugin host is threaded and must not be forked
+    with ProcessPoolExecutor(
+            max_workers=jobs,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=load_config_from_vars,
+            initargs=(raw_config, )
+    ) as executor:
+        yield from executor.map(
+                render_note, [c_id] * len(rel_paths), rel_paths,
+                [out_path] * len(rel_paths),
+                chunksize=16
+        )
+
+
+def _copy_assets(notes_path: str, out_path: str, assets: Iterable[str]):
+    for rel_path in set(assets):
+        src_path = osp.join(notes_path, rel_path)
+        dst_path = osp.join(out_path, rel_path)
+        try:
+            if (osp.exists(dst_path) and osp.getmtime(dst_path)
+                    >= osp.getmtime(src_path)):
+                continue
+            os.makedirs(osp.dirname(dst_path), exist_ok=True)
+            shutil.copy2(src_path, dst_path)
+        except OSError:
+            continue
+
+
+def _remove_pages(out_path: str, rel_paths: Iterable[str]) -> int:
+    count = 0
+    for rel_path in rel_paths:
+        try:
+            os.remove(osp.join(out_path, html_rel_path(rel_path)))
+        except FileNotFoundError:
+            pass
+        count += 1
+    return count
+
+
+def export_collection(c_id: str,
+                      raw_config: dict[str, Any],
+                      out_path: str | None = None,
+                      jobs: int | None = None,
+                      full: bool = False) -> ExportStats:
+    """Export collection `c_id` as html to `out_path` (default: the
+    collection "export_path"), rendering only what changed unless `full`.
+
+    :param raw_config: the config vars the worker processes load
+    :raises CollectionError: for unknown or archive collections
+    """
+    collection = get_collection_by_c_id(c_id)
+    if is_archive_collection(collection):
+        raise CollectionError(f"can't export archive collection: {c_id}")
+    out_path = out_path or collection.export_path
+    notes_path = collection.notes_path
+    os.makedirs(out_path, exist_ok=True)
+
+    hashes = {
+            osp.relpath(path_str, notes_path): _hash_file(path_str)
+            for path_str in iter_note_paths(notes_path, collection.extension)
+    }
+    old_notes = {} if full else _load_manifest(out_path)
+    dirty = sorted(_dirty_notes(hashes, old_notes))
+
+    stats = ExportStats()
+    stats.skipped = len(hashes) - len(dirty)
+    stats.removed = _remove_pages(out_path, old_notes.keys() - hashes.keys())
+    notes = {
+            rel_path: note
+            for rel_path, note in old_notes.items() if rel_path in hashes
+    }
+    assets = []
+    for result in _map_render(c_id, dirty, out_path, raw_config, jobs
+                              or os.cpu_count() or 1):
+        if result.error is not None:
+            stats.errors.append((result.rel_path, result.error))
+            notes.pop(result.rel_path, None)
+            continue
+        stats.rendered += 1
+        notes[result.rel_path] = {
+                "hash": hashes[result.rel_path],
+                "deps": sorted(set(result.deps)),
+        }
+        assets.extend(result.assets)
+    _copy_assets(notes_path, out_path, assets)
+    _save_manifest(out_path, notes)
+    return stats
+
+
+def _export_in_background(vim: pynvim.Nvim, c_id: str,
+                          raw_config: dict[str, Any], full: bool):
+    try:
+        stats = export_collection(c_id, raw_config, full=full)
+    except Exception as err:
+        # nothing else reports what ends this thread
+        message = f"{c_id}: export failed: {str(err) or type(err).__name__}"
+    else:
+        message = f"{c_id}: exported, {stats}"
+        if stats.errors:
+            message += f" (first: {stats.errors[0][0]}: {stats.errors[0][1]})"
+    vim.async_call(vim.api.echo, [[message]], True, {})
+
+
+def export_notes(vim: pynvim.Nvim, args: list[str], full: bool = False):
+    try:
+        c_id = args[0] if args else get_current_c_id(vim, check_cb=True)
+        collection = get_collection_by_c_id(c_id)
+    except CollectionError as err:
+        vim.api.echo([err.args], True, {})
+        return
+    raw_config = {
+            name: vim.vars[name]
+            for name in _CONFIG_VARS if name in vim.vars
+    }
+    vim.api.echo([[f"{c_id}: exporting to {collection.export_path}"]], False,
+                 {})
+    threading.Thread(
+            target=_export_in_background,
+            args=(vim, c_id, raw_config, full),
+            name="progirl-export",
+            daemon=True,
+    ).start()
@@ -0,0 +1,273 @@
+"""Rendering of one note to html, run in the export worker processes.
+
+The python `markdown` package is used when it is installed, otherwise a
+small builtin renderer handles headings, paragraphs, lists, fenced code
+and inline links, which covers the usual note.
+"""
+import html
+import os
+import os.path as osp
+import re
+from typing import Iterable
+from typing import Pattern
+
+try:
+    import markdown
+except ImportError:  # optional
+    markdown = None
+
+from progirl.globals import config
+from progirl.markdown import LinkRefType
+from progirl.markdown import PATTERN_FENCE
+from progirl.markdown import PATTERN_HEADING
+from progirl.markdown import get_line_links
+from progirl.markdown import inline_links
+from progirl.markdown import slugify_heading
+from progirl.path import resolve_path_with_context
+from progirl.path import validate_path
+from progirl.pkbm import is_federated_protocol
+from progirl.pkbm import order_collections
+from progirl.pkbm import resolve_uri_federated
+from progirl.pkbm import resolve_uri_in_collection
+from progirl.uri import URI
+from progirl.uri import split_uri_anchor
+from progirl.utils import AttrDict
+
+_LOCAL_PROTOCOLS = ["file", "local"]
+_PATTERN_LIST_ITEM: Pattern = re.compile(r"^\s*(?:(?P<ul>[-*+])|\d+[.)])\s+")
+_PATTERN_INLINE_CODE: Pattern = re.compile(r"`([^`]+)`")
+_PATTERN_INLINE_LINK: Pattern = re.compile(
+        r"\[(?P<name>[^][]+)\]\((?P<target>[^()]*)\)"
+        r"|(?P<url>https?://\S*[^\s.,;:!?)])"
+)
+# ref definitions and comments, hidden like markdown does
+_PATTERN_HIDDEN_LINE: Pattern = re.compile(r"^(?:\[[^]]+\]:\s|<!--.*-->$)")
+_HTML_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+</head>
+<body>
+{body}
+</body>
+</html>
+"""
+
+
+def html_rel_path(rel_path: str) -> str:
+    return osp.splitext(rel_path)[0] + ".html"
+
+
+class RenderResult:
+    """What the build needs to know about a rendered note: the note paths it
+    links to (existing or not, relative to the notes path) and the other
+    local files it links to."""
+    rel_path: str
+    deps: list[str]
+    assets: list[str]
+    error: str | None
+
+    def __init__(self, rel_path: str):
+        self.rel_path = rel_path
+        self.deps = []
+        self.assets = []
+        self.error = None
+
+
+def _rewrite_target(target: str, note_path: str, collection: AttrDict,
+                    result: RenderResult) -> str:
+    """Return the relative url of `target` in the export, recording the
+    dependency, or `target` itself if it is not in the collection."""
+    uri, anchor = split_uri_anchor(URI(target))
+    context_pwd = osp.dirname(note_path)
+    if (uri.protocol == "") and (uri.body == ""):
+        return target
+    if uri.protocol in _LOCAL_PROTOCOLS:
+        path_str = validate_path(
+                resolve_path_with_context(uri.body, context_pwd)
+        )
+    elif is_federated_protocol(uri.protocol):
+        path_str = resolve_uri_federated(
+                uri,
+                order_collections(config.collections.values(),
+                                  collection._id), context_pwd
+        )
+    elif uri.protocol in ("", collection._id):
+        path_str = resolve_uri_in_collection(uri, collection, context_pwd)
+    else:
+        # Other collections are exported on their own.
+        return target
+    notes_path = collection.notes_path
+    if (path_str is None) or (osp.commonpath(
+            (path_str, notes_path)) != notes_path):
+        return target
+    rel_path = osp.relpath(path_str, notes_path)
+    if rel_path.endswith(collection.extension):
+        result.deps.append(rel_path)
+        rel_path = html_rel_path(rel_path)
+    else:
+        result.assets.append(rel_path)
+    url = osp.relpath(
+            rel_path, osp.dirname(osp.relpath(note_path, notes_path))
+    )
+    return url + (f"#{anchor}" if anchor != "" else "")
+
+
+def rewrite_links(lines: list[str], note_path: str, collection: AttrDict,
+                  result: RenderResult) -> list[str]:
+    """Turn every ref link into an inline link and every collection link
+    target into a relative url of the export."""
+    new_lines = []
+    in_fence = False
+    for line in inline_links(lines):
+        if PATTERN_FENCE.match(line):
+            in_fence = not in_fence
+        if in_fence:
+            new_lines.append(line)
+            continue
+        for link in reversed(list(get_line_links(line))):
+            if link.ref_type is not LinkRefType.NON_REF or link.name == "":
+                continue
+            url = _rewrite_target(link.target, note_path, collection, result)
+            line = line[:link.target_start] + url + line[link.target_end:]
+        new_lines.append(line)
+    return new_lines
+
+
+def _render_link(link_match: re.Match) -> str:
+    url = link_match.group("url")
+    if url is not None:
+        return f'<a href="{url}">{url}</a>'
+    return (f'<a href="{link_match.group("target")}">'
+            f'{link_match.group("name")}</a>')
+
+
+def _render_inline(text: str) -> str:
+    text = html.escape(text)
+    text = _PATTERN_INLINE_CODE.sub(r"<code>\1</code>", text)
+    return _PATTERN_INLINE_LINK.sub(_render_link, text)
+
+
+class _BuiltinRenderer:
+    _out: list[str]
+    _paragraph: list[str]
+    _list_tag: str | None
+    _slug_counts: dict[str, int]
+
+    def __init__(self):
+        self._out = []
+        self._paragraph = []
+        self._list_tag = None
+        self._slug_counts = {}
+
+    def _flush(self):
+        if self._paragraph:
+            self._out.append(
+                    f"<p>{_render_inline(' '.join(self._paragraph))}</p>"
+            )
+            self._paragraph = []
+        if self._list_tag is not None:
+            self._out.append(f"</{self._list_tag}>")
+            self._list_tag = None
+
+    def _heading(self, line: str, text: str):
+        self._flush()
+        level = len(line) - len(line.lstrip("#"))
+        slug = slugify_heading(text)
+        count = self._slug_counts.get(slug, 0)
+        self._slug_counts[slug] = count + 1
+        if count > 0:
+            slug = f"{slug}-{count}"
+        self._out.append(
+                f'<h{level} id="{slug}">{_render_inline(text)}</h{level}>'
+        )
+
+    def _list_item(self, line: str, item_match: re.Match):
+        list_tag = "ul" if item_match.group("ul") else "ol"
+        if self._list_tag != list_tag:
+            self._flush()
+            self._out.append(f"<{list_tag}>")
+            self._list_tag = list_tag
+        self._out.append(
+                f"<li>{_render_inline(line[item_match.end():])}</li>"
+        )
+
+    def _code_block(self, code_lines: list[str]):
+        self._flush()
+        code = html.escape("\n".join(code_lines), quote=False)
+        self._out.append(f"<pre><code>{code}</code></pre>")
+
+    def render(self, lines: Iterable[str]) -> str:
+        code_lines: list[str] | None = None
+        for line in lines:
+            if PATTERN_FENCE.match(line):
+                if code_lines is None:
+                    code_lines = []
+                else:
+                    self._code_block(code_lines)
+                    code_lines = None
+            elif code_lines is not None:
+                code_lines.append(line)
+            elif (line.strip() == "") or _PATTERN_HIDDEN_LINE.match(line):
+                self._flush()
+            elif (heading_match := PATTERN_HEADING.match(line)) is not None:
+                self._heading(line, heading_match.group("text"))
+            elif (item_match := _PATTERN_LIST_ITEM.match(line)) is not None:
+                self._list_item(line, item_match)
+            else:
+                self._paragraph.append(line.strip())
+        if code_lines is not None:
+            self._code_block(code_lines)
+        self._flush()
+        return "\n".join(self._out)
+
+
+def renderer_name() -> str:
+    return "markdown" if markdown is not None else "builtin"
+
+
+def render_html(lines: list[str]) -> str:
+    if markdown is None:
+        return _BuiltinRenderer().render(lines)
+    return markdown.markdown(
+            "\n".join(lines),
+            extensions=["fenced_code", "tables", "toc"],
+            extension_configs={
+                    "toc": {
+                            "slugify": lambda text, _: slugify_heading(text)
+                    }
+            },
+    )
+
+
+def _note_title(lines: list[str], rel_path: str) -> str:
+    for line in lines:
+        heading_match = PATTERN_HEADING.match(line)
+        if heading_match is not None:
+            return heading_match.group("text")
+    return osp.splitext(osp.basename(rel_path))[0]
+
+
+def render_note(c_id: str, rel_path: str, out_path: str) -> RenderResult:
+    """Render the note `rel_path` of collection `c_id` into the export
+    directory `out_path`."""
+    result = RenderResult(rel_path)
+    collection = config.collections[c_id]
+    note_path = osp.join(collection.notes_path, rel_path)
+    try:
+        with open(note_path, encoding="utf-8", errors="replace") as f:
+            lines = f.read().splitlines()
+        lines = rewrite_links(lines, note_path, collection, result)
+        page = _HTML_TEMPLATE.format(
+                title=html.escape(_note_title(lines, rel_path)),
+                body=render_html(lines)
+        )
+        html_path = osp.join(out_path, html_rel_path(rel_path))
+        os.makedirs(osp.dirname(html_path), exist_ok=True)
+        with open(html_path, "w", encoding="utf-8") as f:
+            f.write(page)
+    except Exception as err:
+        # one broken note shouldn't stop the export of the others
+        result.error = str(err) or type(err).__name__
+    return result
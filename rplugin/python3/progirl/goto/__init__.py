@@ -1,2 +1,4 @@
+from .find import find_notes
 from .goto import goto_ex_at_cursor
 from .goto import goto_file_at_cursor
+from .prefetch import prefetch_buffer_links
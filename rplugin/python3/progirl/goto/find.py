@@ -0,0 +1,66 @@
+import pynvim
+
+from progirl.daemon.client import DaemonError
+from progirl.daemon.client import get_daemon_client
+from progirl.daemon.client import is_daemon_enabled
+from progirl.globals import config
+from progirl.pkbm import find_first_note_federated
+from progirl.pkbm import find_in_collection
+from progirl.pkbm import find_notes_federated
+from progirl.pkbm import get_current_c_id
+from progirl.pkbm import order_collections
+from progirl.pkbm.federated import FindInCollection
+from progirl.utils import AttrDict
+
+
+def _get_find(vim: pynvim.Nvim) -> FindInCollection:
+    if not is_daemon_enabled(vim):
+        return find_in_collection
+    # Created here, the pool threads can't call into nvim.
+    client = get_daemon_client(vim)
+
+    def find_with_daemon(collection: AttrDict, query: str,
+                         limit: int) -> list[str]:
+        try:
+            return client.request(
+                    "find_notes", {
+                            "c_id": collection._id,
+                            "query": query,
+                            "limit": limit
+                    }
+            )
+        except DaemonError:
+            return find_in_collection(collection, query, limit)
+
+    return find_with_daemon
+
+
+def find_notes(vim: pynvim.Nvim, args: list[str], first: bool):
+    """Find notes matching all words of `args` in every collection, list
+    them in the quickfix list or, with `first`, edit the best match."""
+    query = " ".join(args)
+    if query.strip() == "":
+        vim.api.echo([["ProGirlFind: empty query"]], True, {})
+        return
+    collections = order_collections(
+            config.collections.values(), get_current_c_id(vim, check_cb=True)
+    )
+    find = _get_find(vim)
+
+    if first:
+        hit = find_first_note_federated(query, collections, find)
+        if hit is None:
+            vim.api.echo([[f"no notes matching '{query}'"]], True, {})
+            return
+        vim.command(f"edit {hit[1]}")
+        return
+
+    items = [{
+            "filename": path_str,
+            "text": c_id
+    } for c_id, path_str in find_notes_federated(query, collections, find)]
+    vim.funcs.setqflist([], " ", {
+            "title": f"ProGirlFind {query}",
+            "items": items
+    })
+    vim.api.echo([[f"{len(items)} notes matching '{query}'"]], True, {})
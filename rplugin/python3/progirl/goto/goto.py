@@ -3,12 +3,21 @@ from enum import Enum
 
 import pynvim
 
+from progirl.buffer import ProGirlBuffer
 from progirl.goto.handle import handle_uri
+from progirl.goto.prefetch import get_prefetched_path
+from progirl.goto.resolve import get_link_context
+from progirl.goto.resolve import get_link_resolver
 from progirl.goto.resolve import resolve_uri_as_path
+from progirl.markdown import find_heading_line
+from progirl.markdown import find_heading_line_in_lines
 from progirl.markdown import get_uri_at_cursor
-from progirl.path import get_context_pwd
 from progirl.path import touch_with_mkdir
+from progirl.pkbm import get_current_c_id
+from progirl.pkbm import is_archive_note_name
+from progirl.pkbm import record_visit
 from progirl.uri import URI
+from progirl.uri import split_uri_anchor
 
 
 class _GotoMethod(Enum):
@@ -16,17 +25,49 @@ class _GotoMethod(Enum):
     EX = auto()
 
 
+def _goto_heading(vim: pynvim.Nvim, anchor: str, path_str: str | None):
+    # A modified buffer may differ from the file on disk, so only unmodified
+    # buffers are looked up through the (cached) file heading index.
+    if (path_str is not None) and not vim.current.buffer.options["modified"]:
+        line_num = find_heading_line(path_str, anchor)
+    else:
+        line_num = find_heading_line_in_lines(
+                ProGirlBuffer(vim).lines(), anchor
+        )
+    if line_num is None:
+        vim.api.echo([[f"heading '#{anchor}' not found"]], True, {})
+        return
+    vim.command("normal! m'")
+    vim.current.window.cursor = (line_num + 1, 0)
+
+
 def _edit_file_at_uri(vim: pynvim.Nvim, uri: URI, context_pwd: str | None):
-    path_str = resolve_uri_as_path(vim, uri, context_pwd=context_pwd)
+    uri, anchor = split_uri_anchor(uri)
+    if (anchor != "") and (uri.protocol == "") and (uri.body == ""):
+        _goto_heading(vim, anchor, None)
+        return
+
+    path_str = get_prefetched_path(
+            uri, context_pwd, get_current_c_id(vim, check_cb=True),
+            get_link_resolver(vim)
+    )
+    if path_str is None:
+        path_str = resolve_uri_as_path(vim, uri, context_pwd=context_pwd)
     if path_str is None:
         vim.api.echo([[f"'{uri!s}' not found"]], True, {})
         return
-    path_str = touch_with_mkdir(path_str)
+    if not is_archive_note_name(path_str):
+        path_str = touch_with_mkdir(path_str)
     if path_str is None:
         vim.api.echo([[f"'can't create {uri!s}'",]], True, {})
         return
     command = f"edit {path_str}"
     vim.command(command)
+    record_visit(path_str)
+    if anchor != "":
+        # archive notes are only in their buffer
+        _goto_heading(vim, anchor,
+                      None if is_archive_note_name(path_str) else path_str)
 
 
 def _ex_uri(vim: pynvim.Nvim, uri: URI, context_pwd: str | None):
@@ -57,7 +98,7 @@ def _goto_uri(vim: pynvim.Nvim, goto_method: _GotoMethod):
 
     uri = URI(uri_string)
     # raise Exception(str((uri, str(type(uri)))))
-    context_dir = get_context_pwd()
+    context_dir = get_link_context(vim.current.buffer)
 
     if goto_method is _GotoMethod.EX:
         _ex_uri(vim, uri, context_dir)
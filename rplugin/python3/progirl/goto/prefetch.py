@@ -0,0 +1,155 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import typing as t
+
+import pynvim
+
+from progirl.goto.resolve import NeedsNvim
+from progirl.goto.resolve import get_link_context
+from progirl.goto.resolve import resolve_uri_off_thread
+from progirl.markdown import LinkRefType
+from progirl.markdown import iter_links_from_lines
+from progirl.markdown import ref_targets_map_from_lines
+from progirl.path import stat_cache
+from progirl.pkbm import LinkResolver
+from progirl.pkbm import get_current_c_id
+from progirl.pkbm import link_cache_key
+from progirl.pkbm import link_resolver
+from progirl.pkbm import on_config_reloaded
+from progirl.uri import URI
+from progirl.uri import split_uri_anchor
+
+_DEFAULT_MAX_LINKS = 200
+_PREFETCH_CACHE_MAX = 4096
+
+
+class _PrefetchJob:
+    """Resolves the link targets of one buffer snapshot, it runs on the
+    prefetch thread and never calls into nvim."""
+
+    def __init__(self, lines: list[str], context_pwd: str | None,
+                 current_c_id: str, resolvers: list[str], max_links: int):
+        self.cancelled = threading.Event()
+        self._lines = lines
+        self._context_pwd = context_pwd
+        self._current_c_id = current_c_id
+        self._resolvers = resolvers
+        self._link_resolver = link_resolver(resolvers)
+        self._max_links = max_links
+
+    def _iter_targets(self):
+        ref_targets_map = ref_targets_map_from_lines(self._lines)
+        seen = set()
+        for _, link in iter_links_from_lines(self._lines):
+            if link.ref_type is LinkRefType.REF_SOURCE:
+                target = ref_targets_map.get(link.target)
+            elif link.ref_type is LinkRefType.NON_REF:
+                target = link.target
+            else:
+                continue
+            if (target is not None) and (target not in seen):
+                seen.add(target)
+                yield target
+            if len(seen) >= self._max_links:
+                return
+
+    def _resolve(self, uri: URI) -> str | None:
+        try:
+            return resolve_uri_off_thread(
+                    uri, self._context_pwd, self._current_c_id,
+                    self._resolvers
+            )
+        except NeedsNvim:
+            # their links are left to goto
+            return None
+
+    def run(self, cache: "_PrefetchCache"):
+        for target in self._iter_targets():
+            if self.cancelled.is_set():
+                return
+            path_uri, _ = split_uri_anchor(URI(target))
+            if (path_uri.protocol == "") and (path_uri.body == ""):
+                continue
+            key = link_cache_key(
+                    path_uri, self._current_c_id, self._context_pwd,
+                    self._link_resolver
+            )
+            if key in cache:
+                continue
+            path_str = self._resolve(path_uri)
+            if (path_str is not None) and stat_cache.exists(path_str):
+                cache.put(key, path_str)
+
+
+class _PrefetchCache:
+    # keyed by note (see link_cache_key), links to the same note written
+    # differently are resolved once
+    _paths: dict[t.Hashable, str]
+
+    def __init__(self):
+        self._paths = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, key: t.Hashable) -> bool:
+        with self._lock:
+            return key in self._paths
+
+    def get(self, key: t.Hashable) -> str | None:
+        with self._lock:
+            return self._paths.get(key)
+
+    def put(self, key: t.Hashable, path_str: str):
+        with self._lock:
+            if len(self._paths) >= _PREFETCH_CACHE_MAX:
+                self._paths.clear()
+            self._paths[key] = path_str
+
+    def clear(self):
+        with self._lock:
+            self._paths.clear()
+
+
+_cache = _PrefetchCache()
+# The keys hold no collection, any change may change the resolved paths.
+on_config_reloaded(lambda c_ids: _cache.clear())
+_executor: ThreadPoolExecutor | None = None
+_current_job: _PrefetchJob | None = None
+
+
+def _is_enabled(vim: pynvim.Nvim) -> bool:
+    return bool(vim.vars.get("progirl_prefetch_links", False))
+
+
+def prefetch_buffer_links(vim: pynvim.Nvim):
+    """Resolve the links of the current buffer in the background, replacing
+    (and cancelling) the job of the previously entered buffer."""
+    global _executor, _current_job
+    if not _is_enabled(vim):
+        return
+    if _current_job is not None:
+        _current_job.cancelled.set()
+    _current_job = _PrefetchJob(
+            vim.current.buffer.api.get_lines(0, -1, False),
+            # the context goto resolves links with
+            get_link_context(vim.current.buffer),
+            get_current_c_id(vim, check_cb=True),
+            list(vim.vars.get("progirl_uri_resolvers", [])),
+            vim.vars.get("progirl_prefetch_max_links", _DEFAULT_MAX_LINKS),
+    )
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="progirl-prefetch"
+        )
+    _executor.submit(_current_job.run, _cache)
+
+
+def get_prefetched_path(uri: URI, context_pwd: str | None, current_c_id: str,
+                        resolver: LinkResolver | None) -> str | None:
+    """Return the prefetched path of `uri` (without anchor) if it still
+    exists."""
+    path_str = _cache.get(
+            link_cache_key(uri, current_c_id, context_pwd, resolver)
+    )
+    if (path_str is None) or not stat_cache.exists(path_str):
+        return None
+    return path_str
@@ -1,14 +1,46 @@
 from importlib import import_module
 
 import pynvim
+from pynvim.api import Buffer
 
+from progirl.globals import config
+from progirl.path import get_context_pwd
 from progirl.path import resolve_path_with_context
 from progirl.path import validate_path
+from progirl.pkbm import LinkResolver
+from progirl.pkbm import PKBM_RESOLVERS
+from progirl.pkbm import archive_note_dir
+from progirl.pkbm import is_federated_protocol
+from progirl.pkbm import link_resolver
+from progirl.pkbm import order_collections
+from progirl.pkbm import resolve_uri_federated
+from progirl.pkbm import resolve_uri_in_collection
 from progirl.uri import URI
+from progirl.utils import AttrDict
 
 _DEFAULT_RESOLVER_PROTOCOLS: list[str] = ["file", "local", ""]
 
 
+class NeedsNvim(Exception):
+    """The URI reaches a resolver that may call nvim, it can only be
+    resolved on the main thread."""
+
+
+def get_link_context(buffer: Buffer) -> str | None:
+    """Return the context_pwd the relative links of `buffer` resolve with,
+    its directory, for an archive note its archive directory."""
+    context_pwd = archive_note_dir(buffer.name)
+    if context_pwd is None:
+        context_pwd = get_context_pwd(buffer)
+    return context_pwd
+
+
+def get_link_resolver(vim: pynvim.Nvim) -> LinkResolver | None:
+    """Return what resolve_uri_as_path resolves links with, for keying
+    them (see link_cache_key)."""
+    return link_resolver(vim.vars.get("progirl_uri_resolvers", []))
+
+
 def _default_resolver(uri: URI, context_pwd: str | None) -> str | None:
     if uri.protocol in _DEFAULT_RESOLVER_PROTOCOLS:
         path = resolve_path_with_context(uri.body, context_pwd)
@@ -40,3 +72,37 @@ def resolve_uri_as_path(
     if path is None:
         path = _default_resolver(uri, context_pwd)
     return path
+
+
+def _resolve_in_pkb(uri: URI, context_pwd: str | None,
+                    current_c_id: str) -> str | None:
+    if is_federated_protocol(uri.protocol):
+        return resolve_uri_federated(
+                uri,
+                order_collections(config.collections.values(), current_c_id),
+                context_pwd
+        )
+    collection: AttrDict | None = config.collections.get(
+            uri.protocol or current_c_id
+    )
+    if collection is None:
+        return None
+    return resolve_uri_in_collection(uri, collection, context_pwd)
+
+
+def resolve_uri_off_thread(
+        uri: URI, context_pwd: str | None, current_c_id: str,
+        uri_resolvers: list[str]
+) -> str | None:
+    """Follow resolve_uri_as_path without calling nvim, the pkbm and daemon
+    resolvers resolve in process.
+
+    :raise NeedsNvim: if another resolver would be called
+    """
+    for resolver in uri_resolvers:
+        if resolver not in PKBM_RESOLVERS:
+            raise NeedsNvim(resolver)
+        path_str = _resolve_in_pkb(uri, context_pwd, current_c_id)
+        if path_str is not None:
+            return path_str
+    return _default_resolver(uri, context_pwd)
@@ -0,0 +1,8 @@
+from .attach import detach_buffer
+from .diagnostics import diagnose_buffer_links
+from .diagnostics import diagnose_changed_lines
+from .diagnostics import drop_buffer_diagnostics
+from .links import decorate_buffer_links
+from .links import decorate_changed_lines
+from .links import decorate_viewport_links
+from .links import drop_buffer_decorations
@@ -0,0 +1,55 @@
+import typing as t
+
+import pynvim
+from pynvim.api import Buffer
+
+# Forwards nvim_buf_attach line changes to the ProGirlLinesChanged plugin
+# function, scheduled since on_lines callbacks run under textlock.
+_LUA_ATTACH = """
+local buf = ...
+vim.api.nvim_buf_attach(buf, false, {
+    on_lines = function(_, b, _, first, last, new_last)
+        vim.schedule(function()
+            vim.fn.ProGirlLinesChanged(b, first, last, new_last)
+        end)
+    end,
+})
+"""
+
+_attached_buffers: set[int] = set()
+
+
+def attach_buffer(vim: pynvim.Nvim, buffer: Buffer):
+    if buffer.number in _attached_buffers:
+        return
+    vim.exec_lua(_LUA_ATTACH, buffer.number)
+    _attached_buffers.add(buffer.number)
+
+
+def detach_buffer(bufnr: int):
+    # nvim detaches on its own when the buffer is unloaded.
+    _attached_buffers.discard(bufnr)
+
+
+def shift_line_map(line_map: dict, first: int, last: int, new_last: int):
+    """Update a line number keyed dict in place for lines [first, last)
+    being replaced by lines [first, new_last)."""
+    delta = new_last - last
+    shifted = {
+            line_num + delta if line_num >= last else line_num: value
+            for line_num, value in line_map.items()
+            if not first <= line_num < last
+    }
+    line_map.clear()
+    line_map.update(shifted)
+
+
+def line_runs(line_nums: t.Iterable[int]) -> list[tuple[int, int]]:
+    """Group line numbers into [first, last) runs of consecutive lines."""
+    runs: list[tuple[int, int]] = []
+    for line_num in sorted(line_nums):
+        if runs and (runs[-1][1] == line_num):
+            runs[-1] = (runs[-1][0], line_num + 1)
+        else:
+            runs.append((line_num, line_num + 1))
+    return runs
@@ -0,0 +1,348 @@
+from concurrent.futures import ThreadPoolExecutor
+import os.path as osp
+import threading
+import typing as t
+
+import pynvim
+from pynvim.api import Buffer
+
+from progirl.globals import config
+from progirl.goto.resolve import NeedsNvim
+from progirl.goto.resolve import get_link_context
+from progirl.goto.resolve import get_link_resolver
+from progirl.goto.resolve import resolve_uri_as_path
+from progirl.goto.resolve import resolve_uri_off_thread
+from progirl.highlight.attach import attach_buffer
+from progirl.highlight.attach import line_runs
+from progirl.highlight.attach import shift_line_map
+from progirl.markdown import LinkRefType
+from progirl.markdown import get_line_links
+from progirl.path import stat_cache
+from progirl.pkbm import get_buffer_c_id
+from progirl.pkbm import get_current_c_id
+from progirl.pkbm import is_archive_note_name
+from progirl.pkbm import is_federated_protocol
+from progirl.pkbm import link_cache_key
+from progirl.pkbm import on_config_reloaded
+from progirl.uri import URI
+from progirl.uri import split_uri_anchor
+from progirl.utils import byte_col
+
+_NAMESPACE = "progirl_link_diagnostics"
+_DEFAULT_DEBOUNCE_MS = 300
+_SEVERITY_WARN = 2
+_RESOLVED_PROTOCOLS = ["file", "local", ""]
+_FOUND_CACHE_MAX = 4096
+_LUA_SET_DIAGNOSTICS = """
+local ns, buf, diagnostics = ...
+vim.diagnostic.set(ns, buf, diagnostics)
+"""
+
+_executor = ThreadPoolExecutor(
+        max_workers=2, thread_name_prefix="progirl-diagnostics"
+)
+
+
+class _Span(t.NamedTuple):
+    col: int
+    end_col: int
+    value: str
+
+
+class _LinkDiagnostics:
+    """Link diagnostics of one buffer.
+
+    Parse results are kept per line and only lines reported as changed are
+    parsed again, the diagnostics themselves are recomputed from the kept
+    results. Link targets are resolved like goto resolves them and checked
+    through the stat cache on a thread pool, only targets behind resolvers
+    that may call nvim are resolved on the main thread. Found targets are
+    kept until the buffer is entered again, missing ones until the next
+    change, a note may appear meanwhile.
+    """
+    _buffer: Buffer
+    _namespace: int
+    _debounce: float
+    _dirty: set[int] | None
+    _ref_sources: dict[int, list[_Span]]
+    _targets: dict[int, list[_Span]]
+    _ref_defs: dict[int, tuple[str, str]]
+    # keyed by note like the link decorator's cache
+    _found: set[t.Hashable]
+    _missing: set[t.Hashable]
+    _checking: set[t.Hashable]
+    _timer: threading.Timer | None
+
+    def __init__(self, vim: pynvim.Nvim, buffer: Buffer):
+        self._buffer = buffer
+        self._namespace = vim.api.create_namespace(_NAMESPACE)
+        debounce_ms = vim.vars.get(
+                "progirl_diagnostics_debounce_ms", _DEFAULT_DEBOUNCE_MS
+        )
+        self._debounce = debounce_ms / 1000
+        self._dirty = None
+        self._ref_sources = {}
+        self._targets = {}
+        self._ref_defs = {}
+        self._found = set()
+        self._missing = set()
+        self._checking = set()
+        self._timer = None
+        self._context_pwd = get_link_context(buffer)
+        self._uri_resolvers: list[str] = []
+        self._link_resolver = get_link_resolver(vim)
+        self._c_id = get_current_c_id(vim, check_cb=True)
+        attach_buffer(vim, buffer)
+
+    def mark_changed(self, first: int, last: int, new_last: int):
+        for line_map in (self._ref_sources, self._targets, self._ref_defs):
+            shift_line_map(line_map, first, last, new_last)
+        if self._dirty is not None:
+            delta = new_last - last
+            self._dirty = {
+                    line_num + delta if line_num >= last else line_num
+                    for line_num in self._dirty
+                    if not first <= line_num < last
+            }
+            self._dirty.update(range(first, new_last))
+
+    def schedule(self, vim: pynvim.Nvim):
+        """Flush after the debounce delay, restarting the delay if a flush
+        is already scheduled so that a burst of edits publishes once."""
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(
+                self._debounce, vim.async_call, (self.flush, vim)
+        )
+        self._timer.daemon = True
+        self._timer.start()
+
+    def cancel(self):
+        if self._timer is not None:
+            self._timer.cancel()
+
+    def _parse_line(self, line_num: int, line: str):
+        ref_sources = []
+        targets = []
+        for link in get_line_links(line):
+            col, end_col = byte_col(line, link.start), byte_col(line, link.end)
+            if link.ref_type is LinkRefType.REF_TARGET:
+                self._ref_defs[line_num] = (link.name, link.target)
+            elif link.ref_type is LinkRefType.NON_REF:
+                targets.append(_Span(col, end_col, link.target))
+            elif link.name != link.target:
+                # "[name][ref]", plain "[name]" is too often just brackets.
+                ref = link.target if link.target != "" else link.name
+                ref_sources.append(_Span(col, end_col, ref))
+        for line_map, spans in ((self._ref_sources, ref_sources),
+                                (self._targets, targets)):
+            if spans:
+                line_map[line_num] = spans
+
+    def _parse_lines(self, first: int, last: int):
+        for line_map in (self._ref_sources, self._targets, self._ref_defs):
+            for line_num in [
+                    line_num for line_num in line_map
+                    if first <= line_num < last
+            ]:
+                del line_map[line_num]
+        lines = self._buffer.api.get_lines(first, last, False)
+        for line_num, line in enumerate(lines, start=first):
+            self._parse_line(line_num, line)
+
+    def _parse_dirty(self):
+        if self._dirty is None:
+            self._parse_lines(0, self._buffer.api.line_count())
+        else:
+            # edits far apart don't fetch the lines between them
+            for first, last in line_runs(self._dirty):
+                self._parse_lines(first, last)
+        self._dirty = set()
+
+    def _target_diagnostic(
+            self, line_num: int, span: _Span, target: str
+    ) -> tuple[dict | None, tuple[t.Hashable, URI] | None]:
+        """Return the diagnostic for a link target, or its key and URI if it
+        still needs to be checked."""
+        path_uri, _ = split_uri_anchor(URI(target))
+        protocol = path_uri.protocol
+        if not protocol.startswith(config.pkb_prefix):
+            if (protocol not in _RESOLVED_PROTOCOLS) or (path_uri.body == ""):
+                # external, or only an anchor in this note
+                return None, None
+        elif ((protocol not in config.collections)
+              and not is_federated_protocol(protocol)):
+            return self._diagnostic(
+                    line_num, span, f"unknown collection: {protocol}"
+            ), None
+        key = link_cache_key(path_uri, self._c_id, self._context_pwd,
+                             self._link_resolver)
+        if key in self._missing:
+            return self._diagnostic(
+                    line_num, span, f"link target not found: {target}"
+            ), None
+        if key in self._found:
+            return None, None
+        return None, (key, path_uri)
+
+    def _diagnostic(self, line_num: int, span: _Span, message: str) -> dict:
+        return {
+                "lnum": line_num,
+                "col": span.col,
+                "end_col": span.end_col,
+                "severity": _SEVERITY_WARN,
+                "message": message,
+                "source": "progirl",
+        }
+
+    def _diagnose(self) -> tuple[list[dict], dict[t.Hashable, URI]]:
+        ref_targets_map = dict(self._ref_defs.values())
+        checks = [(line_num, span, span.value)
+                  for line_num, spans in self._targets.items()
+                  for span in spans]
+        diagnostics = []
+        for line_num, spans in self._ref_sources.items():
+            for span in spans:
+                target = ref_targets_map.get(span.value)
+                if target is None:
+                    diagnostics.append(
+                            self._diagnostic(
+                                    line_num, span,
+                                    f"undefined link reference: {span.value}"
+                            )
+                    )
+                else:
+                    checks.append((line_num, span, target))
+        unchecked: dict[t.Hashable, URI] = {}
+        for line_num, span, target in checks:
+            diagnostic, pending = self._target_diagnostic(
+                    line_num, span, target
+            )
+            if diagnostic is not None:
+                diagnostics.append(diagnostic)
+            if pending is not None:
+                unchecked[pending[0]] = pending[1]
+        return diagnostics, unchecked
+
+    def flush(self, vim: pynvim.Nvim):
+        self._timer = None
+        self._uri_resolvers = list(
+                vim.vars.get("progirl_uri_resolvers", [])
+        )
+        self._link_resolver = get_link_resolver(vim)
+        self._parse_dirty()
+        diagnostics, unchecked = self._diagnose()
+        vim.exec_lua(
+                _LUA_SET_DIAGNOSTICS, self._namespace, self._buffer.number,
+                diagnostics
+        )
+        for key in self._checking:
+            unchecked.pop(key, None)
+        if unchecked:
+            self._checking.update(unchecked)
+            _executor.submit(
+                    _check_targets, unchecked, self._context_pwd, self._c_id,
+                    self._uri_resolvers
+            ).add_done_callback(
+                    lambda future: vim.async_call(
+                            self._on_targets_checked, vim, *future.result()
+                    )
+            )
+
+    def _on_targets_checked(
+            self, vim: pynvim.Nvim, exists: dict[t.Hashable, bool],
+            needs_nvim: dict[t.Hashable, URI]
+    ):
+        for key, uri in needs_nvim.items():
+            exists[key] = _target_exists(
+                    resolve_uri_as_path(vim, uri, self._context_pwd)
+            )
+        if len(self._found) >= _FOUND_CACHE_MAX:
+            self._found.clear()
+        for key, target_exists in exists.items():
+            (self._found if target_exists else self._missing).add(key)
+        self._checking.difference_update(exists)
+        self.flush(vim)
+
+    def schedule_after_change(self, vim: pynvim.Nvim):
+        # the notes that were missing may exist now
+        self._missing.clear()
+        self.schedule(vim)
+
+    def config_reloaded(self):
+        self._c_id = get_buffer_c_id(self._buffer) or config.active_c_id
+        self._context_pwd = get_link_context(self._buffer)
+        self._found.clear()
+        self._missing.clear()
+
+    def recheck(self, vim: pynvim.Nvim):
+        self._found.clear()
+        self.schedule_after_change(vim)
+
+
+def _target_exists(path_str: str | None) -> bool:
+    if path_str is None:
+        return False
+    return is_archive_note_name(path_str) or stat_cache.exists(
+            osp.realpath(path_str)
+    )
+
+
+def _check_targets(
+        targets: dict[t.Hashable, URI], context_pwd: str | None,
+        current_c_id: str, uri_resolvers: list[str]
+) -> tuple[dict[t.Hashable, bool], dict[t.Hashable, URI]]:
+    """Resolve and check `targets` off the main thread, return whether they
+    exist and the targets that need nvim to be resolved."""
+    exists = {}
+    needs_nvim = {}
+    for key, uri in targets.items():
+        try:
+            path_str = resolve_uri_off_thread(
+                    uri, context_pwd, current_c_id, uri_resolvers
+            )
+        except NeedsNvim:
+            needs_nvim[key] = uri
+            continue
+        exists[key] = _target_exists(path_str)
+    return exists, needs_nvim
+
+
+_buffer_diagnostics: dict[int, _LinkDiagnostics] = {}
+
+
+def _forget_checked(c_ids: set[str]):
+    # published diagnostics stay until the buffer changes or is entered
+    for buffer_diagnostics in _buffer_diagnostics.values():
+        buffer_diagnostics.config_reloaded()
+
+
+on_config_reloaded(_forget_checked)
+
+
+def diagnose_buffer_links(vim: pynvim.Nvim):
+    """Start diagnosing the current buffer, or recheck its link targets."""
+    if not vim.vars.get("progirl_link_diagnostics", False):
+        return
+    buffer = vim.current.buffer
+    buffer_diagnostics = _buffer_diagnostics.get(buffer.number)
+    if buffer_diagnostics is None:
+        buffer_diagnostics = _LinkDiagnostics(vim, buffer)
+        _buffer_diagnostics[buffer.number] = buffer_diagnostics
+    buffer_diagnostics.recheck(vim)
+
+
+def diagnose_changed_lines(
+        vim: pynvim.Nvim, bufnr: int, first: int, last: int, new_last: int
+):
+    buffer_diagnostics = _buffer_diagnostics.get(bufnr)
+    if buffer_diagnostics is None:
+        return
+    buffer_diagnostics.mark_changed(first, last, new_last)
+    buffer_diagnostics.schedule_after_change(vim)
+
+
+def drop_buffer_diagnostics(bufnr: int):
+    buffer_diagnostics = _buffer_diagnostics.pop(bufnr, None)
+    if buffer_diagnostics is not None:
+        buffer_diagnostics.cancel()
@@ -0,0 +1,264 @@
+import os.path as osp
+import typing as t
+
+import pynvim
+from pynvim.api import Buffer
+
+from progirl.globals import config
+from progirl.goto.resolve import get_link_context
+from progirl.goto.resolve import get_link_resolver
+from progirl.goto.resolve import resolve_uri_as_path
+from progirl.highlight.attach import attach_buffer
+from progirl.highlight.refs import RefTargetLines
+from progirl.markdown import Link
+from progirl.markdown import LinkRefType
+from progirl.markdown import get_line_links
+from progirl.pkbm import LinkResolver
+from progirl.pkbm import get_buffer_c_id
+from progirl.pkbm import get_current_c_id
+from progirl.pkbm import is_archive_note_name
+from progirl.pkbm import link_cache_key
+from progirl.pkbm import on_config_reloaded
+from progirl.uri import URI
+from progirl.uri import split_uri_anchor
+from progirl.utils import byte_col
+
+_NAMESPACE = "progirl_links"
+_HL_PENDING = "ProGirlLink"
+_HL_RESOLVED = "ProGirlLinkResolved"
+_HL_BROKEN = "ProGirlLinkBroken"
+_HL_EXTERNAL = "ProGirlLinkExternal"
+_RESOLVED_PROTOCOLS = ["file", "local", ""]
+_DEFAULT_HL_LINKS = {
+        _HL_PENDING: "Underlined",
+        _HL_RESOLVED: "Underlined",
+        _HL_BROKEN: "DiagnosticUnderlineError",
+        _HL_EXTERNAL: "Special",
+}
+_VIEWPORT_MARGIN = 50
+_RESOLVED_CACHE_MAX = 4096
+
+# Clears the namespace in the given line range and places all marks in one
+# round trip, each mark is [line, col, opts] as taken by nvim_buf_set_extmark.
+_LUA_SET_MARKS = """
+local buf, ns, first, last, marks = ...
+vim.api.nvim_buf_clear_namespace(buf, ns, first, last)
+for _, mark in ipairs(marks) do
+    pcall(vim.api.nvim_buf_set_extmark, buf, ns, mark[1], mark[2], mark[3])
+end
+"""
+
+
+class _LinkDecorator:
+    _buffer: Buffer
+    _namespace: int
+    _decorated: set[int]
+    # keyed by note, so links to one note written differently share an entry
+    _resolved: dict[t.Hashable, bool]
+    _c_id: str
+    _ref_targets: RefTargetLines
+    _link_resolver: LinkResolver | None
+
+    def __init__(self, vim: pynvim.Nvim, buffer: Buffer):
+        self._buffer = buffer
+        self._c_id = get_current_c_id(vim, check_cb=True)
+        self._namespace = vim.api.create_namespace(_NAMESPACE)
+        self._decorated = set()
+        self._resolved = {}
+        self._ref_targets = RefTargetLines()
+        self._link_resolver = get_link_resolver(vim)
+        for hl_group, hl_link in _DEFAULT_HL_LINKS.items():
+            vim.command(f"highlight default link {hl_group} {hl_link}")
+        attach_buffer(vim, buffer)
+
+    def invalidate(self, first: int, last: int, new_last: int):
+        self._ref_targets.mark_changed(first, last, new_last)
+        if last == new_last:
+            self._decorated.difference_update(range(first, new_last))
+        else:
+            # Lines below the change shifted, their marks moved along with
+            # the text but the line numbers in _decorated no longer match.
+            self._decorated = {
+                    line_num
+                    for line_num in self._decorated if line_num < first
+            }
+
+    def reset(self):
+        self._decorated.clear()
+        self._resolved.clear()
+        self._ref_targets.reset()
+
+    def config_reloaded(self):
+        self._c_id = get_buffer_c_id(self._buffer) or config.active_c_id
+        self._decorated.clear()
+        self._resolved.clear()
+
+    def _classify(self, link: Link, context_pwd: str | None,
+                  ref_targets_map: dict[str, str]) -> tuple[str, URI | None]:
+        """Return the highlight group of `link` and, if it is pending, the
+        URI that still needs to be resolved."""
+        target = link.target
+        if link.ref_type is LinkRefType.REF_SOURCE:
+            ref_target = ref_targets_map.get(link.target)
+            if ref_target is None:
+                # "[name]" without a ref target is usually just brackets.
+                is_broken = link.name != link.target
+                return (_HL_BROKEN if is_broken else ""), None
+            target = ref_target
+        uri = URI(target)
+        if (uri.protocol not in _RESOLVED_PROTOCOLS
+                and not uri.protocol.startswith(config.pkb_prefix)):
+            return _HL_EXTERNAL, None
+        resolved = self._resolved.get(
+                link_cache_key(uri, self._c_id, context_pwd,
+                               self._link_resolver)
+        )
+        if resolved is None:
+            return _HL_PENDING, uri
+        return (_HL_RESOLVED if resolved else _HL_BROKEN), None
+
+    def _resolve(self, vim: pynvim.Nvim, uri: URI, context_pwd: str | None):
+        key = link_cache_key(uri, self._c_id, context_pwd,
+                             self._link_resolver)
+        if key in self._resolved:
+            return
+        path_uri, _ = split_uri_anchor(uri)
+        if (path_uri.body == "") and (path_uri.protocol == ""):
+            self._resolved[key] = True
+            return
+        path_str = resolve_uri_as_path(vim, path_uri, context_pwd)
+        if len(self._resolved) >= _RESOLVED_CACHE_MAX:
+            self._resolved.clear()
+        self._resolved[key] = (path_str is not None) and (
+                is_archive_note_name(path_str) or osp.exists(path_str)
+        )
+
+    def _line_marks(
+            self, line_num: int, line: str, context_pwd: str | None,
+            ref_targets_map: dict[str, str]
+    ) -> tuple[list, list[URI]]:
+        marks = []
+        pending = []
+        for link in get_line_links(line):
+            if link.ref_type is LinkRefType.REF_TARGET:
+                continue
+            hl_group, pending_uri = self._classify(
+                    link, context_pwd, ref_targets_map
+            )
+            if hl_group == "":
+                continue
+            if pending_uri is not None:
+                pending.append(pending_uri)
+            marks.append([
+                    line_num,
+                    byte_col(line, link.start), {
+                            "end_col": byte_col(line, link.end),
+                            "hl_group": hl_group
+                    }
+            ])
+            if link.name not in ("", link.target):
+                # Conceal the "(target)" / "[ref]" part of named links, only
+                # visible with 'conceallevel' set.
+                marks.append([
+                        line_num,
+                        byte_col(line, link.target_start - 1), {
+                                "end_col": byte_col(line, link.end),
+                                "conceal": ""
+                        }
+                ])
+        return marks, pending
+
+    def decorate(self, vim: pynvim.Nvim, first: int, last: int):
+        """Decorate lines [first, last) that are not decorated yet."""
+        todo = [
+                line_num for line_num in range(first, last)
+                if line_num not in self._decorated
+        ]
+        if not todo:
+            return
+        first, last = todo[0], todo[-1] + 1
+        lines = self._buffer.api.get_lines(first, last, False)
+        context_pwd = get_link_context(self._buffer)
+        self._link_resolver = get_link_resolver(vim)
+        # once per pass, only the lines changed since the last one are read
+        ref_targets_map = self._ref_targets.get_map(self._buffer)
+        marks: list = []
+        pending: list[URI] = []
+        for line_num, line in enumerate(lines, start=first):
+            line_marks, line_pending = self._line_marks(
+                    line_num, line, context_pwd, ref_targets_map
+            )
+            marks.extend(line_marks)
+            pending.extend(line_pending)
+        self._decorated.update(range(first, first + len(lines)))
+        vim.exec_lua(
+                _LUA_SET_MARKS, self._buffer.number, self._namespace, first,
+                last, marks
+        )
+        if pending:
+            vim.async_call(self._resolve_pending, vim, pending, context_pwd)
+
+    def _resolve_pending(
+            self, vim: pynvim.Nvim, pending: list[URI], context_pwd: str | None
+    ):
+        for uri in pending:
+            self._resolve(vim, uri, context_pwd)
+        # Pending links are redecorated with their resolved highlight.
+        self._decorated.clear()
+        decorate_viewport_links(vim)
+
+
+_decorators: dict[int, _LinkDecorator] = {}
+
+
+def _forget_resolved(c_ids: set[str]):
+    # links may point to any collection, all of them may resolve elsewhere
+    for decorator in _decorators.values():
+        decorator.config_reloaded()
+
+
+on_config_reloaded(_forget_resolved)
+
+
+def _is_enabled(vim: pynvim.Nvim) -> bool:
+    return bool(vim.vars.get("progirl_decorate_links", False))
+
+
+def _viewport_range(vim: pynvim.Nvim) -> tuple[int, int]:
+    top, bottom = vim.eval('[line("w0"), line("w$")]')
+    return max(top - 1 - _VIEWPORT_MARGIN, 0), bottom + _VIEWPORT_MARGIN
+
+
+def decorate_buffer_links(vim: pynvim.Nvim):
+    """Start (or refresh) decorating the links of the current buffer."""
+    if not _is_enabled(vim):
+        return
+    buffer = vim.current.buffer
+    decorator = _decorators.get(buffer.number)
+    if decorator is None:
+        decorator = _LinkDecorator(vim, buffer)
+        _decorators[buffer.number] = decorator
+    else:
+        decorator.reset()
+    decorator.decorate(vim, *_viewport_range(vim))
+
+
+def decorate_viewport_links(vim: pynvim.Nvim):
+    decorator = _decorators.get(vim.current.buffer.number)
+    if decorator is not None:
+        decorator.decorate(vim, *_viewport_range(vim))
+
+
+def decorate_changed_lines(
+        vim: pynvim.Nvim, bufnr: int, first: int, last: int, new_last: int
+):
+    decorator = _decorators.get(bufnr)
+    if decorator is None:
+        return
+    decorator.invalidate(first, last, new_last)
+    if vim.current.buffer.number == bufnr:
+        decorator.decorate(vim, *_viewport_range(vim))
+
+
+def drop_buffer_decorations(bufnr: int):
+    _decorators.pop(bufnr, None)
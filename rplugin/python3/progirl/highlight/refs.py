@@ -0,0 +1,93 @@
+from bisect import bisect_left
+
+from pynvim.api import Buffer
+
+from progirl.highlight.attach import line_runs
+from progirl.highlight.attach import shift_line_map
+from progirl.markdown import PATTERN_FENCE
+from progirl.markdown import find_ref_target
+
+
+class RefTargetLines:
+    """The ref targets of a buffer kept up to date from its line changes.
+
+    Only the changed lines are fetched and parsed again. A change that adds
+    or removes a fence line toggles the code blocks below it, so it falls
+    back to parsing the whole buffer.
+    """
+    _ref_defs: dict[int, tuple[str, str]]
+    _fences: dict[int, bool]
+    _dirty: set[int] | None
+    _map: dict[str, str] | None
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._ref_defs = {}
+        self._fences = {}
+        self._dirty = None
+        self._map = None
+
+    def mark_changed(self, first: int, last: int, new_last: int):
+        if self._dirty is None:
+            return
+        if any(first <= line_num < last for line_num in self._fences):
+            self._dirty = None
+            return
+        shift_line_map(self._ref_defs, first, last, new_last)
+        shift_line_map(self._fences, first, last, new_last)
+        delta = new_last - last
+        self._dirty = {
+                line_num + delta if line_num >= last else line_num
+                for line_num in self._dirty if not first <= line_num < last
+        }
+        self._dirty.update(range(first, new_last))
+        self._map = None
+
+    def _parse_line(self, line_num: int, line: str):
+        link = find_ref_target(line)
+        if link is not None:
+            self._ref_defs[line_num] = (link.name, link.target)
+
+    def _parse(self, buffer: Buffer, first: int, last: int) -> bool:
+        """Parse lines [first, last), return False if they hold a fence."""
+        for line_num in range(first, last):
+            self._ref_defs.pop(line_num, None)
+        lines = buffer.api.get_lines(first, last, False)
+        if any(PATTERN_FENCE.match(line) for line in lines):
+            return False
+        fences = sorted(self._fences)
+        for line_num, line in enumerate(lines, start=first):
+            # inside a code block if an odd number of fences is above it
+            if bisect_left(fences, line_num) % 2 == 0:
+                self._parse_line(line_num, line)
+        return True
+
+    def _parse_all(self, buffer: Buffer):
+        self._ref_defs = {}
+        self._fences = {}
+        in_fence = False
+        for line_num, line in enumerate(buffer[:]):
+            if PATTERN_FENCE.match(line):
+                in_fence = not in_fence
+                self._fences[line_num] = True
+            elif not in_fence:
+                self._parse_line(line_num, line)
+
+    def get_map(self, buffer: Buffer) -> dict[str, str]:
+        """Return the ref targets map of `buffer`, later definitions win
+        like in ref_targets_map_from_lines."""
+        if self._dirty is None:
+            self._parse_all(buffer)
+        elif self._dirty:
+            for first, last in line_runs(self._dirty):
+                if not self._parse(buffer, first, last):
+                    self._parse_all(buffer)
+                    break
+        elif self._map is not None:
+            return self._map
+        self._dirty = set()
+        self._map = dict(self._ref_defs[line_num]
+                         for line_num in sorted(self._ref_defs))
+        return self._map
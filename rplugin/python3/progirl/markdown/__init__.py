@@ -1,3 +1,29 @@
+from .convert import inline_buffer_links
+from .convert import inline_links
+from .convert import line_changes
+from .convert import refify_buffer_links
+from .convert import refify_links
+from .headings import PATTERN_FENCE
+from .headings import PATTERN_HEADING
+from .headings import find_heading_line
+from .headings import find_heading_line_in_lines
+from .headings import slugify_heading
+from .links import LINK_TARGETS_SECTION
+from .links import LineLinks
+from .links import Link
+from .links import RefLinkSource
+from .links import LinkRefType
 from .links import add_ref_link
+from .links import add_ref_links
+from .links import find_ref_target
 from .links import generate_ref_targets_map
+from .links import get_line_links
+from .links import get_links_near
+from .links import get_ref_targets_map
 from .links import get_uri_at_cursor
+from .links import iter_links_from_lines
+from .links import ref_targets_map_from_lines
+from .state import drop_buffer_state
+from .state import mirror_buffer_state
+from .table import LinkTable
+from .table import LinkView
@@ -0,0 +1,230 @@
+"""Conversion between inline ("[name](target)") and reference style
+("[name][index]" plus a "[index]: target" line) links.
+
+The conversions are pure functions of the buffer lines, every line is
+parsed once and the result is written back as a minimal set of line
+changes.
+"""
+from difflib import SequenceMatcher
+from typing import Callable
+
+import pynvim
+
+from progirl.markdown.headings import PATTERN_FENCE
+from progirl.markdown.links import LINK_TARGETS_SECTION
+from progirl.markdown.links import Link
+from progirl.markdown.links import LinkRefType
+from progirl.markdown.links import get_line_links
+from progirl.markdown.links import ref_targets_map_from_lines
+
+# Replaces each [start, end) line range with its new lines, the changes are
+# sorted bottom up so that earlier ones don't shift later ones.
+_LUA_SET_LINE_CHANGES = """
+local buf, changes = ...
+for _, change in ipairs(changes) do
+    vim.api.nvim_buf_set_lines(buf, change[1], change[2], true, change[3])
+end
+"""
+
+
+class _RefTargets:
+    """Ref targets renumbered in order of first use, identical targets share
+    one index. Targets with non numeric names keep their name."""
+    _index_by_target: dict[str, str]
+    _named: dict[str, str]
+
+    def __init__(self):
+        self._index_by_target = {}
+        self._named = {}
+
+    def index_of(self, target: str) -> str:
+        index = self._index_by_target.get(target)
+        if index is None:
+            index = str(len(self._index_by_target))
+            self._index_by_target[target] = index
+        return index
+
+    def add_named(self, name: str, target: str):
+        self._named[name] = target
+
+    def __bool__(self) -> bool:
+        return bool(self._index_by_target) or bool(self._named)
+
+    def lines(self) -> list[str]:
+        return [
+                f"[{index}]: {target}"
+                for target, index in self._index_by_target.items()
+        ] + [
+                f"[{name}]: {target}"
+                for name, target in sorted(self._named.items())
+        ]
+
+
+def _is_name_only(link: Link) -> bool:
+    return link.end - link.start == len(link.name) + 2
+
+
+def _is_ref_target_line(line: str) -> bool:
+    line_links = get_line_links(line)
+    return ((len(line_links) == 1)
+            and (line_links.links[0].ref_type is LinkRefType.REF_TARGET))
+
+
+def _replace_links(line: str, replacements: list[tuple[Link, str]]) -> str:
+    for link, link_str in reversed(replacements):
+        line = line[:link.start] + link_str + line[link.end:]
+    return line
+
+
+def _convert_body_lines(
+        lines: list[str], convert_link: Callable[[Link], str | None]
+) -> dict[int, str]:
+    """Return line number to converted line for the lines that are neither
+    ref targets nor the targets section marker. Lines in fenced code blocks
+    are kept as they are."""
+    body = {}
+    in_fence = False
+    for line_num, line in enumerate(lines):
+        # Fences first, a "[n]: x" line in a code block is not a ref target.
+        if PATTERN_FENCE.match(line):
+            in_fence = not in_fence
+        elif not in_fence:
+            if (line == LINK_TARGETS_SECTION) or _is_ref_target_line(line):
+                continue
+            replacements = []
+            for link in get_line_links(line):
+                link_str = convert_link(link)
+                if link_str is not None:
+                    replacements.append((link, link_str))
+            line = _replace_links(line, replacements)
+        body[line_num] = line
+    return body
+
+
+def _refify_link(link: Link, ref_targets_map: dict[str, str],
+                 ref_targets: _RefTargets) -> str | None:
+    if link.ref_type is LinkRefType.NON_REF:
+        if (link.name == "") or (link.target == ""):
+            return None
+        return f"[{link.name}][{ref_targets.index_of(link.target)}]"
+    if ((link.ref_type is not LinkRefType.REF_SOURCE)
+            or (link.target not in ref_targets_map)):
+        return None
+    target = ref_targets_map[link.target]
+    if not link.target.isdigit():
+        ref_targets.add_named(link.target, target)
+        return None
+    index = ref_targets.index_of(target)
+    if _is_name_only(link):
+        return f"[{index}]"
+    return f"[{link.name}][{index}]"
+
+
+def refify_links(lines: list[str]) -> list[str]:
+    """Return `lines` with every inline link turned into a ref link.
+
+    Identical targets share one index, numeric indexes are renumbered in
+    order of first use (unused targets last) and all the ref targets are
+    collected sorted in the targets section.
+    """
+    ref_targets_map = ref_targets_map_from_lines(lines)
+    ref_targets = _RefTargets()
+    body = _convert_body_lines(
+            lines,
+            lambda link: _refify_link(link, ref_targets_map, ref_targets)
+    )
+    for name, target in ref_targets_map.items():
+        if name.isdigit():
+            ref_targets.index_of(target)
+        else:
+            ref_targets.add_named(name, target)
+
+    section_line_num = (
+            lines.index(LINK_TARGETS_SECTION)
+            if LINK_TARGETS_SECTION in lines else len(lines)
+    )
+    before = [
+            line for line_num, line in body.items()
+            if line_num < section_line_num
+    ]
+    after = [
+            line for line_num, line in body.items()
+            if line_num > section_line_num
+    ]
+    # The blank lines of the old targets section go along with it.
+    while after and (after[0].strip() == ""):
+        del after[0]
+    if not ref_targets:
+        return before + after
+    section = [LINK_TARGETS_SECTION] + ref_targets.lines()
+    if ((LINK_TARGETS_SECTION not in lines) and before
+            and (before[-1].strip() != "")):
+        section.insert(0, "")
+    return before + section + after
+
+
+def inline_links(lines: list[str]) -> list[str]:
+    """Return `lines` with every resolvable ref link turned into an inline
+    link, the ref targets that are no longer used are removed."""
+    ref_targets_map = ref_targets_map_from_lines(lines)
+    used = set()
+
+    def inline_link(link: Link) -> str | None:
+        if ((link.ref_type is not LinkRefType.REF_SOURCE)
+                or (link.target not in ref_targets_map)):
+            return None
+        used.add(link.target)
+        return f"[{link.name}]({ref_targets_map[link.target]})"
+
+    body = _convert_body_lines(lines, inline_link)
+    result = []
+    has_targets = False
+    for line_num, line in enumerate(lines):
+        if line_num in body:
+            result.append(body[line_num])
+        elif line == LINK_TARGETS_SECTION:
+            result.append(line)
+        elif get_line_links(line).links[0].name not in used:
+            result.append(line)
+            has_targets = True
+    if not has_targets and (LINK_TARGETS_SECTION in result):
+        result.remove(LINK_TARGETS_SECTION)
+        while result and (result[-1].strip() == ""):
+            result.pop()
+    return result
+
+
+def line_changes(old_lines: list[str],
+                 new_lines: list[str]) -> list[tuple[int, int, list[str]]]:
+    """Return the minimal (start, end, lines) replacements turning
+    `old_lines` into `new_lines`, sorted bottom up."""
+    matcher = SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    changes = [(i1, i2, new_lines[j1:j2])
+               for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+               if tag != "equal"]
+    changes.reverse()
+    return changes
+
+
+def _convert_buffer_links(
+        vim: pynvim.Nvim, convert: Callable[[list[str]], list[str]]
+):
+    buffer = vim.current.buffer
+    old_lines = buffer.api.get_lines(0, -1, False)
+    changes = line_changes(old_lines, convert(old_lines))
+    if not changes:
+        vim.api.echo([["no links to convert"]], False, {})
+        return
+    # One call, so the conversion is a single undo step.
+    vim.exec_lua(
+            _LUA_SET_LINE_CHANGES, buffer.number,
+            [list(change) for change in changes]
+    )
+
+
+def refify_buffer_links(vim: pynvim.Nvim):
+    _convert_buffer_links(vim, refify_links)
+
+
+def inline_buffer_links(vim: pynvim.Nvim):
+    _convert_buffer_links(vim, inline_links)
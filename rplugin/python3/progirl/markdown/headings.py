@@ -0,0 +1,111 @@
+from collections import OrderedDict
+import os
+import re
+from typing import Iterable
+from typing import Pattern
+
+PATTERN_HEADING: Pattern = re.compile(r"^#{1,6}[ \t]+(?P<text>.*?)[ #\t]*$")
+PATTERN_FENCE: Pattern = re.compile(r"^ {0,3}(```|~~~)")
+_PATTERN_SLUG_INVALID_CHARS: Pattern = re.compile(r"[^\w\- ]")
+_HEADING_INDEXES_MAX = 256
+
+
+def slugify_heading(text: str) -> str:
+    """Slugify a heading the way github renders anchors."""
+    slug = _PATTERN_SLUG_INVALID_CHARS.sub("", text.strip().lower())
+    return slug.replace(" ", "-")
+
+
+class HeadingIndex:
+    """Slug to line number index of the headings in a file.
+
+    The index is filled by a streaming scan that stops as soon as the
+    requested slug is found and resumes from there on the next miss, so only
+    the part of the file up to the furthest requested heading is ever read.
+    """
+    mtime_ns: int
+    slugs: dict[str, int]
+    complete: bool
+    _slug_counts: dict[str, int]
+    _offset: int
+    _line_num: int
+    _in_fence: bool
+
+    def __init__(self, mtime_ns: int):
+        self.mtime_ns = mtime_ns
+        self.slugs = {}
+        self.complete = False
+        self._slug_counts = {}
+        self._offset = 0
+        self._line_num = 0
+        self._in_fence = False
+
+    def add_line(self, line_num: int, line: str) -> str | None:
+        """Index `line` and return its slug if it is a heading."""
+        if PATTERN_FENCE.match(line):
+            self._in_fence = not self._in_fence
+            return None
+        if self._in_fence:
+            return None
+        heading_match = PATTERN_HEADING.match(line)
+        if heading_match is None:
+            return None
+        slug = slugify_heading(heading_match.group("text"))
+        count = self._slug_counts.get(slug, 0)
+        self._slug_counts[slug] = count + 1
+        if count > 0:
+            slug = f"{slug}-{count}"
+        self.slugs.setdefault(slug, line_num)
+        return slug
+
+    def scan_file(self, path_str: str, slug: str) -> int | None:
+        if slug in self.slugs:
+            return self.slugs[slug]
+        if self.complete:
+            return None
+        with open(path_str, "rb") as f:
+            f.seek(self._offset)
+            for raw_line in f:
+                line_num = self._line_num
+                self._line_num += 1
+                self._offset += len(raw_line)
+                line = raw_line.decode("utf-8", errors="replace")
+                if self.add_line(line_num, line.rstrip("\r\n")) == slug:
+                    return line_num
+        self.complete = True
+        return None
+
+
+_heading_indexes: OrderedDict[str, HeadingIndex] = OrderedDict()
+
+
+def find_heading_line(path_str: str, anchor: str) -> int | None:
+    """Return the 0 based line number of the heading `anchor` in a file."""
+    try:
+        mtime_ns = os.stat(path_str).st_mtime_ns
+    except OSError:
+        return None
+    heading_index = _heading_indexes.get(path_str)
+    if (heading_index is None) or (heading_index.mtime_ns != mtime_ns):
+        heading_index = HeadingIndex(mtime_ns)
+        _heading_indexes[path_str] = heading_index
+        if len(_heading_indexes) > _HEADING_INDEXES_MAX:
+            _heading_indexes.popitem(last=False)
+    else:
+        _heading_indexes.move_to_end(path_str)
+    try:
+        return heading_index.scan_file(path_str, slugify_heading(anchor))
+    except OSError:
+        return None
+
+
+def find_heading_line_in_lines(lines: Iterable[tuple[int, str]],
+                               anchor: str) -> int | None:
+    """Return the line number of the heading `anchor` in numbered `lines`,
+    consuming `lines` only up to the heading."""
+    slug = slugify_heading(anchor)
+    heading_index = HeadingIndex(0)
+    for line_num, line in lines:
+        if heading_index.add_line(line_num, line) == slug:
+            return line_num
+    return None
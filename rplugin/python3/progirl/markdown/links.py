@@ -1,8 +1,15 @@
 from __future__ import annotations
 
+from array import array
+from bisect import bisect_right
 from enum import auto
 from enum import Enum
+from functools import lru_cache
+from itertools import count
+from itertools import islice
 import re
+from typing import Iterable
+from typing import Iterator
 from typing import NamedTuple
 from typing import Pattern
 
@@ -10,6 +17,13 @@ import pynvim
 from pynvim.api import Buffer
 
 from progirl.buffer import ProGirlBuffer
+from progirl.markdown.headings import PATTERN_FENCE
+from progirl.markdown.state import BufferState
+from progirl.markdown.state import get_buffer_state
+from progirl.markdown.state import mirror_buffer_state
+from progirl.markdown.state import refresh_buffer_state
+
+LINK_TARGETS_SECTION = "<!--LINK TARGETS-->"
 
 
 class LinksError(Exception):
@@ -31,11 +45,17 @@ class LinkPattern(NamedTuple):
 
 
 class Link:
+    __slots__ = (
+            "ref_type", "target", "name", "start", "end", "target_start",
+            "target_end"
+    )
     ref_type: LinkRefType
     target: str
     name: str
     start: int
     end: int
+    target_start: int
+    target_end: int
 
     def __init__(
             self,
@@ -65,6 +85,8 @@ class Link:
         )
         self.start = link_match.start()
         self.end = link_match.end()
+        target_span = link_match.span(link_pattern.target_group)
+        self.target_start, self.target_end = target_span
 
     def _init_from_ref(self, ref_source: Link, ref_target: str):
         self.ref_type = LinkRefType.NON_REF
@@ -72,12 +94,60 @@ class Link:
         self.name = ref_source.name
         self.start = ref_source.start
         self.end = ref_source.end
+        self.target_start = ref_source.target_start
+        self.target_end = ref_source.target_end
 
     def __len__(self):
         return self.end - self.start
 
 
+class LineLinks:
+    """Links parsed from a single line, ordered by start column."""
+    __slots__ = ("links", "_starts", "_ends")
+    links: tuple[Link, ...]
+    _starts: array
+    _ends: array
+
+    def __init__(self, links: list[Link]):
+        self.links = tuple(sorted(links, key=lambda link: link.start))
+        self._starts = array("l", (link.start for link in self.links))
+        self._ends = array("l", (link.end for link in self.links))
+
+    def __iter__(self) -> Iterator[Link]:
+        return iter(self.links)
+
+    def __len__(self) -> int:
+        return len(self.links)
+
+    def at(self, col: int) -> Link | None:
+        index = bisect_right(self._starts, col) - 1
+        if (index >= 0) and (col < self._ends[index]):
+            return self.links[index]
+        return None
+
+
+_LINE_LINKS_CACHE_SIZE = 1024
+_MAX_LINKS_PER_LINE = 512
+_LONG_LINE_LEN = 8192
+_LONG_LINE_CHUNK = 8192
+_LONG_LINE_OVERLAP = 2048
 _INVALID_LINK_DESCRIPTION_CHARS = "[]"
+# Appends the ref target lines and applies the ref source edits of a batch in
+# one call so that they form a single undo step, each edit is
+# [line, start_col, end_col, text] and they are sorted bottom up.
+_LUA_ADD_REF_LINKS = """
+local buf, target_lines, edits = ...
+if #target_lines > 0 then
+    vim.api.nvim_buf_set_lines(buf, -1, -1, true, target_lines)
+end
+for _, edit in ipairs(edits) do
+    local line, start_col, end_col, text = unpack(edit)
+    vim.api.nvim_buf_set_text(buf, line, start_col, line, end_col, {text})
+end
+"""
+# The link patterns exclude their own delimiters from their groups (e.g. a
+# name can't contain "[" or "]") so that a failed match attempt stops at the
+# next delimiter, which keeps a search over a line linear in its length.
 _LINK_PATTERNS: list[LinkPattern] = [
         # ref_target link ("^[name]: target")
         LinkPattern(
@@ -90,7 +160,7 @@ _LINK_PATTERNS: list[LinkPattern] = [
         # normal link ("[name](target)")
         LinkPattern(
                 pattern=re
-                .compile(r"\[(?P<name>[^]]+)\]\((?P<target>[^)]*)\)"),
+                .compile(r"\[(?P<name>[^][]+)\]\((?P<target>[^()]*)\)"),
                 ref_type=LinkRefType.NON_REF,
                 target_group="target",
                 name_group="name"
@@ -98,21 +168,21 @@ _LINK_PATTERNS: list[LinkPattern] = [
         # ref_source link ("[name][target]")
         LinkPattern(
                 pattern=re
-                .compile(r"\[(?P<name>[^]]+)\]\[(?P<target>[^]]*)\]"),
+                .compile(r"\[(?P<name>[^][]+)\]\[(?P<target>[^][]*)\]"),
                 ref_type=LinkRefType.REF_SOURCE,
                 target_group="target",
                 name_group="name"
         ),
         # name only ref_source link ("[name]")
         LinkPattern(
-                pattern=re.compile(r"\[(?P<name>\d+|[^]]{2,})\]"),
+                pattern=re.compile(r"\[(?P<name>\d+|[^][]{2,})\]"),
                 ref_type=LinkRefType.REF_SOURCE,
                 target_group="name",
                 name_group="name"
         ),
         # chevron http link ("<http[s]://...>")
         LinkPattern(
-                pattern=re.compile(r"<(?P<target>https?://[^>]+)>"),
+                pattern=re.compile(r"<(?P<target>https?://[^<>]+)>"),
                 ref_type=LinkRefType.NON_REF,
                 target_group="target",
                 name_group=None
@@ -138,37 +208,141 @@ def _find_link(line: str,
     return link, link_pattern.full_line_link
 
 
-def _replace_link_with_blanks(line: str, link: Link) -> str:
-    new_line = line[:link.start] + ' ' * len(link)
-    if link.end < len(line):
-        new_line += line[link.end:]
-    return new_line
+def _blank_spans(line: str, spans: list[tuple[int, int]]) -> str:
+    parts = []
+    last_end = 0
+    for start, end in spans:
+        parts.append(line[last_end:start])
+        parts.append(" " * (end - start))
+        last_end = end
+    parts.append(line[last_end:])
+    return "".join(parts)
+
 
+def _overlaps_any(link: Link, links: list[Link]) -> bool:
+    # A link can enclose the blanked out span of an earlier link, e.g.
+    # "[a [b](c)]", the earlier (higher precedence) link wins.
+    return any(
+            (link.start < other.end) and (other.start < link.end)
+            for other in links
+    )
 
-def _extract_links_from_line(line: str) -> list[Link]:
-    links = []
-    while True:
-        link, full_line_link_found = _find_link(line, _LINK_PATTERNS)
 
-        if link is not None:
-            links.append(link)
-            if full_line_link_found:
-                break
-            else:
-                line = _replace_link_with_blanks(line, link)
+def _extract_links_from_line(line: str,
+                             in_line_start: bool = True) -> list[Link]:
+    """Extract the links of `line`, earlier patterns taking precedence.
+
+    Each pattern collects all its matches in one pass and blanks them out
+    before the next pattern runs, so every pattern scans the line once.
+
+    :param in_line_start: False if `line` is a window into a longer line,
+        which disables the full line patterns.
+    """
+    links: list[Link] = []
+    for link_pattern in _LINK_PATTERNS:
+        if link_pattern.full_line_link:
+            if not in_line_start:
                 continue
+            link_match = link_pattern.pattern.match(line)
+            if link_match is not None:
+                return [Link(link_match, link_pattern)]
+            continue
+        pattern_links = [
+                link for link in (
+                        Link(link_match, link_pattern)
+                        for link_match in islice(
+                                link_pattern.pattern.finditer(line),
+                                _MAX_LINKS_PER_LINE - len(links)
+                        )
+                ) if not _overlaps_any(link, links)
+        ]
+        if pattern_links:
+            links.extend(pattern_links)
+            line = _blank_spans(
+                    line, [(link.start, link.end) for link in pattern_links]
+            )
+    return links
+
 
-        break
+def _extract_links_from_window(line: str, start: int,
+                               end: int) -> list[Link]:
+    """Extract the links of `line[start:end]` with line based columns."""
+    links = _extract_links_from_line(
+            line[start:end], in_line_start=(start == 0)
+    )
+    for link in links:
+        for attr in ("start", "end", "target_start", "target_end"):
+            setattr(link, attr, getattr(link, attr) + start)
+    return links
+
+
+def _extract_links_from_long_line(line: str) -> list[Link]:
+    """Extract links chunk by chunk, each chunk overlapping the next one so
+    that links up to _LONG_LINE_OVERLAP long that cross a chunk boundary
+    are still found."""
+    links: list[Link] = []
+    last_end = 0
+    for chunk_start in range(0, len(line), _LONG_LINE_CHUNK):
+        chunk_end = chunk_start + _LONG_LINE_CHUNK
+        window_links = _extract_links_from_window(
+                line, chunk_start, chunk_end + _LONG_LINE_OVERLAP
+        )
+        for link in sorted(window_links, key=lambda link: link.start):
+            if (last_end <= link.start < chunk_end):
+                links.append(link)
+                last_end = link.end
+        if len(links) >= _MAX_LINKS_PER_LINE:
+            return links[:_MAX_LINKS_PER_LINE]
     return links
 
 
-def _get_ref_target(buffer: Buffer, src_target: str) -> str:
-    ref_targets_map = buffer.vars.get("progirl_markdown_ref_targets", {})
-    ref_target = ref_targets_map.get(src_target, None)
-    if ref_target is None:
-        ref_targets_map = generate_ref_targets_map(buffer)
-        ref_target = ref_targets_map.get(src_target, None)
-    return ref_target
+def get_links_near(line: str, col: int) -> LineLinks:
+    """Return the links of `line` around `col`, long lines are only parsed
+    in a window around `col`."""
+    if len(line) <= _LONG_LINE_LEN:
+        return get_line_links(line)
+    start = max(col - _LONG_LINE_OVERLAP, 0)
+    return LineLinks(
+            _extract_links_from_window(line, start, col + _LONG_LINE_OVERLAP)
+    )
+
+
+@lru_cache(maxsize=_LINE_LINKS_CACHE_SIZE)
+def _get_short_line_links(line: str) -> LineLinks:
+    return LineLinks(_extract_links_from_line(line))
+
+
+def get_line_links(line: str) -> LineLinks:
+    """Parse `line` into a LineLinks, memoized by line content.
+
+    Lines longer than _LONG_LINE_LEN are parsed in chunks and not memoized.
+    The returned object is shared between callers and must not be mutated.
+    """
+    if len(line) > _LONG_LINE_LEN:
+        return LineLinks(_extract_links_from_long_line(line))
+    return _get_short_line_links(line)
+
+
+def _load_ref_targets(buffer: Buffer, state: BufferState) -> dict[str, str]:
+    if state.ref_targets_map is None:
+        lines = buffer[:]
+        try:
+            state.ref_trg_start = lines.index(LINK_TARGETS_SECTION) + 1
+        except ValueError:
+            state.ref_trg_start = None
+        state.ref_targets_map = ref_targets_map_from_lines(lines)
+    return state.ref_targets_map
+
+
+def get_ref_targets_map(buffer: Buffer) -> dict[str, str]:
+    """Return the host side ref targets map of `buffer`, valid until the
+    buffer changes. The map is shared and must not be mutated."""
+    return _load_ref_targets(buffer, get_buffer_state(buffer))
+
+
+def _get_ref_target(buffer: Buffer, src_target: str) -> str | None:
+    ref_targets_map = _load_ref_targets(buffer, get_buffer_state(buffer))
+    return ref_targets_map.get(src_target, None)
 
 
 def _resolve_link(buffer: Buffer, link: Link) -> Link | None:
@@ -184,33 +358,68 @@ def _resolve_link(buffer: Buffer, link: Link) -> Link | None:
     return resolved_link
 
 
+def _get_line_links(state: BufferState, line_num: int,
+                    line: str) -> LineLinks:
+    line_links = state.links_by_line.get(line_num)
+    if line_links is None:
+        line_links = get_line_links(line)
+        state.links_by_line[line_num] = line_links
+    return line_links
+
+
 def _get_link_at_cursor(vim: pynvim.Nvim) -> Link | None:
+    buffer = vim.current.buffer
+    state = get_buffer_state(buffer)
+    cursor_row, cursor_col = vim.current.window.cursor
     line = vim.current.line
-    links = _extract_links_from_line(line)
-    link_at_cursor = None
-    if links is not None:
-        cursor_col = vim.current.window.cursor[1]
-        for link in links:
-            if link.start <= cursor_col < link.end:
-                link_at_cursor = _resolve_link(vim.current.buffer, link)
-                break
-    return link_at_cursor
+    if len(line) > _LONG_LINE_LEN:
+        line_links = get_links_near(line, cursor_col)
+    else:
+        line_links = _get_line_links(state, cursor_row - 1, line)
+    link = line_links.at(cursor_col)
+    return _resolve_link(buffer, link) if link is not None else None
 
 
-def generate_ref_targets_map(buffer: Buffer) -> dict[str, str]:
-    # This function possibly needs to be refactored into separate functions
-    # as it generates the ref_targets_map, applies it to the buffer var
-    # and returns it, which can all be considered separate responsibilities.
+_REF_TARGET_PATTERNS = [
+        link_pattern for link_pattern in _LINK_PATTERNS
+        if link_pattern.ref_type == LinkRefType.REF_TARGET
+]
+
+
+def find_ref_target(line: str) -> Link | None:
+    """Return the ref target defined by `line`, if any."""
+    link, _ = _find_link(line, _REF_TARGET_PATTERNS)
+    return link
+
+
+def ref_targets_map_from_lines(lines: Iterable[str]) -> dict[str, str]:
     ref_targets_map = {}
-    link_patterns = [
-            link_pattern for link_pattern in _LINK_PATTERNS
-            if link_pattern.ref_type == LinkRefType.REF_TARGET
-    ]
-    for line in buffer:
-        link, _ = _find_link(line, link_patterns)
+    in_fence = False
+    for line in lines:
+        if PATTERN_FENCE.match(line):
+            in_fence = not in_fence
+            continue
+        if in_fence:
+            continue
+        link = find_ref_target(line)
         if link is not None:
             ref_targets_map[link.name] = link.target
-    buffer.vars["progirl_markdown_ref_targets"] = ref_targets_map
+    return ref_targets_map
+
+
+def iter_links_from_lines(lines: Iterable[str]) -> Iterator[tuple[int, Link]]:
+    for line_num, line in enumerate(lines):
+        for link in get_line_links(line):
+            yield line_num, link
+
+
+def generate_ref_targets_map(buffer: Buffer) -> dict[str, str]:
+    # Rebuilds the host side ref map and mirrors it to the buffer var for
+    # vimscript consumers, the plugin itself only reads the host side copy.
+    state = get_buffer_state(buffer)
+    state.ref_targets_map = None
+    ref_targets_map = _load_ref_targets(buffer, state)
+    mirror_buffer_state(buffer)
     return ref_targets_map
 
 
@@ -225,19 +434,17 @@ def get_uri_at_cursor(vim: pynvim.Nvim) -> str | None:
 
 def _get_ref_trg_start(progirl_buffer: ProGirlBuffer) -> int:
     buffer = progirl_buffer.buffer
-    try:
-        return buffer[:].index("<!--LINK TARGETS-->") + 1
-    except IndexError:
+    state = get_buffer_state(buffer)
+    _load_ref_targets(buffer, state)
+    if state.ref_trg_start is None:
         raise LinksError("Link targets section missing")
+    return state.ref_trg_start
 
 
 def _add_ref_trg(progirl_buffer: ProGirlBuffer, description: str, target: str):
     buffer = progirl_buffer.buffer
-    # ref_trg_start = get_ref_trg_start(progirl_buffer)
-    try:
-        ref_targets_map = buffer.vars["progirl_markdown_ref_targets"]
-    except KeyError:
-        ref_targets_map = generate_ref_targets_map(progirl_buffer.buffer)
+    state = get_buffer_state(buffer)
+    ref_targets_map = _load_ref_targets(buffer, state)
 
     ref_trg_index = str(
             min(
@@ -249,7 +456,7 @@ def _add_ref_trg(progirl_buffer: ProGirlBuffer, description: str, target: str):
     buffer.append(f"[{ref_trg_index}]: {target}")
     # buffer[ref_trg_start:] = sorted(buffer[ref_trg_start:])
     ref_targets_map[ref_trg_index] = str(target)
-    buffer.vars["progirl_markdown_ref_targets"] = ref_targets_map
+    refresh_buffer_state(buffer, state)
     return ref_trg_index
 
 
@@ -272,3 +479,75 @@ def add_ref_link(progirl_buffer: ProGirlBuffer, description: str, target: str):
     cleaned_description = _clean_description(description)
     ref_trg_index = _add_ref_trg(progirl_buffer, cleaned_description, target)
     _add_ref_src(progirl_buffer, cleaned_description, ref_trg_index)
+
+
+class RefLinkSource(NamedTuple):
+    """Where a batch ref link goes, [start_col, end_col) are byte columns of
+    the text it replaces in `line_num`."""
+    line_num: int
+    start_col: int
+    end_col: int
+
+
+def _assign_ref_indexes(ref_targets_map: dict[str, str],
+                        targets: list[str]) -> tuple[list[str], list[str]]:
+    """Return the ref index of each of `targets`, reusing the index of
+    targets already in `ref_targets_map`, and the ref target lines to add.
+    `ref_targets_map` is updated in place."""
+    index_by_target = {
+            target: index
+            for index, target in reversed(ref_targets_map.items())
+    }
+    free_indexes = (
+            str(index) for index in count()
+            if str(index) not in ref_targets_map
+    )
+    indexes = []
+    target_lines = []
+    for target in targets:
+        ref_trg_index = index_by_target.get(target)
+        if ref_trg_index is None:
+            ref_trg_index = next(free_indexes)
+            index_by_target[target] = ref_trg_index
+            ref_targets_map[ref_trg_index] = target
+            target_lines.append(f"[{ref_trg_index}]: {target}")
+        indexes.append(ref_trg_index)
+    return indexes, target_lines
+
+
+def add_ref_links(
+        progirl_buffer: ProGirlBuffer,
+        links: list[tuple[str, str, RefLinkSource]],
+        separator: str = " ",
+) -> list[str]:
+    """Add many (description, target, source) ref links as one edit.
+
+    The ref indexes are computed in memory, targets already in the buffer
+    keep their index, and all the buffer changes go in one batch, which is
+    also a single undo step. Links sharing a source are joined with
+    `separator`.
+
+    :return: the ref source text written for each link
+    """
+    buffer = progirl_buffer.buffer
+    state = get_buffer_state(buffer)
+    ref_targets_map = _load_ref_targets(buffer, state)
+    indexes, target_lines = _assign_ref_indexes(
+            ref_targets_map, [str(target) for _, target, _ in links]
+    )
+    link_strs = []
+    link_strs_by_source: dict[RefLinkSource, list[str]] = {}
+    for (description, _, source), ref_trg_index in zip(links, indexes):
+        link_str = f"[{_clean_description(description)}][{ref_trg_index}]"
+        link_strs.append(link_str)
+        link_strs_by_source.setdefault(source, []).append(link_str)
+    # Bottom up (and right to left) so earlier edits don't shift later ones.
+    edits = [[*source, separator.join(source_link_strs)]
+             for source, source_link_strs in sorted(
+                     link_strs_by_source.items(), reverse=True
+             )]
+    progirl_buffer.vim.exec_lua(
+            _LUA_ADD_REF_LINKS, buffer.number, target_lines, edits
+    )
+    refresh_buffer_state(buffer, state)
+    return link_strs
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from pynvim.api import Buffer
+
+if TYPE_CHECKING:
+    from progirl.markdown.links import LineLinks
+
+_REF_TARGETS_VAR = "progirl_markdown_ref_targets"
+
+
+class BufferState:
+    """Host side parse results for one buffer, valid for one changedtick."""
+    changedtick: int
+    links_by_line: dict[int, LineLinks]
+    ref_targets_map: dict[str, str] | None
+    ref_trg_start: int | None
+    mirrored: bool
+
+    def __init__(self, changedtick: int):
+        self.changedtick = changedtick
+        self.links_by_line = {}
+        self.ref_targets_map = None
+        self.ref_trg_start = None
+        self.mirrored = False
+
+
+_buffer_states: dict[int, BufferState] = {}
+
+
+def get_buffer_state(buffer: Buffer) -> BufferState:
+    changedtick = buffer.api.get_changedtick()
+    state = _buffer_states.get(buffer.number)
+    if (state is None) or (state.changedtick != changedtick):
+        state = BufferState(changedtick)
+        _buffer_states[buffer.number] = state
+    return state
+
+
+def refresh_buffer_state(buffer: Buffer, state: BufferState):
+    """Mark `state` as up to date after the plugin edited `buffer` itself."""
+    state.changedtick = buffer.api.get_changedtick()
+    state.links_by_line.clear()
+    state.mirrored = False
+
+
+def drop_buffer_state(bufnr: int):
+    _buffer_states.pop(bufnr, None)
+
+
+def mirror_buffer_state(buffer: Buffer):
+    """Copy the cached ref map into the b: variable if it is stale."""
+    state = _buffer_states.get(buffer.number)
+    if (state is None) or state.mirrored or (state.ref_targets_map is None):
+        return
+    buffer.vars[_REF_TARGETS_VAR] = state.ref_targets_map
+    state.mirrored = True
@@ -0,0 +1,171 @@
+"""Compact storage for the parsed links of many lines.
+
+A LinkTable keeps its links column wise, one array per Link attribute plus
+a table of interned strings the targets and names index into, which costs
+a few dozen bytes per link instead of a Link object with its own strings.
+Indexing a table gives read-only LinkView objects that quack like Link.
+"""
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left
+from bisect import bisect_right
+import sys
+from typing import Any
+from typing import Iterable
+from typing import Iterator
+
+from progirl.markdown.links import Link
+from progirl.markdown.links import LinkRefType
+from progirl.markdown.links import get_line_links
+
+_REF_TYPES = list(LinkRefType)
+_REF_TYPE_CODES = {ref_type: code for code, ref_type in enumerate(_REF_TYPES)}
+_INT_COLUMNS = (
+        "line_nums", "starts", "ends", "target_starts", "target_ends",
+        "targets", "names"
+)
+
+
+class LinkView:
+    """A Link compatible read-only view of one link of a LinkTable."""
+    __slots__ = ("_table", "_index")
+    _table: LinkTable
+    _index: int
+
+    def __init__(self, table: LinkTable, index: int):
+        self._table = table
+        self._index = index
+
+    @property
+    def line_num(self) -> int:
+        return self._table._line_nums[self._index]
+
+    @property
+    def ref_type(self) -> LinkRefType:
+        return _REF_TYPES[self._table._ref_types[self._index]]
+
+    @property
+    def target(self) -> str:
+        return self._table._strings[self._table._targets[self._index]]
+
+    @property
+    def name(self) -> str:
+        return self._table._strings[self._table._names[self._index]]
+
+    @property
+    def start(self) -> int:
+        return self._table._starts[self._index]
+
+    @property
+    def end(self) -> int:
+        return self._table._ends[self._index]
+
+    @property
+    def target_start(self) -> int:
+        return self._table._target_starts[self._index]
+
+    @property
+    def target_end(self) -> int:
+        return self._table._target_ends[self._index]
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+
+class LinkTable:
+    """Links in (line_num, start) order, see the module docstring."""
+    __slots__ = (
+            "_line_nums", "_starts", "_ends", "_target_starts",
+            "_target_ends", "_targets", "_names", "_ref_types", "_strings",
+            "_string_ids"
+    )
+    _line_nums: array
+    _starts: array
+    _ends: array
+    _target_starts: array
+    _target_ends: array
+    _targets: array
+    _names: array
+    _ref_types: array
+    _strings: list[str]
+    _string_ids: dict[str, int]
+
+    def __init__(self):
+        for column in _INT_COLUMNS:
+            setattr(self, f"_{column}", array("l"))
+        self._ref_types = array("b")
+        self._strings = []
+        self._string_ids = {}
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[str]) -> LinkTable:
+        table = cls()
+        for line_num, line in enumerate(lines):
+            for link in get_line_links(line):
+                table.append(line_num, link)
+        return table
+
+    def _string_id(self, string: str) -> int:
+        string_id = self._string_ids.get(string)
+        if string_id is None:
+            string_id = len(self._strings)
+            self._strings.append(sys.intern(string))
+            self._string_ids[string] = string_id
+        return string_id
+
+    def append(self, line_num: int, link: Link | LinkView):
+        """Append `link` of line `line_num`, which must not come before the
+        last appended line."""
+        self._line_nums.append(line_num)
+        self._starts.append(link.start)
+        self._ends.append(link.end)
+        self._target_starts.append(link.target_start)
+        self._target_ends.append(link.target_end)
+        self._targets.append(self._string_id(link.target))
+        self._names.append(self._string_id(link.name))
+        self._ref_types.append(_REF_TYPE_CODES[link.ref_type])
+
+    def __len__(self) -> int:
+        return len(self._line_nums)
+
+    def __getitem__(self, index: int) -> LinkView:
+        if not -len(self) <= index < len(self):
+            raise IndexError("link table index out of range")
+        return LinkView(self, index % len(self))
+
+    def __iter__(self) -> Iterator[tuple[int, LinkView]]:
+        """Yield (line_num, link) like iter_links_from_lines."""
+        for index, line_num in enumerate(self._line_nums):
+            yield line_num, LinkView(self, index)
+
+    def line_links(self, line_num: int) -> list[LinkView]:
+        return [
+                LinkView(self, index) for index in range(
+                        bisect_left(self._line_nums, line_num),
+                        bisect_right(self._line_nums, line_num)
+                )
+        ]
+
+    def to_columns(self) -> dict[str, Any]:
+        """Return the table as json serializable columns."""
+        columns: dict[str, Any] = {
+                column: getattr(self, f"_{column}").tolist()
+                for column in _INT_COLUMNS
+        }
+        columns["ref_types"] = self._ref_types.tolist()
+        columns["strings"] = list(self._strings)
+        return columns
+
+    @classmethod
+    def from_columns(cls, columns: dict[str, Any]) -> LinkTable:
+        table = cls()
+        for column in _INT_COLUMNS:
+            getattr(table, f"_{column}").extend(columns[column])
+        table._ref_types.extend(columns["ref_types"])
+        table._strings = [sys.intern(string) for string in columns["strings"]]
+        table._string_ids = {
+                string: string_id
+                for string_id, string in enumerate(table._strings)
+        }
+        return table
@@ -1,3 +1,12 @@
+from .listing import DirListingCache
+from .listing import dir_listing_cache
+from .statcache import StatCache
+from .statcache import stat_cache
+from .storage import DURABILITIES
+from .storage import durable_batch
+from .storage import make_dirs
+from .storage import replace
+from .storage import write_atomic
 from .utils import expand_path
 from .utils import get_context_pwd
 from .utils import is_valid_path
@@ -0,0 +1,47 @@
+from collections import OrderedDict
+import os
+import threading
+
+_DIR_LISTINGS_MAX = 256
+
+
+class DirListingCache:
+    """Directory listings validated by the directory mtime, so repeated
+    existence checks in one directory cost a single stat."""
+    _entries: OrderedDict[str, tuple[int, frozenset[str]]]
+
+    def __init__(self, max_size: int = _DIR_LISTINGS_MAX):
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def names(self, dir_path_str: str) -> frozenset[str]:
+        try:
+            mtime_ns = os.stat(dir_path_str).st_mtime_ns
+        except OSError:
+            return frozenset()
+        with self._lock:
+            entry = self._entries.get(dir_path_str)
+            if (entry is not None) and (entry[0] == mtime_ns):
+                self._entries.move_to_end(dir_path_str)
+                return entry[1]
+        try:
+            names = frozenset(os.listdir(dir_path_str))
+        except OSError:
+            return frozenset()
+        with self._lock:
+            self._entries[dir_path_str] = (mtime_ns, names)
+            self._entries.move_to_end(dir_path_str)
+            if len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+        return names
+
+    def invalidate(self, dir_path_str: str | None = None):
+        with self._lock:
+            if dir_path_str is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(dir_path_str, None)
+
+
+dir_listing_cache = DirListingCache()
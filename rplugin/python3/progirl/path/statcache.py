@@ -0,0 +1,41 @@
+import os.path as osp
+import threading
+import time
+
+_STAT_CACHE_TTL = 5.0
+_STAT_CACHE_MAX = 8192
+
+
+class StatCache:
+    """Thread safe, short lived cache of path existence checks."""
+    _entries: dict[str, tuple[float, bool]]
+
+    def __init__(self, ttl: float = _STAT_CACHE_TTL,
+                 max_size: int = _STAT_CACHE_MAX):
+        self._ttl = ttl
+        self._max_size = max_size
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def exists(self, path_str: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(path_str)
+        if (entry is not None) and (now - entry[0] < self._ttl):
+            return entry[1]
+        exists = osp.exists(path_str)
+        with self._lock:
+            if len(self._entries) >= self._max_size:
+                self._entries.clear()
+            self._entries[path_str] = (now, exists)
+        return exists
+
+    def invalidate(self, path_str: str | None = None):
+        with self._lock:
+            if path_str is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(path_str, None)
+
+
+stat_cache = StatCache()
@@ -0,0 +1,185 @@
+"""Atomic file writes with a configurable durability.
+
+write_atomic writes to a temporary file next to its target and renames it
+over the target, so neither readers nor a crash ever see a partial file.
+What is on disk when a write returns depends on the durability
+(g:progirl_durability):
+
+- "none": nothing is fsynced, the OS flushes whenever it likes, a crash
+  can leave an empty or partial file under the target name
+- "always": the data is fsynced before the rename and the directory after
+  it, on every write
+- "batch": like "always" outside of a durable_batch(). Inside one the data
+  of each file is still fsynced before its rename, only the directory
+  fsyncs are deferred to the end of the batch and done once per directory.
+  So a batch saves the directory fsyncs, not the per file data fsyncs. A
+  crash inside a batch can lose whole writes of the batch (the renames),
+  but never leaves an empty or partial file under a target name.
+"""
+from contextlib import contextmanager
+import os
+import os.path as osp
+import secrets
+import threading
+from typing import Iterator
+
+from progirl.globals import config
+
+DURABILITIES = ("none", "batch", "always")
+_DEFAULT_DURABILITY = "batch"
+_TMP_FLAGS = os.O_CREAT | os.O_EXCL | os.O_WRONLY | getattr(os, "O_CLOEXEC", 0)
+
+
+class _Batch(threading.local):
+    depth = 0
+    dirs: set[str]
+
+    def __init__(self):
+        self.dirs = set()
+
+
+_batch = _Batch()
+
+
+def _durability(durability: str | None) -> str:
+    if durability is None:
+        durability = config.get("durability", _DEFAULT_DURABILITY)
+    if durability not in DURABILITIES:
+        raise ValueError(f"invalid durability: {durability}")
+    if (durability == "batch") and (_batch.depth == 0):
+        return "always"
+    return durability
+
+
+def _fsync_path(path_str: str):
+    try:
+        fd = os.open(path_str, os.O_RDONLY)
+    except OSError:
+        # gone since, or a directory on a platform that can't open one
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _sync_dirs(durability: str, dirs: list[str]):
+    if durability == "always":
+        for dir_path in dirs:
+            _fsync_path(dir_path)
+    elif durability == "batch":
+        _batch.dirs.update(dirs)
+
+
+def flush():
+    """fsync the directories touched so far in the current batch."""
+    dirs = _batch.dirs
+    _batch.dirs = set()
+    for dir_path in sorted(dirs):
+        _fsync_path(dir_path)
+
+
+@contextmanager
+def durable_batch() -> Iterator[None]:
+    """Defer the directory fsyncs of "batch" durability writes until the
+    outermost batch exits."""
+    _batch.depth += 1
+    try:
+        yield
+    finally:
+        _batch.depth -= 1
+        if _batch.depth == 0:
+            flush()
+
+
+def make_dirs(path_str: str, durability: str | None = None):
+    """Create directory `path_str` and its missing parents, a no-op if it
+    exists, also when another process creates it at the same time."""
+    durability = _durability(durability)
+    new_dirs = []
+    parent = path_str
+    while not osp.isdir(parent):
+        new_dirs.append(parent)
+        parent = osp.dirname(parent)
+    if not new_dirs:
+        return
+    os.makedirs(path_str, exist_ok=True)
+    # each new directory is an entry of its parent
+    _sync_dirs(durability, [osp.dirname(new_dir) for new_dir in new_dirs])
+
+
+def _link_or_replace(tmp_path: str, path_str: str, exclusive: bool):
+    if not exclusive:
+        os.replace(tmp_path, path_str)
+        return
+    try:
+        # unlike a rename, fails if the target exists
+        os.link(tmp_path, path_str)
+    except FileExistsError:
+        raise
+    except OSError:
+        # no hard links on this filesystem
+        if osp.exists(path_str):
+            raise FileExistsError(path_str)
+        os.replace(tmp_path, path_str)
+    else:
+        os.unlink(tmp_path)
+
+
+def _create_tmp(path_str: str) -> tuple[int, str]:
+    """Create a temporary file next to `path_str`, with the mode open()
+    would create `path_str` with under the current umask."""
+    while True:
+        tmp_path = osp.join(
+                osp.dirname(path_str),
+                f".{osp.basename(path_str)}.{secrets.token_hex(4)}~"
+        )
+        try:
+            return os.open(tmp_path, _TMP_FLAGS, 0o666), tmp_path
+        except FileExistsError:
+            continue
+
+
+def write_atomic(
+        path_str: str,
+        data: str | bytes,
+        durability: str | None = None,
+        exclusive: bool = False
+):
+    """Replace the content of `path_str` with `data` in one step, creating
+    its directory if needed.
+
+    :param durability: one of DURABILITIES, config.durability if None
+    :param exclusive: only create `path_str`, don't replace it
+    :raise FileExistsError: if `exclusive` and `path_str` exists
+    """
+    durability = _durability(durability)
+    dir_path = osp.dirname(path_str)
+    make_dirs(dir_path, durability)
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    fd, tmp_path = _create_tmp(path_str)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            if durability != "none":
+                # the data must be on disk before the name points to it
+                f.flush()
+                os.fsync(f.fileno())
+        _link_or_replace(tmp_path, path_str, exclusive)
+    except BaseException:
+        if osp.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    _sync_dirs(durability, [dir_path])
+
+
+def replace(src_path: str, dst_path: str, durability: str | None = None):
+    """os.replace with the durability of write_atomic."""
+    durability = _durability(durability)
+    os.replace(src_path, dst_path)
+    _sync_dirs(durability,
+               list({osp.dirname(src_path),
+                     osp.dirname(dst_path)}))
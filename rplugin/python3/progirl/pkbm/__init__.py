@@ -1,11 +1,57 @@
+from .archive import ArchiveError
+from .archive import NoteArchive
+from .archive import archive_note_dir
+from .archive import get_note_archive
+from .archive import is_archive_collection
+from .archive import is_archive_note_name
+from .archive import load_archive_buffer
+from .archive import pack_notes
+from .check import cancel_index_jobs
+from .check import check_collection_links
 from .config import get_c_id
 from .config import load_config
+from .config import load_config_from_vars
+from .config import on_config_reloaded
+from .config import reload_config
+from .config import reload_config_from_vars
 from .config import set_active_c_id
+from .config import watch_config
 from .create import NoteInfo
+from .create import add_lines_ref_links
 from .create import add_note_ref_link
+from .create import add_note_ref_links
+from .create import add_qf_ref_links
+from .create import clean_titles
 from .create import create_note
+from .create import create_note_headless
 from .create import edit_note
+from .federated import find_first_note_federated
+from .federated import find_in_collection
+from .federated import find_notes_federated
+from .federated import is_federated_protocol
+from .federated import order_collections
+from .id_index import AutoIdIndex
+from .id_index import get_auto_id_index
+from .id_index import resolve_auto_id
+from .key import LinkResolver
+from .key import PKBM_RESOLVERS
+from .key import NoteKey
+from .key import link_cache_key
+from .key import link_resolver
+from .key import note_key
+from .key import note_key_of_path
+from .key import note_key_of_uri
+from .recent import RecentIndex
+from .recent import get_recent_index
+from .recent import recent_notes
+from .recent import record_buffer_visit
+from .recent import record_visit
+from .recent import save_recent_indexes
+from .recent import select_recent_note
 from .resolve import resolve_uri_as_path
+from .resolve import resolve_uri_federated
+from .resolve import resolve_uri_in_collection
+from .utils import get_buffer_c_id
 from .utils import get_c_id_by_path
 from .utils import get_collection_auto_id
 from .utils import get_collection_by_c_id
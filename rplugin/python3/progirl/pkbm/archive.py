@@ -0,0 +1,269 @@
+"""Read-only packed archive collections.
+
+An archive holds the notes of a collection in one file, memory-mapped for
+random access:
+
+    header   magic, note count, index offset
+    data     the note paths and contents, back to back
+    index    one (path offset, path length, data offset, data length)
+             record per note, sorted by path
+
+Lookups bisect the index in place, so opening an archive costs the same
+for a hundred notes as for a million. Archive notes are named
+"<c_id>://<path>" and open as read-only scratch buffers.
+"""
+from collections import OrderedDict
+import mmap
+import os
+import os.path as osp
+import struct
+import threading
+from typing import Iterator
+
+import pynvim
+
+from progirl.globals import config
+from progirl.uri import URI
+from progirl.utils import AttrDict
+from progirl.worker.scan import iter_note_paths
+
+_MAGIC = b"PKBA\x00\x00\x00\x01"
+_HEADER = struct.Struct("<8sQQ")
+_RECORD = struct.Struct("<QIQQ")
+_ARCHIVES_MAX = 16
+_NAME_SEPARATOR = "://"
+
+# Fills the current buffer with an archive note, the buffer is a scratch
+# buffer so it is never written back.
+_LUA_LOAD_ARCHIVE_BUFFER = """
+local lines = ...
+vim.bo.buftype = "nofile"
+vim.bo.swapfile = false
+vim.bo.modifiable = true
+vim.api.nvim_buf_set_lines(0, 0, -1, false, lines)
+vim.bo.modifiable = false
+vim.bo.modified = false
+vim.bo.filetype = "markdown"
+"""
+
+
+class ArchiveError(Exception):
+    pass
+
+
+class NoteArchive:
+    _mmap: mmap.mmap
+    _count: int
+    _index_offset: int
+
+    def __init__(self, archive_path: str):
+        with open(archive_path, "rb") as f:
+            try:
+                self._mmap = mmap.mmap(
+                        f.fileno(), 0, access=mmap.ACCESS_READ
+                )
+            except ValueError:
+                # an empty file can't be mapped
+                raise ArchiveError(f"not a note archive: {archive_path}")
+        if len(self._mmap) < _HEADER.size:
+            raise ArchiveError(f"not a note archive: {archive_path}")
+        magic, self._count, self._index_offset = _HEADER.unpack_from(
+                self._mmap
+        )
+        if magic != _MAGIC:
+            raise ArchiveError(f"not a note archive: {archive_path}")
+        if (self._index_offset + self._count * _RECORD.size
+                > len(self._mmap)):
+            raise ArchiveError(f"truncated note archive: {archive_path}")
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _record(self, index: int) -> tuple[int, int, int, int]:
+        return _RECORD.unpack_from(
+                self._mmap, self._index_offset + index * _RECORD.size
+        )
+
+    def _path_at(self, index: int) -> bytes:
+        path_offset, path_len, _, _ = self._record(index)
+        return self._mmap[path_offset:path_offset + path_len]
+
+    def _find(self, rel_path: str) -> int | None:
+        key = rel_path.encode("utf-8")
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._path_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if (low < self._count) and (self._path_at(low) == key):
+            return low
+        return None
+
+    def __contains__(self, rel_path: str) -> bool:
+        return self._find(rel_path) is not None
+
+    def read(self, rel_path: str) -> str | None:
+        index = self._find(rel_path)
+        if index is None:
+            return None
+        _, _, data_offset, data_len = self._record(index)
+        return self._mmap[data_offset:data_offset + data_len].decode(
+                "utf-8", errors="replace"
+        )
+
+    def paths(self) -> Iterator[str]:
+        for index in range(self._count):
+            yield self._path_at(index).decode("utf-8", errors="replace")
+
+    def close(self):
+        self._mmap.close()
+
+
+def pack_notes(notes_path: str, extension: str, archive_path: str) -> int:
+    """Pack the notes under `notes_path` into `archive_path`.
+
+    :return: the number of packed notes
+    """
+    rel_paths = sorted(
+            (osp.relpath(path_str, notes_path).encode("utf-8"), path_str)
+            for path_str in iter_note_paths(notes_path, extension)
+    )
+    records = []
+    tmp_path = archive_path + "~"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, 0, 0))
+        for rel_path, path_str in rel_paths:
+            path_offset = f.tell()
+            f.write(rel_path)
+            with open(path_str, "rb") as note_file:
+                data = note_file.read()
+            data_offset = f.tell()
+            f.write(data)
+            records.append(
+                    (path_offset, len(rel_path), data_offset, len(data))
+            )
+        index_offset = f.tell()
+        for record in records:
+            f.write(_RECORD.pack(*record))
+        f.seek(0)
+        f.write(_HEADER.pack(_MAGIC, len(records), index_offset))
+    os.replace(tmp_path, archive_path)
+    return len(records)
+
+
+_archives: OrderedDict[str, tuple[int, NoteArchive]] = OrderedDict()
+_archives_lock = threading.Lock()
+
+
+def get_note_archive(archive_path: str) -> NoteArchive:
+    """Return the (cached) archive at `archive_path`, reopened when the file
+    is replaced."""
+    mtime_ns = os.stat(archive_path).st_mtime_ns
+    with _archives_lock:
+        entry = _archives.get(archive_path)
+        if (entry is not None) and (entry[0] == mtime_ns):
+            _archives.move_to_end(archive_path)
+            return entry[1]
+        archive = NoteArchive(archive_path)
+        _archives[archive_path] = (mtime_ns, archive)
+        if len(_archives) > _ARCHIVES_MAX:
+            # Not closed here, a lookup in another thread may still use it.
+            _archives.popitem(last=False)
+    return archive
+
+
+def is_archive_collection(collection: AttrDict) -> bool:
+    return collection.get("archive", "") != ""
+
+
+def archive_note_name(c_id: str, rel_path: str) -> str:
+    return f"{c_id}{_NAME_SEPARATOR}{rel_path}"
+
+
+def parse_archive_note_name(name: str) -> tuple[AttrDict, str] | None:
+    """Return the archive collection and note path of an archive note name,
+    or None if `name` is not one."""
+    c_id, separator, rel_path = name.partition(_NAME_SEPARATOR)
+    collection = config.collections.get(c_id)
+    if ((separator == "") or (collection is None)
+            or not is_archive_collection(collection)):
+        return None
+    return collection, rel_path
+
+
+def is_archive_note_name(name: str) -> bool:
+    return parse_archive_note_name(name) is not None
+
+
+def archive_note_dir(name: str) -> str | None:
+    """Return the "<c_id>://<dir>" directory of archive note `name`, the
+    context_pwd of its relative links, None if `name` is not one."""
+    parsed = parse_archive_note_name(name)
+    if parsed is None:
+        return None
+    collection, rel_path = parsed
+    return archive_note_name(collection._id, osp.dirname(rel_path))
+
+
+def archive_rel_path(body: str, collection: AttrDict,
+                     context_pwd: str | None = None) -> str:
+    """Return the note path in the archive of `collection` that the URI
+    body `body` points to.
+
+    :param context_pwd: relative paths are taken from it if it is an
+        archive_note_dir of `collection`, else from the archive root
+    """
+    context = (
+            parse_archive_note_name(context_pwd)
+            if context_pwd is not None else None
+    )
+    if ((context is not None) and (context[0] is collection)
+            and not body.startswith("/")):
+        body = osp.join(context[1], body)
+    return osp.normpath("/" + body.lstrip("/")).lstrip("/")
+
+
+def resolve_uri_in_archive(uri: URI, collection: AttrDict,
+                           context_pwd: str | None = None) -> str | None:
+    """Return the archive note name `uri` points to, or None if the note is
+    not in the archive."""
+    rel_path = archive_rel_path(uri.body, collection, context_pwd)
+    try:
+        archive = get_note_archive(collection.archive)
+    except (OSError, ArchiveError):
+        return None
+    if rel_path not in archive:
+        return None
+    return archive_note_name(collection._id, rel_path)
+
+
+def find_in_archive(collection: AttrDict, query: str) -> list[str]:
+    words = query.lower().split()
+    try:
+        archive = get_note_archive(collection.archive)
+    except (OSError, ArchiveError):
+        return []
+    return [
+            archive_note_name(collection._id, rel_path)
+            for rel_path in archive.paths()
+            if all(word in rel_path.lower() for word in words)
+    ]
+
+
+def load_archive_buffer(vim: pynvim.Nvim, name: str):
+    """Fill the current buffer, named `name`, with its archive note."""
+    parsed = parse_archive_note_name(name)
+    content = None
+    if parsed is not None:
+        collection, rel_path = parsed
+        try:
+            content = get_note_archive(collection.archive).read(rel_path)
+        except (OSError, ArchiveError) as err:
+            vim.api.echo([[f"can't read archive: {err}"]], True, {})
+            return
+    if content is None:
+        vim.api.echo([[f"'{name}' not found in archive"]], True, {})
+        return
+    vim.exec_lua(_LUA_LOAD_ARCHIVE_BUFFER, content.splitlines())
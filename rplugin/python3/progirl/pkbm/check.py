@@ -0,0 +1,77 @@
+import os.path as osp
+
+import pynvim
+
+from progirl.globals import config
+from progirl.pkbm.archive import is_archive_collection
+from progirl.pkbm.exceptions import CollectionError
+from progirl.pkbm.utils import get_collection_by_c_id
+from progirl.pkbm.utils import get_current_c_id
+from progirl.worker import Response
+from progirl.worker import ResponseKind
+from progirl.worker import get_index_worker
+
+_CACHE_DIR = ".pkb"
+
+
+def _echo_progress(vim: pynvim.Nvim, c_id: str, done: int, total: int):
+    vim.api.echo([[f"{c_id}: checking links {done}/{total}"]], False, {})
+
+
+def _set_broken_links_qflist(
+        vim: pynvim.Nvim, c_id: str, broken: list[tuple[str, int, int, str]]
+):
+    items = [{
+            "filename": path_str,
+            "lnum": line_num + 1,
+            "col": col + 1,
+            "text": f"broken link: {target}",
+    } for path_str, line_num, col, target in broken]
+    vim.funcs.setqflist([], " ", {
+            "title": f"{c_id} broken links",
+            "items": items
+    })
+    vim.api.echo([[f"{c_id}: {len(items)} broken links"]], True, {})
+
+
+def _handle_check_response(vim: pynvim.Nvim, c_id: str, response: Response):
+    if response.kind is ResponseKind.PROGRESS:
+        _echo_progress(vim, c_id, *response.payload)
+    elif response.kind is ResponseKind.RESULT:
+        _set_broken_links_qflist(vim, c_id, response.payload)
+    elif response.kind is ResponseKind.CANCELLED:
+        vim.api.echo([[f"{c_id}: link check cancelled"]], True, {})
+    else:
+        vim.api.echo([[f"{c_id}: link check failed: {response.payload}"]],
+                     True, {})
+
+
+def check_collection_links(vim: pynvim.Nvim, args: list[str]):
+    try:
+        c_id = args[0] if args else get_current_c_id(vim, check_cb=True)
+        collection = get_collection_by_c_id(c_id)
+    except CollectionError as err:
+        vim.api.echo([err.args], True, {})
+        return
+
+    worker_args = {
+            "notes_path": collection.notes_path,
+            "extension": collection.extension,
+            "cache_dir": osp.join(collection.path, _CACHE_DIR),
+            "collections": {
+                    c_id_: c.notes_path
+                    for c_id_, c in config.collections.items()
+                    if not is_archive_collection(c)
+            },
+    }
+    get_index_worker().submit(
+            "check_links",
+            worker_args,
+            lambda response: vim.async_call(
+                    _handle_check_response, vim, c_id, response
+            ),
+    )
+
+
+def cancel_index_jobs(vim: pynvim.Nvim):
+    get_index_worker().cancel()
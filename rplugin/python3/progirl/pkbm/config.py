@@ -1,9 +1,13 @@
 from copy import deepcopy
 import re
+from typing import Any
+from typing import Callable
+from typing import Mapping
 
 import pynvim
 
 from progirl.globals import config
+from progirl.path import DURABILITIES
 from progirl.path import resolve_path_with_context
 from progirl.pkbm.exceptions import CollectionError
 from progirl.utils import AttrDict
@@ -17,22 +21,112 @@ _DEFAULT_COLLECTION = {
         "filename_template": "%s-${TITLE_CLEAN}${EXTENSION}",
         "templates_path": "/templates",
         "default_template": "/templates/note.tpl",
+        "export_path": "/export",
+        # packed archive file, makes the collection a read-only archive
+        "archive": "",
 }
 _CONTEXTED_PATH_KEYS = [
-        "notes_path", "templates_path", "default_template"
+        "notes_path", "templates_path", "default_template", "export_path"
 ]
 _PATTERN_VALID_COLLECTION_NAME = re.compile(r"[a-z0-9_]+")
 
+# collection id to the raw collection it was loaded from
+_raw_collections: dict[str, dict] = {}
+_reload_callbacks: list[Callable[[set[str]], None]] = []
+_WATCHED_VARS = [
+        "progirl_pkb_prefix", "progirl_collections", "progirl_durability"
+]
+
 
 def load_config(vim: pynvim.Nvim):
+    return load_config_from_vars(vim.vars)
+
+
+def on_config_reloaded(callback: Callable[[set[str]], None]):
+    """Register `callback` to be called with the ids of the added, changed
+    and removed collections after each config reload that changed any."""
+    _reload_callbacks.append(callback)
+
+
+def reload_config(vim: pynvim.Nvim):
+    try:
+        changed = reload_config_from_vars(vim.vars)
+    except CollectionError as err:
+        vim.api.echo([[f"config not reloaded: {err}"]], True, {})
+        return
+    vim.api.echo([[f"config reloaded, changed: {' '.join(sorted(changed))}"
+                   if changed else "config reloaded, nothing changed"]],
+                 False, {})
+
+
+def watch_config(vim: pynvim.Nvim, callback_name: str):
+    """Call the function `callback_name` whenever a config var changes, if
+    g:progirl_watch_config is set."""
+    if not vim.vars.get("progirl_watch_config", False):
+        return
+    for name in _WATCHED_VARS:
+        vim.command(f"call dictwatcheradd(g:, '{name}', "
+                    f"{{d, k, c -> {callback_name}(k)}})")
+
+
+def reload_config_from_vars(vars_: Mapping[str, Any]) -> set[str]:
+    """Reload the config, resolving again only the collections whose raw
+    config changed. The config is kept as it was if the new one is invalid.
+
+    :return: the ids of the added, changed and removed collections
+    :raises CollectionError: for an invalid config
+    """
+    durability = _get_durability(vars_)
+    old_pkb_prefix = config.pkb_prefix
+    old_collections = config.collections
+    old_raw_collections = dict(_raw_collections)
+    config.pkb_prefix = vars_.get("progirl_pkb_prefix", "pkb-")
+    try:
+        _load_collections_config(vars_)
+    except CollectionError:
+        config.pkb_prefix = old_pkb_prefix
+        config.collections = old_collections
+        _raw_collections.clear()
+        _raw_collections.update(old_raw_collections)
+        raise
+    config.durability = durability
+
+    changed = {
+            c_id
+            for c_id in old_collections.keys() | config.collections.keys()
+            if old_collections.get(c_id) is not config.collections.get(c_id)
+    }
+    for c_id in changed - config.collections.keys():
+        _raw_collections.pop(c_id, None)
+    if changed:
+        for callback in _reload_callbacks:
+            callback(changed)
+    return changed
+
+
+def load_config_from_vars(vars_: Mapping[str, Any]) -> AttrDict:
+    """Load the config from a mapping of `g:progirl_*` variable names
+    (without the `g:`) to values, e.g. vim.vars or a parsed json file."""
     config.clear()
+    _raw_collections.clear()
 
-    config.pkb_prefix = vim.vars.get("progirl_pkb_prefix", "pkb-")
-    _load_collections_config(vim)
+    config.pkb_prefix = vars_.get("progirl_pkb_prefix", "pkb-")
+    config.durability = _get_durability(vars_)
+    _load_collections_config(vars_)
 
     return config
 
 
+def _get_durability(vars_: Mapping[str, Any]) -> str:
+    durability = vars_.get("progirl_durability", "batch")
+    if durability not in DURABILITIES:
+        raise CollectionError(
+                f"Invalid durability '{durability}', "
+                f"durability must be one of {', '.join(DURABILITIES)}"
+        )
+    return durability
+
+
 def _load_c_config(raw_collection: dict) -> AttrDict:
     collection = AttrDict(deepcopy(_DEFAULT_COLLECTION))
     collection.update(raw_collection)
@@ -56,6 +150,13 @@ def _load_c_config(raw_collection: dict) -> AttrDict:
                 context_root=context_root,
                 real=True
         )
+    if collection.archive != "":
+        collection.archive = resolve_path_with_context(
+                collection.archive,
+                context_pwd=context_pwd,
+                context_root=context_root,
+                real=True
+        )
 
     return collection
 
@@ -92,22 +193,31 @@ def get_c_id(collection: AttrDict) -> str:
     return config.pkb_prefix + c_name
 
 
-def _load_collections_config(vim: pynvim.Nvim):
-    collections_list = vim.vars.get("progirl_collections", [])
+def _load_or_reuse_c_config(raw_collection: dict) -> AttrDict:
+    """Return the loaded collection of `raw_collection`, reusing the current
+    one if it was loaded from the same raw collection."""
+    c_id = get_c_id(AttrDict({**_DEFAULT_COLLECTION, **raw_collection}))
+    old_collection = config.get("collections", {}).get(c_id)
+    if (old_collection is not None) and (_raw_collections.get(c_id)
+                                         == raw_collection):
+        return old_collection
+    collection = _load_c_config(raw_collection)
+    _raw_collections[c_id] = deepcopy(raw_collection)
+    return collection
 
-    if collections_list != []:
-        collections = {
-                collection._id: collection
-                for collection in (
-                        _load_c_config(raw_collection)
-                        for raw_collection in collections_list
-                )
-        }
-        active_c_name = collections_list[0]["name"]
-    else:
-        default_collection = _load_c_config({})
-        collections = {default_collection._id: default_collection}
-        active_c_name = default_collection["name"]
 
+def _load_collections_config(vars_: Mapping[str, Any]):
+    collections_list = vars_.get("progirl_collections", []) or [{}]
+
+    collections = {
+            collection._id: collection
+            for collection in (
+                    _load_or_reuse_c_config(raw_collection)
+                    for raw_collection in collections_list
+            )
+    }
+    active_c_id = config.get("active_c_id")
     config.collections = AttrDict(collections)
-    set_active_c_id(active_c_name)
+    if active_c_id not in collections:
+        active_c_id = next(iter(collections))
+    config.active_c_id = active_c_id
@@ -1,6 +1,7 @@
 from datetime import datetime
+from functools import lru_cache
+from itertools import islice
 import os.path as osp
-from pathlib import Path
 import re
 import string
 import typing as t
@@ -9,13 +10,21 @@ import pynvim
 
 from progirl.buffer import ProGirlBuffer
 from progirl.globals import config
+from progirl.markdown import RefLinkSource
 from progirl.markdown import add_ref_link as md_add_ref_link
+from progirl.markdown import add_ref_links as md_add_ref_links
+from progirl.path import dir_listing_cache
+from progirl.path import durable_batch
 from progirl.path import get_context_pwd
 from progirl.path import resolve_path_with_context
-from progirl.path import touch_with_mkdir
+from progirl.path import write_atomic
 from progirl.pkbm.exceptions import CollectionError
+from progirl.pkbm.id_index import add_auto_id
+from progirl.pkbm.recent import record_visit
+from progirl.pkbm.utils import TEMP_PROJECT_CARD_TEMPLATE
 from progirl.pkbm.utils import get_c_id_by_path
 from progirl.pkbm.utils import get_collection_by_c_id
+from progirl.pkbm.utils import get_collection_by_path
 from progirl.pkbm.utils import get_current_c_id
 from progirl.pkbm.utils import get_dir_auto_id
 from progirl.uri import URI
@@ -25,11 +34,16 @@ _TITLE_LEGAL_CHARACTERS = string.ascii_lowercase + string.digits + "._"
 _TAG_LEGAL_CHARACTERS = string.ascii_lowercase + string.digits + "-"
 _PATTERN_TAGS_LINE = re.compile(r"^[<>!-\\#/* \t]*@tags: *(?P<TAGS>.*)$")
 _PATTERN_TITLE_LINE = re.compile(r"^#(?P<TITLE>[^#].*)$")
-_TEMP_PROJECT_CARD_TEMPLATE = '${AUTO_ID}-${TITLE_CLEAN}'
 _TEMP_PATTERN_IS_PROJECT_CARD = re.compile(r"^.*projects/.*cards/?$")
+_TITLE_SCAN_LINES = 20
+_HEADER_SCAN_LINES = 50
+_PATTERN_LIST_ITEM_LINE = re.compile(
+        r"^(?P<PREFIX>\s*(?:[-*+]\s+|\d+[.)]\s+)?)(?P<TITLE>.*?)\s*$"
+)
 
 
 class NoteInfo:
+    auto_id: str | None
     path_str: str
     path_uri: URI
     title: str
@@ -40,12 +54,15 @@ class NoteInfo:
     _dir_path_str: str
     _title_words: list[str]
     _use_cb: bool
-    _vim: pynvim.Nvim
+    _vim: pynvim.Nvim | None
 
-    def __init__(self, vim: pynvim.Nvim, title_args: list[str], use_cb: bool):
+    def __init__(
+            self, vim: pynvim.Nvim | None, title_args: list[str], use_cb: bool
+    ):
         self._vim = vim
         self._title_args = title_args
         self._use_cb = use_cb
+        self.auto_id = None
         self._parse_uri_arg()
         self._resolve_collection()
         self._extract_extension()
@@ -53,6 +70,7 @@ class NoteInfo:
         self._resolve_extension()
         self._create_title()
         self._create_filename()
+        self._resolve_filename_collision()
         self._create_path_str()
         self._create_path_uri()
 
@@ -97,7 +115,7 @@ class NoteInfo:
     def _resolve_dir_path(self):
         c_notes_path = self.collection.notes_path
 
-        if self._use_cb:
+        if self._use_cb and (self._vim is not None):
             buffer = self._vim.current.buffer
             buf_dir = get_context_pwd(buffer=buffer)
             buf_c_id = (
@@ -123,7 +141,7 @@ class NoteInfo:
 
     def _create_filename(self):
         if _TEMP_PATTERN_IS_PROJECT_CARD.match(self._dir_path_str):
-            template_str = _TEMP_PROJECT_CARD_TEMPLATE
+            template_str = TEMP_PROJECT_CARD_TEMPLATE
         else:
             template_str = self.collection.filename_template
 
@@ -135,6 +153,31 @@ class NoteInfo:
         self.base_filename = template.substitute(params)
         self.filename = ".".join((self.base_filename, self.extension))
 
+    def _is_same_note(self, filename: str) -> bool:
+        if self.title == "":
+            return False
+        existing_title = _read_note_title(
+                osp.join(self._dir_path_str, filename)
+        )
+        if existing_title is None:
+            # untitled, only the note if the title is its very filename
+            return filename == ".".join((self.title, self.extension))
+        return existing_title.strip().casefold() == self.title.casefold()
+
+    def _resolve_filename_collision(self):
+        """Suffix the filename ("_2", "_3", ...) while it names an existing
+        note with a different title, i.e. another title with the same slug,
+        or an untitled note that isn't named exactly like the title.
+        """
+        names = dir_listing_cache.names(self._dir_path_str)
+        base_filename = self.base_filename
+        suffix = 1
+        while ((self.filename in names)
+               and not self._is_same_note(self.filename)):
+            suffix += 1
+            self.base_filename = f"{base_filename}_{suffix}"
+            self.filename = ".".join((self.base_filename, self.extension))
+
     def _create_path_str(self):
         self.path_str = resolve_path_with_context(
                 self.filename, context_pwd=self._dir_path_str
@@ -145,7 +188,8 @@ class NoteInfo:
         params["TITLE_CLEAN"] = _clean_title(self.title)
         if use_auto_id:
             # params["AUTO_ID"] = get_collection_auto_id(self._c_id)
-            params["AUTO_ID"] = get_dir_auto_id(self._dir_path_str)
+            self.auto_id = get_dir_auto_id(self._dir_path_str)
+            params["AUTO_ID"] = self.auto_id
 
         return params
 
@@ -159,6 +203,18 @@ class NoteInfo:
         return self.path_uri.body
 
 
+def _read_note_title(path_str: str) -> str | None:
+    try:
+        with open(path_str, errors="replace") as f:
+            for line in islice(f, _TITLE_SCAN_LINES):
+                title_match = _PATTERN_TITLE_LINE.match(line.rstrip("\n"))
+                if title_match is not None:
+                    return title_match.group("TITLE")
+    except OSError:
+        pass
+    return None
+
+
 def _clean_tag(name: str) -> str:
     return _clean_string(
             name=name,
@@ -177,6 +233,33 @@ def _clean_title(name: str) -> str:
     )
 
 
+class _CleanTable(dict):
+    """str.translate table mapping every char not in `valid_chars` to
+    `filler_char`, filled in lazily per code point."""
+
+    def __init__(self, valid_chars: str, filler_char: str):
+        super().__init__()
+        self._valid_chars = valid_chars
+        self._filler_char = filler_char
+        for code_point in range(0x80):
+            self.__missing__(code_point)
+
+    def __missing__(self, code_point: int) -> str:
+        char = chr(code_point)
+        cleaned_char = char if char in self._valid_chars else self._filler_char
+        self[code_point] = cleaned_char
+        return cleaned_char
+
+
+@lru_cache(maxsize=None)
+def _get_clean_table(valid_chars: str,
+                     filler_char: str) -> tuple[_CleanTable, t.Pattern]:
+    return (
+            _CleanTable(valid_chars, filler_char),
+            re.compile(re.escape(filler_char) + "{2,}"),
+    )
+
+
 def _clean_string(
         name: str, valid_chars: str, filler_char: str,
         preprocessor: t.Callable | None
@@ -184,15 +267,56 @@ def _clean_string(
     if preprocessor is not None:
         name = preprocessor(name)
 
-    last_char = ""
-    cleaned_chars = []
-    for char in name:
-        cleaned_char = char if char in valid_chars else filler_char
-        if not (cleaned_char == filler_char and last_char == filler_char):
-            cleaned_chars.append(cleaned_char)
-            last_char = cleaned_char
+    clean_table, pattern_filler_run = _get_clean_table(
+            valid_chars, filler_char
+    )
+    return _clean_with_table(
+            name, clean_table, pattern_filler_run, filler_char
+    )
+
+
+def _clean_with_table(
+        name: str, clean_table: _CleanTable, pattern_filler_run: t.Pattern,
+        filler_char: str
+) -> str:
+    cleaned = name.translate(clean_table)
+    if filler_char * 2 in cleaned:
+        cleaned = pattern_filler_run.sub(filler_char, cleaned)
+    return cleaned.strip(filler_char)
+
+
+def clean_titles(names: t.Iterable[str]) -> list[str]:
+    """_clean_title for many titles, sharing one table lookup."""
+    clean_table, pattern_filler_run = _get_clean_table(
+            _TITLE_LEGAL_CHARACTERS, "_"
+    )
+    return [
+            _clean_with_table(
+                    name.lower(), clean_table, pattern_filler_run, "_"
+            ) for name in names
+    ]
+
+
+def _write_new_note(
+        vim: pynvim.Nvim | None, note_info: NoteInfo, use_cb: bool
+) -> bool:
+    if osp.exists(note_info.path_str):
+        return True
+
+    initial_content = _create_initial_content(vim, note_info, use_cb)
+    try:
+        write_atomic(note_info.path_str, initial_content, exclusive=True)
+    except FileExistsError:
+        # created since by someone else
+        return True
+    except OSError:
+        return False
+    if note_info.auto_id is not None:
+        add_auto_id(
+                note_info.collection, note_info.auto_id, note_info.path_str
+        )
 
-    return "".join(cleaned_chars).strip(filler_char)
+    return True
 
 
 def create_note(
@@ -206,20 +330,27 @@ def create_note(
         vim.api.echo([err.args], True, {})
         return None
 
-    if osp.exists(note_info.path_str):
-        return note_info
-    if touch_with_mkdir(note_info.path_str) is None:
+    if not _write_new_note(vim, note_info, use_cb):
         vim.api.echo([[f"can not create file {note_info.path_str}"]], True, {})
         return None
 
-    initial_content = _create_initial_content(vim, note_info, use_cb)
-    Path(note_info.path_str).write_text(initial_content)
+    return note_info
+
 
+def create_note_headless(title_args: list[str]) -> NoteInfo:
+    """create_note for callers without a nvim instance (e.g. the CLI).
+
+    :raise CollectionError: on an invalid collection in `title_args`
+    :raise OSError: if the note file can not be created
+    """
+    note_info = NoteInfo(None, title_args, use_cb=False)
+    if not _write_new_note(None, note_info, use_cb=False):
+        raise OSError(f"can not create file {note_info.path_str}")
     return note_info
 
 
 def _create_initial_content(
-        vim: pynvim.Nvim, note_info: NoteInfo, use_cb: bool, **kwargs
+        vim: pynvim.Nvim | None, note_info: NoteInfo, use_cb: bool, **kwargs
 ) -> str:
     template_path = note_info.collection.default_template
     if osp.exists(template_path):
@@ -249,25 +380,52 @@ def _create_initial_tags(note_info: NoteInfo) -> list[str]:
     return tags
 
 
+def _scan_buffer_header(vim: pynvim.Nvim) -> dict[str, str]:
+    """Return the TITLE and TAGS of the current buffer's header, read in one
+    pass over at most its first _HEADER_SCAN_LINES lines and stopping as
+    soon as both are found."""
+    header: dict[str, str] = {}
+    tags_line_num = None
+    for buffer_match in ProGirlBuffer(vim).search(
+            [_PATTERN_TAGS_LINE, _PATTERN_TITLE_LINE],
+            end=_HEADER_SCAN_LINES):
+        if buffer_match.line_num == tags_line_num:
+            # "# @tags: ..." is not a title
+            continue
+        group_name = next(iter(buffer_match.pattern.groupindex))
+        if group_name == "TAGS":
+            tags_line_num = buffer_match.line_num
+        header.setdefault(group_name,
+                          buffer_match.match.group(group_name).strip())
+        if len(header) == 2:
+            break
+    return header
+
+
+def _split_tags(tags_str: str) -> list[str]:
+    tags = (
+            _clean_tag(tag.strip())
+            for tag in tags_str.removesuffix("-->").split(",")
+    )
+    return [tag for tag in tags if tag != ""]
+
+
 def _create_initial_content_params(
-        vim: pynvim.Nvim, note_info: NoteInfo, use_cb: bool, **kwargs
+        vim: pynvim.Nvim | None, note_info: NoteInfo, use_cb: bool, **kwargs
 ) -> dict[str, str]:
     params: dict[str, str] = {}
 
-    # if use_cb:
-    #     # copy initial params from current buffer
-    #     progirl_buffer = ProGirlBuffer(vim)
-    #     params["TITLE"] = (
-    #             note_info.title if note_info.title != "" else
-    #             progirl_buffer.re(PATTERN_TITLE_LINE).group("TITLE")
-    #     )
-    #     params["TAGS"] = progirl_buffer.re(PATTERN_TAGS_LINE).group("TAGS")
-    # else:
-    #     params["TITLE"] = note_info.title
-    #     params["TAGS"] = ""
-
-    params["TITLE"] = note_info.title
-    params["TAGS"] = ", ".join(_create_initial_tags(note_info))
+    header = (
+            _scan_buffer_header(vim) if use_cb and (vim is not None) else {}
+    )
+    params["TITLE"] = (
+            note_info.title if note_info.title != "" else
+            header.get("TITLE", "")
+    )
+    tags = _split_tags(header.get("TAGS", ""))
+    tags.extend(tag for tag in _create_initial_tags(note_info)
+                if tag not in tags)
+    params["TAGS"] = ", ".join(tags)
     params["TITLE_UPPER"] = params["TITLE"].upper()
     params["NOTE_ID"] = note_info.id_
 
@@ -284,6 +442,7 @@ def edit_note(vim: pynvim.Nvim, title_args: list[str]):
 
     command = f"edit {note_info.path_str}"
     vim.command(command)
+    record_visit(note_info.path_str)
 
 
 def add_note_ref_link(vim: pynvim.Nvim, title_args: list[str]):
@@ -294,11 +453,133 @@ def add_note_ref_link(vim: pynvim.Nvim, title_args: list[str]):
                      True, {})
         return
 
-    buffer_c_id = get_c_id_by_path(
+    buffer_c_id = _get_buffer_c_id(progirl_buffer)
+    link_target = _note_link_target(note_info, buffer_c_id)
+    md_add_ref_link(progirl_buffer, note_info.title, link_target)
+
+
+def _get_buffer_c_id(progirl_buffer: ProGirlBuffer) -> str | None:
+    return get_c_id_by_path(
             resolve_path_with_context(progirl_buffer.buffer.name)
     )
+
+
+def _note_link_target(note_info: NoteInfo, buffer_c_id: str | None) -> str:
     if note_info._c_id == buffer_c_id:
-        link_target = note_info.path_uri.body
-    else:
-        link_target = str(note_info.path_uri)
-    md_add_ref_link(progirl_buffer, note_info.title, link_target)
+        return note_info.path_uri.body
+    return str(note_info.path_uri)
+
+
+def _path_link_target(path_str: str, buffer_c_id: str | None) -> str:
+    collection = get_collection_by_path(path_str)
+    if collection is None:
+        return path_str
+    path_body = "/" + osp.relpath(path_str, collection.notes_path)
+    if collection._id == buffer_c_id:
+        return path_body
+    return str(URI(collection._id, path_body))
+
+
+def _cursor_ref_link_source(vim: pynvim.Nvim) -> RefLinkSource:
+    """The position right after the cursor character, where "p" puts."""
+    row, col = vim.current.window.cursor
+    line_bytes = vim.current.line.encode("utf-8")
+    if col < len(line_bytes):
+        col += 1
+        while (col < len(line_bytes)) and (line_bytes[col] & 0xC0 == 0x80):
+            col += 1
+    return RefLinkSource(row - 1, col, col)
+
+
+def _add_ref_links_at_cursor(
+        progirl_buffer: ProGirlBuffer, links: list[tuple[str, str]]
+):
+    vim = progirl_buffer.vim
+    source = _cursor_ref_link_source(vim)
+    link_strs = md_add_ref_links(
+            progirl_buffer, [(description, target, source)
+                             for description, target in links]
+    )
+    inserted_len = len(" ".join(link_strs).encode("utf-8"))
+    vim.current.window.cursor = (
+            source.line_num + 1, source.start_col + inserted_len - 1
+    )
+
+
+def add_note_ref_links(vim: pynvim.Nvim, titles_args: list[list[str]]):
+    """add_note_ref_link for many notes, the ref links are put after the
+    cursor as a single edit."""
+    progirl_buffer = ProGirlBuffer(vim)
+    buffer_c_id = _get_buffer_c_id(progirl_buffer)
+    links = []
+    with durable_batch():
+        for title_args in titles_args:
+            note_info = create_note(vim, title_args, use_cb=True)
+            if note_info is None:
+                vim.api.echo([["can not create/find note from args: "],
+                              title_args], True, {})
+                continue
+            links.append((note_info.title,
+                          _note_link_target(note_info, buffer_c_id)))
+    if links:
+        _add_ref_links_at_cursor(progirl_buffer, links)
+
+
+def add_lines_ref_links(vim: pynvim.Nvim, first: int, last: int):
+    """Replace the title on each of the 1 based lines [first, last] with a
+    ref link to the note created/found from it, keeping list markers."""
+    progirl_buffer = ProGirlBuffer(vim)
+    buffer_c_id = _get_buffer_c_id(progirl_buffer)
+    lines = progirl_buffer.buffer.api.get_lines(first - 1, last, False)
+    links = []
+    with durable_batch():
+        for line_num, line in enumerate(lines, start=first - 1):
+            title_match = _PATTERN_LIST_ITEM_LINE.match(line)
+            if (title_match is None) or (title_match.group("TITLE") == ""):
+                continue
+            note_info = create_note(
+                    vim, title_match.group("TITLE").split(), use_cb=True
+            )
+            if note_info is None:
+                continue
+            source = RefLinkSource(
+                    line_num,
+                    len(title_match.group("PREFIX").encode("utf-8")),
+                    len(title_match.group(0).encode("utf-8"))
+            )
+            links.append((
+                    note_info.title,
+                    _note_link_target(note_info, buffer_c_id), source
+            ))
+    if links:
+        md_add_ref_links(progirl_buffer, links)
+
+
+# Quickfix entries without a file (bufnr 0) are dropped.
+_LUA_QF_FILENAMES = """
+local names = {}
+for _, item in ipairs(vim.fn.getqflist()) do
+    if item.bufnr > 0 then
+        table.insert(names, vim.api.nvim_buf_get_name(item.bufnr))
+    end
+end
+return names
+"""
+
+
+def add_qf_ref_links(vim: pynvim.Nvim):
+    """Put ref links to every file in the quickfix list after the cursor,
+    as a single edit."""
+    progirl_buffer = ProGirlBuffer(vim)
+    buffer_c_id = _get_buffer_c_id(progirl_buffer)
+    path_strs = dict.fromkeys(vim.exec_lua(_LUA_QF_FILENAMES))
+    links = []
+    for path_str in path_strs:
+        title = _read_note_title(path_str)
+        if title is None:
+            title = osp.splitext(osp.basename(path_str))[0]
+        links.append((title.strip(), _path_link_target(path_str, buffer_c_id)))
+    if not links:
+        vim.api.echo([["quickfix list has no files"]], True, {})
+        return
+    _add_ref_links_at_cursor(progirl_buffer, links)
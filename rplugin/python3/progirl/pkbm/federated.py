@@ -0,0 +1,139 @@
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
+import os.path as osp
+import typing as t
+
+from progirl.globals import config
+from progirl.pkbm.archive import ArchiveError
+from progirl.pkbm.archive import find_in_archive
+from progirl.pkbm.archive import is_archive_collection
+from progirl.pkbm.exceptions import CollectionError
+from progirl.utils import AttrDict
+from progirl.worker.scan import iter_note_paths
+
+_MAX_WORKERS = 8
+_DEFAULT_LIMIT = 100
+# What one broken collection may raise, it is skipped and doesn't fail the
+# whole query.
+_COLLECTION_ERRORS = (OSError, ValueError, ArchiveError, CollectionError)
+
+_executor: ThreadPoolExecutor | None = None
+
+FindInCollection = t.Callable[[AttrDict, str, int], list[str]]
+
+
+def get_federated_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+                max_workers=_MAX_WORKERS, thread_name_prefix="progirl-fed"
+        )
+    return _executor
+
+
+def is_federated_protocol(protocol: str) -> bool:
+    return protocol == config.pkb_prefix + "*"
+
+
+def order_collections(collections: t.Iterable[AttrDict],
+                      first_c_id: str | None = None) -> list[AttrDict]:
+    """Return `collections` in rank order, `first_c_id` (usually the
+    current collection) first and the rest in config order."""
+    collections = list(collections)
+    collections.sort(key=lambda collection: collection._id != first_c_id)
+    return collections
+
+
+def _result_or_none(future: Future) -> t.Any:
+    try:
+        return future.result()
+    except _COLLECTION_ERRORS:
+        return None
+
+
+def first_in_rank_order(futures: list[Future]) -> t.Any:
+    """Return the first truthy result in the order of `futures` as soon as
+    all the futures before it are done, without waiting for the rest."""
+    rank_of = {future: rank for rank, future in enumerate(futures)}
+    results: dict[int, t.Any] = {}
+    next_rank = 0
+    for future in as_completed(futures):
+        results[rank_of[future]] = _result_or_none(future)
+        while next_rank in results:
+            if results[next_rank]:
+                for pending in futures[next_rank + 1:]:
+                    pending.cancel()
+                return results[next_rank]
+            next_rank += 1
+    return None
+
+
+def find_in_collection(collection: AttrDict, query: str,
+                       limit: int) -> list[str]:
+    """Return the paths of the notes whose path relative to the notes path
+    contains all the words of `query`."""
+    if is_archive_collection(collection):
+        return sorted(find_in_archive(collection, query),
+                      key=_note_rank_key(query))[:limit]
+    words = query.lower().split()
+    notes_path = collection.notes_path
+    matches = []
+    for path_str in iter_note_paths(notes_path, collection.extension):
+        rel_path = osp.relpath(path_str, notes_path).lower()
+        if all(word in rel_path for word in words):
+            matches.append(path_str)
+    return sorted(matches, key=_note_rank_key(query))[:limit]
+
+
+def _note_rank_key(query: str) -> t.Callable[[str], tuple]:
+    words = query.lower().split()
+
+    def rank_key(path_str: str) -> tuple:
+        name = osp.basename(path_str).lower()
+        return (not all(word in name for word in words), len(name), path_str)
+
+    return rank_key
+
+
+def find_notes_federated(
+        query: str,
+        collections: list[AttrDict],
+        find: FindInCollection = find_in_collection,
+        limit: int = _DEFAULT_LIMIT
+) -> list[tuple[str, str]]:
+    """Query every collection concurrently and return up to `limit`
+    (c_id, path) pairs, ranked by match quality and then collection rank.
+    """
+    futures = [
+            get_federated_executor().submit(find, collection, query, limit)
+            for collection in collections
+    ]
+    rank_key = _note_rank_key(query)
+    ranked = []
+    for c_rank, (collection, future) in enumerate(zip(collections, futures)):
+        for path_str in _result_or_none(future) or []:
+            match_rank, name_len, _ = rank_key(path_str)
+            ranked.append(((match_rank, name_len, c_rank, path_str),
+                           collection._id))
+    ranked.sort()
+    return [(c_id, key[-1]) for key, c_id in ranked[:limit]]
+
+
+def find_first_note_federated(
+        query: str,
+        collections: list[AttrDict],
+        find: FindInCollection = find_in_collection
+) -> tuple[str, str] | None:
+    """Return the best (c_id, path) of the highest ranked collection with
+    any match, without waiting for lower ranked collections."""
+
+    def find_first(collection: AttrDict) -> tuple[str, str] | None:
+        paths = find(collection, query, 1)
+        return (collection._id, paths[0]) if paths else None
+
+    futures = [
+            get_federated_executor().submit(find_first, collection)
+            for collection in collections
+    ]
+    return first_in_rank_order(futures)
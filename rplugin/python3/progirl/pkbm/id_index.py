@@ -0,0 +1,226 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import os.path as osp
+import re
+import threading
+import time
+from typing import Pattern
+
+from progirl.path import write_atomic
+from progirl.pkbm.config import on_config_reloaded
+from progirl.pkbm.utils import TEMP_PROJECT_CARD_TEMPLATE
+from progirl.uri import split_anchor
+from progirl.utils import AttrDict
+
+_INDEX_FILE = ".pkb/id_index.json"
+_INDEX_VERSION = 1
+_NEXT_ID_FILE = ".next_id"
+_PATTERN_HEX_ID = re.compile(r"[0-9a-fA-F]+")
+_PATTERN_TEMPLATE_TOKEN = re.compile(r"\$\{(?P<NAME>\w+)\}|%.")
+_REBUILD_INTERVAL = 30.0
+
+_executor = ThreadPoolExecutor(
+        max_workers=1, thread_name_prefix="progirl-id-index"
+)
+
+
+def _id_key(auto_id: str) -> str | None:
+    if not _PATTERN_HEX_ID.fullmatch(auto_id):
+        return None
+    return format(int(auto_id, 16), "x")
+
+
+def _template_pattern(template: str) -> Pattern | None:
+    """Compile a filename template into a pattern capturing the AUTO_ID of
+    the filenames (without extension) it generates."""
+    if "${AUTO_ID}" not in template:
+        return None
+    parts = []
+    has_id = False
+    pos = 0
+    for token_match in _PATTERN_TEMPLATE_TOKEN.finditer(template):
+        parts.append(re.escape(template[pos:token_match.start()]))
+        if token_match.group("NAME") != "AUTO_ID":
+            parts.append(".*?")
+        elif has_id:
+            parts.append("(?P=ID)")
+        else:
+            parts.append("(?P<ID>[0-9a-f]{4,})")
+            has_id = True
+        pos = token_match.end()
+    parts.append(re.escape(template[pos:]))
+    return re.compile("".join(parts))
+
+
+class AutoIdIndex:
+    """Auto id to note path of one collection, the paths are relative to
+    the collection notes path. Ids used by more than one note (auto ids are
+    only unique per directory) map to None.
+
+    A lookup miss may be a note renamed or created outside of progirl. It
+    starts a rebuild on a background thread, so a lookup never waits for a
+    walk of the notes, and the lookups after the rebuild see the note.
+    """
+    _ids: dict[str, str | None]
+    _patterns: list[Pattern]
+    # ids added while a rebuild walks, applied again on top of its result
+    _added: list[tuple[str, str]] | None
+
+    def __init__(self, collection: AttrDict):
+        self._c_id = collection._id
+        self._notes_path = collection.notes_path
+        self._index_path = osp.join(collection.path, _INDEX_FILE)
+        self._patterns = [
+                pattern for pattern in (
+                        _template_pattern(template) for template in (
+                                collection.filename_template,
+                                TEMP_PROJECT_CARD_TEMPLATE
+                        )
+                ) if pattern is not None
+        ]
+        self._ids = {}
+        self._walked_at: float | None = None
+        self._added = None
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self._index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return
+        if (isinstance(index, dict)
+                and (index.get("version") == _INDEX_VERSION)):
+            self._ids = index.get("ids", {})
+
+    def _save(self):
+        index = {"version": _INDEX_VERSION, "ids": self._ids}
+        try:
+            # a cache, a crash at worst costs a rebuild
+            write_atomic(self._index_path, json.dumps(index), "none")
+        except OSError:
+            pass
+
+    def _add(self, key: str, rel_path: str, ids: dict[str, str | None]):
+        if (key in ids) and (ids[key] != rel_path):
+            ids[key] = None
+        else:
+            ids[key] = rel_path
+
+    def _match_id(self, filename: str) -> str | None:
+        stem = filename.rpartition(".")[0] or filename
+        for pattern in self._patterns:
+            id_match = pattern.fullmatch(stem)
+            if id_match is not None:
+                return _id_key(id_match.group("ID"))
+        return None
+
+    def _rebuild(self):
+        """Rebuild the index with one walk over the notes path, only
+        directories holding a ".next_id" file can contain auto id notes.
+        Runs on the executor, the lock is only held to swap the result in.
+        """
+        ids: dict[str, str | None] = {}
+        for dir_path, dir_names, filenames in os.walk(self._notes_path):
+            dir_names[:] = [name for name in dir_names if name[0] != "."]
+            if _NEXT_ID_FILE not in filenames:
+                continue
+            rel_dir = osp.relpath(dir_path, self._notes_path)
+            for filename in filenames:
+                key = self._match_id(filename)
+                if key is not None:
+                    self._add(key, osp.normpath(osp.join(rel_dir, filename)),
+                              ids)
+        with self._lock:
+            for key, rel_path in self._added or []:
+                self._add(key, rel_path, ids)
+            self._added = None
+            self._ids = ids
+            self._save()
+
+    def _start_rebuild(self):
+        # under self._lock
+        if self._added is not None:
+            return
+        if ((self._walked_at is not None)
+                and (time.monotonic() - self._walked_at < _REBUILD_INTERVAL)):
+            # rate limited, so repeated misses stay cheap
+            return
+        self._walked_at = time.monotonic()
+        self._added = []
+        _executor.submit(self._rebuild)
+
+    def _get_path(self, key: str) -> str | None:
+        rel_path = self._ids.get(key)
+        if rel_path is None:
+            return None
+        path_str = osp.join(self._notes_path, rel_path)
+        return path_str if osp.exists(path_str) else None
+
+    def lookup(self, auto_id: str) -> str | None:
+        key = _id_key(auto_id)
+        if key is None:
+            return None
+        with self._lock:
+            path_str = self._get_path(key)
+            if path_str is None:
+                self._start_rebuild()
+        return path_str
+
+    def add(self, auto_id: str, path_str: str):
+        key = _id_key(auto_id)
+        if key is None:
+            return
+        rel_path = osp.relpath(path_str, self._notes_path)
+        with self._lock:
+            old_rel_path = self._ids.get(key)
+            if ((old_rel_path is not None) and not osp.exists(
+                    osp.join(self._notes_path, old_rel_path))):
+                del self._ids[key]
+            self._add(key, rel_path, self._ids)
+            if self._added is not None:
+                self._added.append((key, rel_path))
+            self._save()
+
+
+_indexes: dict[tuple[str, str], AutoIdIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_auto_id_index(collection: AttrDict) -> AutoIdIndex:
+    index_key = (collection.path, collection.notes_path)
+    with _indexes_lock:
+        index = _indexes.get(index_key)
+        if index is None:
+            index = AutoIdIndex(collection)
+            _indexes[index_key] = index
+    return index
+
+
+def _drop_auto_id_indexes(c_ids: set[str]):
+    with _indexes_lock:
+        for index_key, index in list(_indexes.items()):
+            if index._c_id in c_ids:
+                del _indexes[index_key]
+
+
+on_config_reloaded(_drop_auto_id_indexes)
+
+
+def parse_auto_id_body(body: str) -> str | None:
+    """Return the auto id of a URI body like "#1a2b" (or "#1a2b#heading"),
+    or None for other bodies."""
+    if not body.startswith("#"):
+        return None
+    auto_id, _ = split_anchor(body[1:])
+    return auto_id
+
+
+def resolve_auto_id(collection: AttrDict, auto_id: str) -> str | None:
+    return get_auto_id_index(collection).lookup(auto_id)
+
+
+def add_auto_id(collection: AttrDict, auto_id: str, path_str: str):
+    get_auto_id_index(collection).add(auto_id, path_str)
@@ -0,0 +1,196 @@
+"""Canonical note identity.
+
+A note can be written as a relative path, a root relative "/..." path, a
+"<c_id>:" URI or an absolute path. Its NoteKey, the collection id plus the
+normalized path relative to the collection notes path, is the same for
+all of them, so caches keyed on it hit however a link was written.
+
+The conversions follow the resolver that resolves the link (see
+LinkResolver) but stay lexical (no filesystem access, no symlink
+resolution), which keeps them cheap enough to run on every cache lookup.
+"""
+from enum import Enum
+from functools import lru_cache
+import os.path as osp
+import sys
+import typing as t
+
+from progirl.globals import config
+from progirl.path import resolve_path_with_context
+from progirl.pkbm.archive import archive_note_name
+from progirl.pkbm.archive import archive_rel_path
+from progirl.pkbm.archive import is_archive_collection
+from progirl.pkbm.archive import parse_archive_note_name
+from progirl.pkbm.config import on_config_reloaded
+from progirl.pkbm.federated import is_federated_protocol
+from progirl.pkbm.id_index import parse_auto_id_body
+from progirl.pkbm.id_index import resolve_auto_id
+from progirl.uri import URI
+from progirl.uri import split_uri_anchor
+
+_KEYS_CACHE_SIZE = 4096
+_INTERNED_KEYS_SIZE = 16384
+_LOCAL_PROTOCOLS = ["file", "local"]
+# g:progirl_uri_resolvers entries that resolve like resolve_uri_in_collection
+PKBM_RESOLVERS = [
+        "progirl.pkbm.resolve.resolve_uri_as_path",
+        "progirl.daemon.client.resolve_uri_as_path",
+]
+
+
+class LinkResolver(Enum):
+    """What resolves the links keys are made for."""
+    # the pkbm resolver, "/..." is relative to the collection notes path
+    PKBM = "pkbm"
+    # goto's default resolver only, "/..." is a filesystem path and
+    # "<c_id>:" URIs don't resolve
+    DEFAULT = "default"
+
+
+def link_resolver(uri_resolvers: t.Sequence[str]) -> LinkResolver | None:
+    """Return the LinkResolver of a g:progirl_uri_resolvers list, None if
+    another resolver comes first, whose links get no note key."""
+    if not uri_resolvers:
+        return LinkResolver.DEFAULT
+    if uri_resolvers[0] in PKBM_RESOLVERS:
+        return LinkResolver.PKBM
+    return None
+
+
+class NoteKey(t.NamedTuple):
+    c_id: str
+    # normalized, relative to the collection notes path
+    rel_path: str
+
+    def __str__(self) -> str:
+        return f"{self.c_id}:/{self.rel_path}"
+
+    @property
+    def path_str(self) -> str:
+        """The path of the note, or its archive note name."""
+        collection = config.collections[self.c_id]
+        if is_archive_collection(collection):
+            return archive_note_name(self.c_id, self.rel_path)
+        return osp.join(collection.notes_path, self.rel_path)
+
+
+@lru_cache(maxsize=_INTERNED_KEYS_SIZE)
+def _intern(key: NoteKey) -> NoteKey:
+    # returns the first of the equal keys, while it stays in the cache
+    return key
+
+
+def note_key(c_id: str, rel_path: str) -> NoteKey:
+    """Return the interned key of `rel_path` in collection `c_id`, equal
+    keys of recently used notes are the same object."""
+    rel_path = osp.normpath("/" + rel_path).lstrip("/")
+    return _intern(NoteKey(sys.intern(c_id), sys.intern(rel_path)))
+
+
+@lru_cache(maxsize=_KEYS_CACHE_SIZE)
+def note_key_of_path(path_str: str) -> NoteKey | None:
+    """Return the key of the note at `path_str` (or of an archive note
+    name), None if it is not in a collection."""
+    parsed = parse_archive_note_name(path_str)
+    if parsed is not None:
+        collection, rel_path = parsed
+        return note_key(collection._id, rel_path)
+    path_str = resolve_path_with_context(path_str, real=False)
+    best = None
+    for collection in config.collections.values():
+        notes_path = collection.notes_path
+        if osp.commonpath((path_str, notes_path)) != notes_path:
+            continue
+        # nested collections, the innermost one holds the note
+        if (best is None) or (len(notes_path) > len(best.notes_path)):
+            best = collection
+    if best is None:
+        return None
+    return note_key(best._id, osp.relpath(path_str, best.notes_path))
+
+
+@lru_cache(maxsize=_KEYS_CACHE_SIZE)
+def _lexical_note_key(protocol: str, body: str, current_c_id: str,
+                      context_pwd: str | None) -> NoteKey | None:
+    if protocol in _LOCAL_PROTOCOLS:
+        return note_key_of_path(
+                resolve_path_with_context(body, context_pwd, real=False)
+        )
+    collection = config.collections.get(protocol or current_c_id)
+    if collection is None:
+        return None
+    if is_archive_collection(collection):
+        return note_key(collection._id,
+                        archive_rel_path(body, collection, context_pwd))
+    return note_key_of_path(
+            resolve_path_with_context(
+                    body,
+                    context_pwd=context_pwd,
+                    context_root=collection.notes_path,
+                    real=False
+            )
+    )
+
+
+def _lexical_protocol(protocol: str,
+                      resolver: LinkResolver | None) -> str | None:
+    if (resolver is None) or is_federated_protocol(protocol):
+        return None
+    if resolver is LinkResolver.DEFAULT:
+        if (protocol != "") and (protocol not in _LOCAL_PROTOCOLS):
+            return None
+        # plain filesystem paths like "file:" URIs
+        return _LOCAL_PROTOCOLS[0]
+    return protocol
+
+
+def note_key_of_uri(
+        uri: URI,
+        current_c_id: str,
+        context_pwd: str | None = None,
+        resolver: LinkResolver | None = LinkResolver.PKBM
+) -> NoteKey | None:
+    """Return the key of the note `uri` points to, None for URIs that don't
+    point to a note of a collection or that only resolve through the
+    filesystem (like "pkb-*:" URIs).
+
+    :param current_c_id: the collection of protocol-less URIs
+    :param resolver: what resolves `uri`, see link_resolver
+    """
+    uri, _ = split_uri_anchor(uri)
+    protocol = _lexical_protocol(uri.protocol, resolver)
+    if (uri.body == "") or (protocol is None):
+        return None
+    if protocol in config.collections:
+        auto_id = parse_auto_id_body(uri.body)
+        if auto_id is not None:
+            path_str = resolve_auto_id(config.collections[uri.protocol],
+                                       auto_id)
+            return None if path_str is None else note_key_of_path(path_str)
+    if uri.body.startswith(("/", "~")):
+        # Not relative, the context doesn't matter and is left out of the
+        # cache key.
+        context_pwd = None
+    elif context_pwd is None:
+        # relative to the cwd, which may change
+        return None
+    return _lexical_note_key(protocol, uri.body, current_c_id, context_pwd)
+
+
+def link_cache_key(uri: URI, current_c_id: str, context_pwd: str | None,
+                   resolver: LinkResolver | None) -> t.Hashable:
+    """Return the key to cache what a link resolves to under: the note key
+    when there is one, else the link as written in its context."""
+    key = note_key_of_uri(uri, current_c_id, context_pwd, resolver)
+    if key is not None:
+        return key
+    return (context_pwd, str(uri))
+
+
+def _forget_note_keys(c_ids: set[str]):
+    note_key_of_path.cache_clear()
+    _lexical_note_key.cache_clear()
+    _intern.cache_clear()
+
+
+on_config_reloaded(_forget_note_keys)
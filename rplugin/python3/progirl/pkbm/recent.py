@@ -0,0 +1,214 @@
+"""Frecency ranked recently visited notes.
+
+Each collection keeps a RecentIndex of its visited notes, persisted to
+<collection.path>/.pkb/recent.json. A visit adds 1 to the score of a note
+and scores halve every _HALF_LIFE seconds, so notes visited both often and
+lately rank first. An index keeps at most _MAX_ENTRIES notes, dropping the
+lowest scored ones. Visits are saved at most every _SAVE_DELAY seconds on a
+timer thread, and on exit.
+
+Ranking only reads the in-memory indexes, it never touches the notes.
+"""
+import json
+import os.path as osp
+import threading
+import time
+
+import pynvim
+
+from progirl.globals import config
+from progirl.path import resolve_path_with_context
+from progirl.path import write_atomic
+from progirl.pkbm.archive import is_archive_note_name
+from progirl.pkbm.config import on_config_reloaded
+from progirl.pkbm.exceptions import CollectionError
+from progirl.pkbm.key import NoteKey
+from progirl.pkbm.key import note_key
+from progirl.pkbm.key import note_key_of_path
+from progirl.pkbm.utils import get_c_id_by_path
+from progirl.pkbm.utils import get_collection_by_c_id
+from progirl.utils import AttrDict
+
+_INDEX_FILE = ".pkb/recent.json"
+_INDEX_VERSION = 1
+_HALF_LIFE = 7 * 24 * 3600.0
+# Opening a note from a command also fires BufEnter, and switching windows
+# back and forth isn't a new visit either.
+_MIN_VISIT_INTERVAL = 60.0
+_MAX_ENTRIES = 500
+_SAVE_DELAY = 5.0
+_LUA_SELECT_RECENT = """
+local items = ...
+vim.ui.select(items, {
+    prompt = "Recent notes",
+    format_item = function(item) return item.label end,
+}, function(item)
+    if item ~= nil then
+        vim.cmd.edit(vim.fn.fnameescape(item.path))
+    end
+end)
+"""
+
+
+def _decayed(score: float, visited_at: float, now: float) -> float:
+    return score * 0.5**((now - visited_at) / _HALF_LIFE)
+
+
+class RecentIndex:
+    """Visited notes of one collection, rel_path to [score, visited_at]
+    with score as of visited_at."""
+    _entries: dict[str, list[float]]
+    _timer: threading.Timer | None
+
+    def __init__(self, collection: AttrDict):
+        self._c_id = collection._id
+        self._index_path = osp.join(collection.path, _INDEX_FILE)
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._timer = None
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self._index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return
+        if (isinstance(index, dict)
+                and (index.get("version") == _INDEX_VERSION)):
+            self._entries = index.get("entries", {})
+
+    def _schedule_save(self):
+        # under self._lock
+        if self._timer is None:
+            self._timer = threading.Timer(_SAVE_DELAY, self.save)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def save(self):
+        """Write the pending visits, a no-op if there are none."""
+        with self._lock:
+            if self._timer is None:
+                return
+            self._timer.cancel()
+            self._timer = None
+            index = {"version": _INDEX_VERSION, "entries": self._entries}
+            try:
+                # losing the last visits in a crash is fine
+                write_atomic(self._index_path, json.dumps(index), "none")
+            except OSError:
+                pass
+
+    def _trim(self, now: float):
+        if len(self._entries) <= _MAX_ENTRIES:
+            return
+        for _, key in self.ranked(now)[_MAX_ENTRIES:]:
+            del self._entries[key.rel_path]
+
+    def visit(self, rel_path: str, now: float | None = None):
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._entries.get(rel_path)
+            if entry is None:
+                self._entries[rel_path] = [1.0, now]
+            elif now - entry[1] < _MIN_VISIT_INTERVAL:
+                return
+            else:
+                self._entries[rel_path] = [
+                        _decayed(entry[0], entry[1], now) + 1.0, now
+                ]
+            self._trim(now)
+            self._schedule_save()
+
+    def ranked(self,
+               now: float | None = None) -> list[tuple[float, NoteKey]]:
+        """Return (score, key) for every visited note, best first."""
+        now = time.time() if now is None else now
+        ranked = [(_decayed(score, visited_at, now),
+                   note_key(self._c_id, rel_path))
+                  for rel_path, (score, visited_at) in self._entries.items()]
+        ranked.sort(reverse=True)
+        return ranked
+
+
+_indexes: dict[str, RecentIndex] = {}
+
+
+def get_recent_index(c_id: str) -> RecentIndex:
+    index = _indexes.get(c_id)
+    if index is None:
+        index = RecentIndex(config.collections[c_id])
+        _indexes[c_id] = index
+    return index
+
+
+def _drop_recent_indexes(c_ids: set[str]):
+    for c_id in c_ids:
+        index = _indexes.pop(c_id, None)
+        if index is not None:
+            index.save()
+
+
+def save_recent_indexes():
+    """Write the pending visits of every collection, on exit."""
+    for index in list(_indexes.values()):
+        index.save()
+
+
+on_config_reloaded(_drop_recent_indexes)
+
+
+def record_visit(path_str: str):
+    """Record a visit of the note at `path_str` (or archive note name), a
+    no-op for files outside of the collections."""
+    if not is_archive_note_name(path_str):
+        path_str = resolve_path_with_context(path_str, real=True)
+        if get_c_id_by_path(path_str) is None:
+            return
+    key = note_key_of_path(path_str)
+    if key is not None:
+        get_recent_index(key.c_id).visit(key.rel_path)
+
+
+def record_buffer_visit(vim: pynvim.Nvim):
+    buffer = vim.current.buffer
+    if (buffer.name != "") and (buffer.options["buftype"] in ("", "acwrite")):
+        record_visit(buffer.name)
+
+
+def recent_notes(c_ids: list[str] | None = None,
+                 limit: int | None = None) -> list[NoteKey]:
+    """Return the keys of the visited notes of collections `c_ids` (all if
+    None), best ranked first."""
+    now = time.time()
+    ranked = sorted(
+            (scored for c_id in (
+                    config.collections if c_ids is None else c_ids)
+             for scored in get_recent_index(c_id).ranked(now)),
+            reverse=True
+    )
+    return [key for _, key in ranked[:limit]]
+
+
+def select_recent_note(vim: pynvim.Nvim, args: list[str]):
+    """Pick one of the recent notes with vim.ui.select and edit it.
+
+    :param args: optionally the id of the collection to pick from
+    """
+    c_ids = None
+    if args:
+        try:
+            c_ids = [get_collection_by_c_id(args[0])._id]
+        except CollectionError as err:
+            vim.api.echo([err.args], True, {})
+            return
+    name = vim.current.buffer.name
+    current_key = note_key_of_path(name) if name != "" else None
+    items = [{
+            "label": str(key),
+            "path": key.path_str
+    } for key in recent_notes(c_ids) if key != current_key]
+    if not items:
+        vim.api.echo([["no recent notes"]], False, {})
+        return
+    vim.exec_lua(_LUA_SELECT_RECENT, items)
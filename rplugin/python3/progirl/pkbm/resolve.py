@@ -2,9 +2,20 @@ import pynvim
 
 from progirl.globals import config
 from progirl.path import resolve_path_with_context
+from progirl.path import stat_cache
 from progirl.path import validate_path
+from progirl.pkbm.archive import is_archive_collection
+from progirl.pkbm.archive import resolve_uri_in_archive
+from progirl.pkbm.federated import first_in_rank_order
+from progirl.pkbm.federated import get_federated_executor
+from progirl.pkbm.federated import is_federated_protocol
+from progirl.pkbm.federated import order_collections
+from progirl.pkbm.id_index import parse_auto_id_body
+from progirl.pkbm.id_index import resolve_auto_id
+from progirl.pkbm.utils import get_current_c_id
 from progirl.pkbm.utils import get_current_collection
 from progirl.uri import URI
+from progirl.utils import AttrDict
 
 
 def resolve_uri_as_path(
@@ -12,6 +23,12 @@ def resolve_uri_as_path(
         uri: URI,
         context_pwd: str | None = None
 ) -> str | None:
+    if is_federated_protocol(uri.protocol):
+        collections = order_collections(
+                config.collections.values(),
+                get_current_c_id(vim, check_cb=True)
+        )
+        return resolve_uri_federated(uri, collections, context_pwd)
     if (uri.protocol != "") and (uri.protocol
                                  not in config.collections.keys()):
         return None
@@ -21,9 +38,62 @@ def resolve_uri_as_path(
     else:
         collection = config.collections[uri.protocol]
 
+    return resolve_uri_in_collection(uri, collection, context_pwd)
+
+
+def resolve_uri_in_collection(
+        uri: URI, collection: AttrDict, context_pwd: str | None = None
+) -> str | None:
+    if is_archive_collection(collection):
+        return resolve_uri_in_archive(uri, collection, context_pwd)
+    if uri.protocol != "":
+        auto_id = parse_auto_id_body(uri.body)
+        if auto_id is not None:
+            return resolve_auto_id(collection, auto_id)
+
     c_notes_path = collection.notes_path
     path_str = resolve_path_with_context(
             uri.body, context_pwd=context_pwd, context_root=c_notes_path
     )
 
     return validate_path(path_str)
+
+
+def _resolve_existing(
+        uri: URI, collection: AttrDict, context_pwd: str | None
+) -> str | None:
+    path_str = resolve_uri_in_collection(uri, collection, context_pwd)
+    if (path_str is None) or is_archive_collection(collection):
+        return path_str
+    if not stat_cache.exists(path_str):
+        return None
+    return path_str
+
+
+def _root_context(collection: AttrDict) -> str | None:
+    # archives take relative bodies from their root without a context
+    if is_archive_collection(collection):
+        return None
+    return collection.notes_path
+
+
+def resolve_uri_federated(
+        uri: URI,
+        collections: list[AttrDict],
+        context_pwd: str | None = None
+) -> str | None:
+    """Resolve the body of a "pkb-*:" URI in every collection concurrently
+    and return the existing path of the highest ranked collection.
+
+    :param collections: the collections in rank order, `context_pwd` only
+        applies to the first one, relative bodies are relative to the notes
+        path of the others
+    """
+    futures = [
+            get_federated_executor().submit(
+                    _resolve_existing, URI(collection._id, uri.body),
+                    collection, context_pwd if rank == 0 else
+                    _root_context(collection)
+            ) for rank, collection in enumerate(collections)
+    ]
+    return first_in_rank_order(futures)
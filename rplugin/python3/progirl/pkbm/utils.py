@@ -3,12 +3,18 @@ from pathlib import Path
 from time import sleep
 
 import pynvim
+from pynvim.api import Buffer
 
 from progirl.globals import config
+from progirl.path import replace
 from progirl.path import resolve_path_with_context
+from progirl.path import write_atomic
+from progirl.pkbm.archive import parse_archive_note_name
 from progirl.pkbm.exceptions import CollectionError
 from progirl.utils import AttrDict
 
+TEMP_PROJECT_CARD_TEMPLATE = '${AUTO_ID}-${TITLE_CLEAN}'
+
 
 def get_collection_auto_id(c_id: str) -> str:
     collection = get_collection_by_c_id(c_id)
@@ -27,8 +33,10 @@ def _get_auto_id(id_file_path: Path) -> str:
     id_temp_file_path = Path(id_file_path.as_posix() + "~")
 
     if not id_file_path.exists() and not id_temp_file_path.exists():
-        id_file_path.parent.mkdir(exist_ok=True, parents=True)
-        id_file_path.write_text("0")
+        try:
+            write_atomic(str(id_file_path), "0", exclusive=True)
+        except FileExistsError:
+            pass
 
     for tries in range(10):
         try:
@@ -42,8 +50,10 @@ def _get_auto_id(id_file_path: Path) -> str:
 
     auto_id = id_temp_file_path.read_text().strip()
     next_id = str(hex(int(auto_id, 16) + 1)[2:])
-    id_temp_file_path.write_text(next_id)
-    id_temp_file_path.rename(id_file_path)
+    # The renamed away id file is the lock, it is only given back with the
+    # next id fully written.
+    write_atomic(str(id_temp_file_path), next_id)
+    replace(str(id_temp_file_path), str(id_file_path))
 
     return f"{auto_id:>04}"
 
@@ -75,13 +85,22 @@ def get_collection_by_path(path_str: str) -> AttrDict | None:
     return collection
 
 
-def get_current_c_id(vim: pynvim.Nvim, check_cb=False, check_pwd=False) -> str:
+def get_buffer_c_id(buffer: Buffer) -> str | None:
+    """Return the id of the collection of the note in `buffer`, None if it
+    is in none."""
+    parsed = parse_archive_note_name(buffer.name)
+    if parsed is not None:
+        return parsed[0]._id
+    return get_c_id_by_path(resolve_path_with_context(buffer.name, real=True))
+
+
+def get_current_c_id(
+        vim: pynvim.Nvim | None, check_cb=False, check_pwd=False
+) -> str:
     c_id = None
 
-    if check_cb:
-        buffer = vim.current.buffer
-        path_str = resolve_path_with_context(buffer.name, real=True)
-        c_id = get_c_id_by_path(path_str)
+    if check_cb and (vim is not None):
+        c_id = get_buffer_c_id(vim.current.buffer)
 
     if (c_id is None) and check_pwd:
         path_str = os.getcwd()
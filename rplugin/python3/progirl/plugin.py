@@ -1,12 +1,39 @@
 import pynvim
 
+from progirl.export import export_notes
+from progirl.goto import find_notes
 from progirl.goto import goto_ex_at_cursor
 from progirl.goto import goto_file_at_cursor
+from progirl.goto import prefetch_buffer_links
+from progirl.highlight import decorate_buffer_links
+from progirl.highlight import decorate_changed_lines
+from progirl.highlight import decorate_viewport_links
+from progirl.highlight import detach_buffer
+from progirl.highlight import diagnose_buffer_links
+from progirl.highlight import diagnose_changed_lines
+from progirl.highlight import drop_buffer_decorations
+from progirl.highlight import drop_buffer_diagnostics
+from progirl.markdown import drop_buffer_state
 from progirl.markdown import generate_ref_targets_map
+from progirl.markdown import inline_buffer_links
+from progirl.markdown import mirror_buffer_state
+from progirl.markdown import refify_buffer_links
+from progirl.pkbm import add_lines_ref_links
 from progirl.pkbm import add_note_ref_link
+from progirl.pkbm import add_note_ref_links
+from progirl.pkbm import add_qf_ref_links
+from progirl.pkbm import cancel_index_jobs
+from progirl.pkbm import check_collection_links
 from progirl.pkbm import edit_note
+from progirl.pkbm import load_archive_buffer
 from progirl.pkbm import load_config
+from progirl.pkbm import record_buffer_visit
+from progirl.pkbm import reload_config
+from progirl.pkbm import save_recent_indexes
+from progirl.pkbm import select_recent_note
+from progirl.pkbm import watch_config
 from progirl.uri import URI
+from progirl.utils import split_args
 
 
 @pynvim.plugin
@@ -15,6 +42,7 @@ class ProGirlPlugin(object):
     def __init__(self, vim: pynvim.Nvim):
         self._vim = vim
         load_config(vim)
+        watch_config(vim, 'ProGirlConfigChanged')
 
     # @pynvim.command(name: str, nargs: Union[str, int] = 0, complete:
     # Optional[str, None] = None, range: Union[str, int, None] = None, count:
@@ -38,6 +66,22 @@ class ProGirlPlugin(object):
     def _cmd_gen_md_buf_ref_map(self):
         generate_ref_targets_map(self._vim.current.buffer)
 
+    @pynvim.command(name='ProGirlRefifyLinks', sync=True)
+    def _cmd_refify_links(self):
+        refify_buffer_links(self._vim)
+
+    @pynvim.command(name='ProGirlInlineLinks', sync=True)
+    def _cmd_inline_links(self):
+        inline_buffer_links(self._vim)
+
+    @pynvim.command(name='ProGirlReloadConfig', sync=True)
+    def _cmd_reload_config(self):
+        reload_config(self._vim)
+
+    @pynvim.function('ProGirlConfigChanged')
+    def _fn_config_changed(self, args):
+        reload_config(self._vim)
+
     @pynvim.command(name='ProGirlGoToFile', nargs='*', sync=True)
     def _cmd_go_to_file(self, args):
         if args:
@@ -59,3 +103,80 @@ class ProGirlPlugin(object):
     @pynvim.command(name='ProGirlAddNoteRefLink', nargs='*', sync=True)
     def _cmd_add_note_ref_link(self, args):
         add_note_ref_link(self._vim, args)
+
+    @pynvim.command(
+            name='ProGirlAddNoteRefLinks', nargs='*', range='', sync=True
+    )
+    def _cmd_add_note_ref_links(self, args, range):
+        # With args, "|" separates the titles, else every line in the range
+        # is a title.
+        if args:
+            add_note_ref_links(self._vim, split_args(args, "|"))
+        else:
+            add_lines_ref_links(self._vim, *range)
+
+    @pynvim.command(name='ProGirlAddQfRefLinks', sync=True)
+    def _cmd_add_qf_ref_links(self):
+        add_qf_ref_links(self._vim)
+
+    @pynvim.command(name='ProGirlCheckLinks', nargs='?', sync=True)
+    def _cmd_check_links(self, args):
+        check_collection_links(self._vim, args)
+
+    @pynvim.command(name='ProGirlExport', nargs='?', bang=True, sync=True)
+    def _cmd_export(self, args, bang):
+        export_notes(self._vim, args, full=bang)
+
+    @pynvim.command(name='ProGirlFind', nargs='+', bang=True, sync=True)
+    def _cmd_find(self, args, bang):
+        find_notes(self._vim, args, first=bang)
+
+    @pynvim.command(name='ProGirlRecent', nargs='?', sync=True)
+    def _cmd_recent(self, args):
+        select_recent_note(self._vim, args)
+
+    @pynvim.command(name='ProGirlCancelJobs', sync=True)
+    def _cmd_cancel_jobs(self):
+        cancel_index_jobs(self._vim)
+
+    @pynvim.autocmd(
+            'BufReadCmd', pattern='pkb-*://*', eval='expand("<amatch>")',
+            sync=True
+    )
+    def _on_archive_buf_read(self, name):
+        load_archive_buffer(self._vim, name)
+
+    @pynvim.autocmd('BufUnload', pattern='*', eval='expand("<abuf>")')
+    def _on_buf_unload(self, bufnr):
+        drop_buffer_state(int(bufnr))
+        drop_buffer_decorations(int(bufnr))
+        drop_buffer_diagnostics(int(bufnr))
+        detach_buffer(int(bufnr))
+
+    @pynvim.autocmd('BufEnter', pattern='*.md')
+    def _on_buf_enter(self):
+        decorate_buffer_links(self._vim)
+        diagnose_buffer_links(self._vim)
+        prefetch_buffer_links(self._vim)
+
+    @pynvim.autocmd('BufEnter', pattern='*')
+    def _on_any_buf_enter(self):
+        # notes aren't only *.md, record_buffer_visit skips other files
+        record_buffer_visit(self._vim)
+
+    @pynvim.autocmd('VimLeavePre', pattern='*', sync=True)
+    def _on_vim_leave(self):
+        save_recent_indexes()
+
+    @pynvim.autocmd('WinScrolled', pattern='*')
+    def _on_win_scrolled(self):
+        decorate_viewport_links(self._vim)
+
+    @pynvim.function('ProGirlLinesChanged')
+    def _fn_lines_changed(self, args):
+        decorate_changed_lines(self._vim, *args)
+        diagnose_changed_lines(self._vim, *args)
+
+    @pynvim.autocmd('CursorHold', pattern='*.md')
+    def _on_cursor_hold(self):
+        mirror_buffer_state(self._vim.current.buffer)
@@ -1,7 +1,7 @@
 import re
 from typing import Pattern
 
-_URI_PATTERN: Pattern = re.compile(r"^([\w-]*?):(.*)$")
+_URI_PATTERN: Pattern = re.compile(r"^([\w-]*?\*?):(.*)$")
 
 
 class URI:
@@ -28,3 +28,20 @@ class URI:
                 f"{self.protocol}:{self.body}"
                 if self.protocol != "" else self.body
         )
+
+
+def split_anchor(body: str) -> tuple[str, str]:
+    """Split a URI body like "note.md#heading" into ("note.md", "heading")."""
+    path_str, _, anchor = body.partition("#")
+    return path_str, anchor
+
+
+def split_uri_anchor(uri: URI) -> tuple[URI, str]:
+    """Split the anchor off `uri`. A protocol URI without a path, like
+    "pkb-notes:#1a2b#heading", names a note by its auto id, so its body is
+    only split at the second "#"."""
+    path_str, anchor = split_anchor(uri.body)
+    if (uri.protocol != "") and (path_str == "") and (anchor != ""):
+        auto_id, anchor = split_anchor(anchor)
+        path_str = "#" + auto_id
+    return URI(uri.protocol, path_str), anchor
@@ -50,3 +50,19 @@ def niget(obj, default_obj=None, nobj=None):
     :return: `obj` if it is not `nobj` else `default_obj`
     """
     return obj if obj is not nobj else default_obj
+
+
+def byte_col(line: str, col: int) -> int:
+    """Convert a str index in `line` to the byte column nvim expects."""
+    return col if line.isascii() else len(line[:col].encode("utf-8"))
+
+
+def split_args(args: list[str], separator: str) -> list[list[str]]:
+    """Split command args on `separator` args, dropping empty groups."""
+    groups: list[list[str]] = [[]]
+    for arg in args:
+        if arg == separator:
+            groups.append([])
+        else:
+            groups[-1].append(arg)
+    return [group for group in groups if group]
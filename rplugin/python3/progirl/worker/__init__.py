@@ -0,0 +1,4 @@
+from .client import IndexWorker
+from .client import get_index_worker
+from .protocol import Response
+from .protocol import ResponseKind
@@ -0,0 +1,165 @@
+"""Content hash change detection for collection rescans.
+
+A ScanCache keeps, per note, its size, mtime, content hash and parse
+result. A rescan reuses the parse result of notes whose size and mtime are
+unchanged. Notes with the same size but a new mtime, as after a checkout
+or a sync that rewrote identical files, are hashed on a thread pool and
+only reparsed if the content really changed.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import os
+import os.path as osp
+from typing import Any
+from typing import Callable
+from typing import Iterable
+
+_CACHE_VERSION = 2
+_HASH_CHUNK_SIZE = 1 << 20
+_HASH_WORKERS = 4
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def hash_file(path_str: str) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path_str, "rb", buffering=0) as f:
+        while chunk := f.read(_HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _hash_or_none(path_str: str) -> str | None:
+    try:
+        return hash_file(path_str)
+    except OSError:
+        return None
+
+
+class ScanCache:
+    _cache_path: str | None
+    # path to [size, mtime_ns, content hash, parse result]
+    _entries: dict[str, list]
+    _dirty: bool
+
+    def __init__(self, cache_path: str | None):
+        """:param cache_path: the json file the cache persists to, None for
+            a cache that lives only as long as the object"""
+        self._cache_path = cache_path
+        self._entries = {}
+        self._dirty = False
+        if cache_path is not None:
+            self._load(cache_path)
+
+    def _load(self, cache_path: str):
+        try:
+            with open(cache_path) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return
+        if cache.get("version") == _CACHE_VERSION:
+            self._entries = cache.get("entries", {})
+
+    def save(self):
+        if (self._cache_path is None) or not self._dirty:
+            return
+        tmp_path = self._cache_path + "~"
+        try:
+            os.makedirs(osp.dirname(self._cache_path), exist_ok=True)
+            with open(tmp_path, "w") as f:
+                # dumps, unlike dump, runs the C encoder in one go
+                f.write(
+                        json.dumps({
+                                "version": _CACHE_VERSION,
+                                "entries": self._entries
+                        })
+                )
+            os.replace(tmp_path, self._cache_path)
+            self._dirty = False
+        except OSError:
+            pass
+
+    def _suspects(
+            self, stats: dict[str, os.stat_result]
+    ) -> tuple[list[str], list[str]]:
+        """Return the paths whose size and mtime match their entry and the
+        paths whose size matches but mtime does not."""
+        unchanged = []
+        suspects = []
+        for path_str, stat in stats.items():
+            entry = self._entries.get(path_str)
+            if (entry is None) or (entry[0] != stat.st_size):
+                continue
+            if entry[1] == stat.st_mtime_ns:
+                unchanged.append(path_str)
+            else:
+                suspects.append(path_str)
+        return unchanged, suspects
+
+    def _parse(self, path_str: str, stat: os.stat_result,
+               parse: Callable[[list[str]], Any]) -> Any:
+        with open(path_str, "rb") as f:
+            data = f.read()
+        result = parse(data.decode("utf-8", errors="replace").splitlines())
+        self._entries[path_str] = [
+                len(data), stat.st_mtime_ns,
+                _digest(data), result
+        ]
+        self._dirty = True
+        return result
+
+    def scan(
+            self,
+            paths: Iterable[str],
+            parse: Callable[[list[str]], Any],
+            progress: Callable[[int, int], None] | None = None
+    ) -> dict[str, Any]:
+        """Return path to `parse(lines)` for every readable note of `paths`,
+        reparsing only the notes whose content changed.
+
+        Entries of notes not in `paths` are dropped.
+        """
+        stats = {}
+        for path_str in paths:
+            try:
+                stats[path_str] = os.stat(path_str)
+            except OSError:
+                continue
+        unchanged, suspects = self._suspects(stats)
+        with ThreadPoolExecutor(max_workers=_HASH_WORKERS) as executor:
+            digests = dict(
+                    zip(suspects, executor.map(_hash_or_none, suspects))
+            )
+        for path_str, digest in digests.items():
+            entry = self._entries[path_str]
+            if digest == entry[2]:
+                entry[1] = stats[path_str].st_mtime_ns
+                unchanged.append(path_str)
+        self._dirty |= bool(suspects) or (len(self._entries) != len(stats))
+
+        self._entries = {
+                path_str: entry
+                for path_str, entry in self._entries.items()
+                if path_str in stats
+        }
+        results = {
+                path_str: self._entries[path_str][3]
+                for path_str in unchanged
+        }
+        changed = [
+                path_str for path_str in stats if path_str not in results
+        ]
+        for done, path_str in enumerate(changed):
+            if progress is not None:
+                progress(done, len(changed))
+            try:
+                results[path_str] = self._parse(
+                        path_str, stats[path_str], parse
+                )
+            except OSError:
+                self._entries.pop(path_str, None)
+                self._dirty = True
+        return results
@@ -0,0 +1,123 @@
+import atexit
+import itertools
+import multiprocessing
+from multiprocessing.connection import Connection
+from multiprocessing.process import BaseProcess
+import threading
+from typing import Any
+from typing import Callable
+
+from progirl.worker.protocol import OP_CANCEL
+from progirl.worker.protocol import OP_SHUTDOWN
+from progirl.worker.protocol import Request
+from progirl.worker.protocol import Response
+from progirl.worker.protocol import ResponseKind
+from progirl.worker.server import serve
+
+ResponseCallback = Callable[[Response], None]
+
+
+class IndexWorker:
+    """Lazily started process that owns bulk filesystem scans.
+
+    Callbacks are called from a reader thread, callers that need to touch
+    nvim must hand over to the event loop themselves (e.g. vim.async_call).
+    """
+    _process: BaseProcess | None
+    _conn: Connection | None
+    _callbacks: dict[int, ResponseCallback]
+
+    def __init__(self):
+        self._process = None
+        self._conn = None
+        self._callbacks = {}
+        self._lock = threading.Lock()
+        self._req_ids = itertools.count(1)
+
+    @property
+    def is_running(self) -> bool:
+        return self._process is not None and self._process.is_alive()
+
+    def _ensure_started(self) -> Connection:
+        if self.is_running and self._conn is not None:
+            return self._conn
+        context = multiprocessing.get_context("spawn")
+        conn, child_conn = context.Pipe()
+        process = context.Process(
+                target=serve,
+                args=(child_conn, ),
+                name="progirl-index-worker",
+                daemon=True
+        )
+        process.start()
+        child_conn.close()
+        self._process, self._conn = process, conn
+        threading.Thread(
+                target=self._read_responses, args=(conn, ), daemon=True
+        ).start()
+        return conn
+
+    def _read_responses(self, conn: Connection):
+        while True:
+            try:
+                response = conn.recv()
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                if response.kind is ResponseKind.PROGRESS:
+                    callback = self._callbacks.get(response.req_id)
+                else:
+                    callback = self._callbacks.pop(response.req_id, None)
+            if callback is not None:
+                callback(response)
+        with self._lock:
+            orphaned, self._callbacks = self._callbacks, {}
+        for req_id, callback in orphaned.items():
+            callback(
+                    Response(
+                            req_id, ResponseKind.ERROR, "index worker exited"
+                    )
+            )
+
+    def submit(
+            self, op: str, args: dict[str, Any], callback: ResponseCallback
+    ) -> int:
+        with self._lock:
+            conn = self._ensure_started()
+            req_id = next(self._req_ids)
+            self._callbacks[req_id] = callback
+            conn.send(Request(req_id, op, args))
+        return req_id
+
+    def cancel(self, req_id: int | None = None):
+        with self._lock:
+            if not self.is_running or self._conn is None:
+                return
+            req_ids = (
+                    list(self._callbacks) if req_id is None else [req_id]
+            )
+            for id_ in req_ids:
+                self._conn.send(Request(0, OP_CANCEL, {"req_id": id_}))
+
+    def shutdown(self):
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    self._conn.send(Request(0, OP_SHUTDOWN, {}))
+                except OSError:
+                    pass
+                self._conn.close()
+            if self._process is not None:
+                self._process.join(timeout=1)
+            self._process, self._conn = None, None
+
+
+_index_worker: IndexWorker | None = None
+
+
+def get_index_worker() -> IndexWorker:
+    global _index_worker
+    if _index_worker is None:
+        _index_worker = IndexWorker()
+        atexit.register(_index_worker.shutdown)
+    return _index_worker
@@ -0,0 +1,30 @@
+from enum import auto
+from enum import Enum
+from typing import Any
+from typing import NamedTuple
+
+OP_CANCEL = "cancel"
+OP_SHUTDOWN = "shutdown"
+
+
+class ResponseKind(Enum):
+    PROGRESS = auto()
+    RESULT = auto()
+    ERROR = auto()
+    CANCELLED = auto()
+
+
+class Request(NamedTuple):
+    req_id: int
+    op: str
+    args: dict[str, Any]
+
+
+class Response(NamedTuple):
+    req_id: int
+    kind: ResponseKind
+    payload: Any = None
+
+
+class JobCancelled(Exception):
+    pass
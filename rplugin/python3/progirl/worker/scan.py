@@ -0,0 +1,128 @@
+from functools import lru_cache
+import os
+import os.path as osp
+from typing import Any
+from typing import Callable
+from typing import Iterator
+
+from progirl.markdown import Link
+from progirl.markdown import LinkRefType
+from progirl.markdown import LinkTable
+from progirl.markdown import iter_links_from_lines
+from progirl.markdown import ref_targets_map_from_lines
+from progirl.path import resolve_path_with_context
+from progirl.uri import URI
+from progirl.uri import split_anchor
+
+_EXTERNAL_PROTOCOLS = ["http", "https", "mailto"]
+_LOCAL_PROTOCOLS = ["file", "local", ""]
+_TARGET_PATHS_CACHE_SIZE = 16384
+
+
+def iter_note_paths(notes_path: str, extension: str) -> Iterator[str]:
+    extension = "." + extension.lstrip(".")
+    dirs = [notes_path]
+    while dirs:
+        try:
+            entries = list(os.scandir(dirs.pop()))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                dirs.append(entry.path)
+            elif entry.name.endswith(extension):
+                yield entry.path
+
+
+def read_note_lines(path_str: str) -> list[str]:
+    with open(path_str, encoding="utf-8", errors="replace") as f:
+        return f.read().splitlines()
+
+
+def scan_ref_targets(path_str: str) -> dict[str, str]:
+    return ref_targets_map_from_lines(read_note_lines(path_str))
+
+
+def link_target_path(
+        target: str, note_dir: str, notes_path: str,
+        collections: dict[str, str]
+) -> str | None:
+    """Return the path a local or collection link target points to, without
+    resolving symlinks, or None for other protocols.
+
+    :param collections: collection id to notes path
+    """
+    uri = URI(target)
+    path_body, _ = split_anchor(uri.body)
+    if path_body == "":
+        return None
+    if uri.protocol in _LOCAL_PROTOCOLS:
+        context_root = notes_path
+    elif uri.protocol in collections:
+        context_root = collections[uri.protocol]
+    else:
+        return None
+    if path_body.startswith(("/", "~")):
+        # not relative to the note, one cache entry for every note
+        note_dir = ""
+    return _resolve_target_path(path_body, note_dir, context_root)
+
+
+@lru_cache(maxsize=_TARGET_PATHS_CACHE_SIZE)
+def _resolve_target_path(path_body: str, note_dir: str,
+                         context_root: str) -> str:
+    return resolve_path_with_context(
+            path_body,
+            context_pwd=note_dir or None,
+            context_root=context_root,
+            real=False
+    )
+
+
+def scan_link_targets(lines: list[str]) -> dict[str, Any]:
+    """Return the LinkTable columns of every link to a non external target,
+    ref links resolved to their ref target."""
+    ref_targets_map = ref_targets_map_from_lines(lines)
+    link_targets = LinkTable()
+    for line_num, link in iter_links_from_lines(lines):
+        if link.ref_type is LinkRefType.REF_TARGET:
+            continue
+        if link.ref_type is LinkRefType.REF_SOURCE:
+            target = ref_targets_map.get(link.target)
+            if target is None:
+                continue
+            link = Link(ref_source=link, ref_target=target)
+        if URI(link.target).protocol in _EXTERNAL_PROTOCOLS:
+            continue
+        link_targets.append(line_num, link)
+    return link_targets.to_columns()
+
+
+def find_broken_links(
+        path_str: str,
+        notes_path: str,
+        collections: dict[str, str],
+        link_targets: LinkTable | None = None,
+        exists: Callable[[str], bool] = osp.exists
+) -> list[tuple[int, int, str]]:
+    """Return (line_num, col, target) for every unresolvable link.
+
+    :param link_targets: the scan_link_targets of the note, read from
+        `path_str` if None
+    :param exists: the existence check, a memoized one for collection scans
+    """
+    if link_targets is None:
+        link_targets = LinkTable.from_columns(
+                scan_link_targets(read_note_lines(path_str))
+        )
+    note_dir = osp.dirname(path_str)
+    broken: list[tuple[int, int, str]] = []
+    for line_num, link in link_targets:
+        target_path = link_target_path(
+                link.target, note_dir, notes_path, collections
+        )
+        if (target_path is not None) and not exists(target_path):
+            broken.append((line_num, link.start, link.target))
+    return broken
@@ -0,0 +1,157 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from multiprocessing.connection import Connection
+import os.path as osp
+import threading
+import time
+import traceback
+from typing import Any
+from typing import Callable
+
+from progirl.markdown import LinkTable
+from progirl.markdown import ref_targets_map_from_lines
+from progirl.worker.changes import ScanCache
+from progirl.worker.protocol import JobCancelled
+from progirl.worker.protocol import OP_CANCEL
+from progirl.worker.protocol import OP_SHUTDOWN
+from progirl.worker.protocol import Request
+from progirl.worker.protocol import Response
+from progirl.worker.protocol import ResponseKind
+from progirl.worker.scan import find_broken_links
+from progirl.worker.scan import iter_note_paths
+from progirl.worker.scan import scan_link_targets
+
+_PROGRESS_INTERVAL = 0.2
+
+ProgressCallback = Callable[[int, int], None]
+
+
+def _scan_cache(args: dict[str, Any], name: str) -> ScanCache:
+    """Return the scan cache `name` of the "cache_dir" arg, an in memory one
+    without it."""
+    cache_dir = args.get("cache_dir")
+    return ScanCache(
+            osp.join(cache_dir, f"scan_{name}.json") if cache_dir else None
+    )
+
+
+def _op_scan_ref_targets(
+        args: dict[str, Any], progress: ProgressCallback
+) -> dict[str, dict[str, str]]:
+    paths = iter_note_paths(args["notes_path"], args["extension"])
+    scan_cache = _scan_cache(args, "ref_targets")
+    ref_maps = scan_cache.scan(paths, ref_targets_map_from_lines, progress)
+    scan_cache.save()
+    return ref_maps
+
+
+def _op_check_links(
+        args: dict[str, Any], progress: ProgressCallback
+) -> list[tuple[str, int, int, str]]:
+    notes_path = args["notes_path"]
+    collections = args.get("collections", {})
+    paths = iter_note_paths(notes_path, args["extension"])
+    scan_cache = _scan_cache(args, "link_targets")
+    link_targets = scan_cache.scan(paths, scan_link_targets, progress)
+    scan_cache.save()
+    broken: list[tuple[str, int, int, str]] = []
+    # Notes share targets, each one is checked once per scan.
+    exists = lru_cache(maxsize=None)(osp.exists)
+    for path_str in sorted(link_targets):
+        broken_links = find_broken_links(
+                path_str, notes_path, collections,
+                LinkTable.from_columns(link_targets[path_str]), exists
+        )
+        broken.extend((path_str, *link) for link in broken_links)
+    return broken
+
+
+_OPS: dict[str, Callable[[dict[str, Any], ProgressCallback], Any]] = {
+        "scan_ref_targets": _op_scan_ref_targets,
+        "check_links": _op_check_links,
+}
+
+
+class _Server:
+    _conn: Connection
+    _send_lock: threading.Lock
+    _cancelled: dict[int, threading.Event]
+
+    def __init__(self, conn: Connection):
+        self._conn = conn
+        self._send_lock = threading.Lock()
+        self._cancelled = {}
+
+    def _send(self, response: Response):
+        with self._send_lock:
+            self._conn.send(response)
+
+    def _make_progress(self, request: Request) -> ProgressCallback:
+        cancelled = self._cancelled[request.req_id]
+        last_sent = 0.0
+
+        def progress(done: int, total: int):
+            nonlocal last_sent
+            if cancelled.is_set():
+                raise JobCancelled()
+            now = time.monotonic()
+            if now - last_sent >= _PROGRESS_INTERVAL:
+                last_sent = now
+                self._send(
+                        Response(
+                                request.req_id, ResponseKind.PROGRESS,
+                                (done, total)
+                        )
+                )
+
+        return progress
+
+    def _run(self, request: Request):
+        try:
+            op = _OPS[request.op]
+            result = op(request.args, self._make_progress(request))
+        except JobCancelled:
+            response = Response(request.req_id, ResponseKind.CANCELLED)
+        except Exception:
+            response = Response(
+                    request.req_id, ResponseKind.ERROR, traceback.format_exc()
+            )
+        else:
+            response = Response(request.req_id, ResponseKind.RESULT, result)
+        finally:
+            self._cancelled.pop(request.req_id, None)
+        self._send(response)
+
+    def serve(self):
+        # Jobs run one at a time on a separate thread so that the main loop
+        # keeps reading requests and can flag cancellations mid-job.
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            while True:
+                try:
+                    request = self._conn.recv()
+                except (EOFError, OSError):
+                    break
+                if request.op == OP_SHUTDOWN:
+                    break
+                if request.op == OP_CANCEL:
+                    event = self._cancelled.get(request.args["req_id"])
+                    if event is not None:
+                        event.set()
+                    continue
+                if request.op not in _OPS:
+                    self._send(
+                            Response(
+                                    request.req_id, ResponseKind.ERROR,
+                                    f"unknown operation: {request.op}"
+                            )
+                    )
+                    continue
+                self._cancelled[request.req_id] = threading.Event()
+                executor.submit(self._run, request)
+            # the job thread pops its event when it finishes
+            for event in list(self._cancelled.values()):
+                event.set()
+
+
+def serve(conn: Connection):
+    _Server(conn).serve()
@@ -0,0 +1,51 @@
+import pytest
+
+from progirl.pkbm import ArchiveError
+from progirl.pkbm import NoteArchive
+from progirl.pkbm import archive_note_dir
+from progirl.pkbm import load_config_from_vars
+from progirl.pkbm import pack_notes
+from progirl.pkbm.resolve import resolve_uri_in_collection
+from progirl.uri import URI
+
+
+@pytest.fixture
+def archive_path(tmp_path):
+    (tmp_path / "src" / "sub").mkdir(parents=True)
+    (tmp_path / "src" / "sub" / "a.md").write_text("# a\n[b](b.md)\n")
+    (tmp_path / "src" / "sub" / "b.md").write_text("b\n")
+    (tmp_path / "src" / "c.md").write_text("c\n")
+    archive_path = tmp_path / "notes.pkba"
+    pack_notes(str(tmp_path / "src"), ".md", str(archive_path))
+    return archive_path
+
+
+def test_relative_links_resolve_from_the_note_dir(tmp_path, archive_path):
+    config = load_config_from_vars({
+            "progirl_collections": [{
+                    "name": "ar",
+                    "path": str(tmp_path),
+                    "archive": "/" + archive_path.name
+            }]
+    })
+    collection = config.collections["pkb-ar"]
+    context_pwd = archive_note_dir("pkb-ar://sub/a.md")
+    assert context_pwd == "pkb-ar://sub"
+    assert resolve_uri_in_collection(
+            URI("b.md"), collection, context_pwd
+    ) == "pkb-ar://sub/b.md"
+    assert resolve_uri_in_collection(
+            URI("../c.md"), collection, context_pwd
+    ) == "pkb-ar://c.md"
+    assert resolve_uri_in_collection(
+            URI("/c.md"), collection, context_pwd
+    ) == "pkb-ar://c.md"
+
+
+@pytest.mark.parametrize("size", [0, 10, -5])
+def test_broken_archives_raise_archive_error(tmp_path, archive_path, size):
+    data = archive_path.read_bytes()
+    broken_path = tmp_path / "broken.pkba"
+    broken_path.write_bytes(data[:size])
+    with pytest.raises(ArchiveError):
+        NoteArchive(str(broken_path))
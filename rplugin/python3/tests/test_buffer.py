@@ -0,0 +1,33 @@
+import pytest
+
+from progirl.buffer import iter_buffer_lines
+
+
+class _Api:
+
+    def __init__(self, lines: list[str]):
+        self._lines = lines
+
+    def line_count(self) -> int:
+        return len(self._lines)
+
+    def get_lines(self, first: int, last: int, strict: bool) -> list[str]:
+        return self._lines[first:last]
+
+
+class _Buffer:
+
+    def __init__(self, lines: list[str]):
+        self.api = _Api(lines)
+
+
+@pytest.mark.parametrize("end", [None, 100, 200])
+@pytest.mark.parametrize("reverse", [False, True])
+def test_end_past_the_last_line(end, reverse):
+    buffer = _Buffer([str(n) for n in range(100)])
+    line_nums = [
+            line_num
+            for line_num, _ in iter_buffer_lines(buffer, 10, end, reverse)
+    ]
+    expected = list(range(10, 100))
+    assert line_nums == (expected[::-1] if reverse else expected)
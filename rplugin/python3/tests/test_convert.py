@@ -0,0 +1,29 @@
+from progirl.markdown.convert import inline_links
+from progirl.markdown.convert import refify_links
+from progirl.markdown.links import ref_targets_map_from_lines
+
+FENCED = [
+        "see [a](x.md)",
+        "```",
+        "[9]: not-a-target",
+        "[b](in-code.md)",
+        "```",
+]
+
+
+def test_ref_targets_map_skips_fenced_lines():
+    lines = FENCED + ["[1]: y.md"]
+    assert ref_targets_map_from_lines(lines) == {"1": "y.md"}
+
+
+def test_refify_keeps_fenced_lines():
+    lines = refify_links(FENCED)
+    assert lines[1:5] == FENCED[1:5]
+    assert lines[0] == "see [a][0]"
+    assert "[0]: x.md" in lines
+    assert not any(line.endswith("]: not-a-target") for line in lines[5:])
+
+
+def test_inline_keeps_fenced_lines():
+    lines = ["see [a][9]", "```", "[9]: not-a-target", "```"]
+    assert inline_links(lines) == lines
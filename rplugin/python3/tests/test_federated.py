@@ -0,0 +1,47 @@
+from progirl.pkbm import load_config_from_vars
+from progirl.pkbm import resolve_uri_federated
+from progirl.pkbm.archive import ArchiveError
+from progirl.pkbm.exceptions import CollectionError
+from progirl.pkbm.federated import find_notes_federated
+from progirl.uri import URI
+from progirl.utils import AttrDict
+
+
+def _find(collection: AttrDict, query: str, limit: int) -> list[str]:
+    if collection._id == "pkb-archive":
+        raise ArchiveError("not a note archive: x")
+    if collection._id == "pkb-gone":
+        raise CollectionError("gone")
+    return [f"/{collection._id}/{query}.md"]
+
+
+def test_broken_collections_are_skipped():
+    collections = [
+            AttrDict({"_id": c_id})
+            for c_id in ("pkb-archive", "pkb-a", "pkb-gone", "pkb-b")
+    ]
+    assert find_notes_federated("x", collections, _find) == [
+            ("pkb-a", "/pkb-a/x.md"),
+            ("pkb-b", "/pkb-b/x.md"),
+    ]
+
+
+def test_relative_bodies_resolve_in_every_collection(tmp_path, monkeypatch):
+    config = load_config_from_vars({
+            "progirl_collections": [{
+                    "name": name,
+                    "path": str(tmp_path / name)
+            } for name in ("a", "b")]
+    })
+    (tmp_path / "a" / "notes").mkdir(parents=True)
+    (tmp_path / "b" / "notes" / "sub").mkdir(parents=True)
+    (tmp_path / "b" / "notes" / "sub" / "foo.md").write_text("")
+    # not where nvim was started
+    monkeypatch.chdir(tmp_path)
+    collections = [config.collections["pkb-a"], config.collections["pkb-b"]]
+    found = str(tmp_path / "b" / "notes" / "sub" / "foo.md")
+    for body in ("sub/foo.md", "/sub/foo.md"):
+        assert resolve_uri_federated(
+                URI("pkb-*", body), collections,
+                str(tmp_path / "a" / "notes")
+        ) == found
@@ -0,0 +1,26 @@
+from progirl.pkbm import load_config_from_vars
+from progirl.pkbm.id_index import AutoIdIndex
+from progirl.pkbm.id_index import _executor
+
+
+def test_a_miss_rebuilds_in_the_background(tmp_path):
+    config = load_config_from_vars(
+            {"progirl_collections": [{
+                    "name": "a",
+                    "path": str(tmp_path)
+            }]}
+    )
+    notes_path = tmp_path / "notes" / "sub"
+    notes_path.mkdir(parents=True)
+    (notes_path / ".next_id").write_text("1a2c")
+    (notes_path / "1a2b-title.md").write_text("")
+    index = AutoIdIndex(config.collections["pkb-a"])
+    assert index.lookup("1a2b") is None
+    index.add("1a2c", str(notes_path / "1a2c-new.md"))
+    (notes_path / "1a2c-new.md").write_text("")
+    # wait for the rebuild the miss started
+    _executor.submit(lambda: None).result()
+    assert index.lookup("1a2b") == str(notes_path / "1a2b-title.md")
+    # added while the rebuild walked, kept by it
+    assert index.lookup("1a2c") == str(notes_path / "1a2c-new.md")
+    assert (tmp_path / ".pkb" / "id_index.json").exists()
@@ -0,0 +1,61 @@
+from progirl.pkbm import LinkResolver
+from progirl.pkbm import load_config_from_vars
+from progirl.pkbm.key import _INTERNED_KEYS_SIZE
+from progirl.pkbm.key import _intern
+from progirl.pkbm.key import link_cache_key
+from progirl.pkbm.key import link_resolver
+from progirl.pkbm.key import note_key
+from progirl.pkbm.key import note_key_of_uri
+from progirl.uri import URI
+
+
+def test_interned_keys_are_bounded():
+    _intern.cache_clear()
+    first = note_key("pkb-a", "x.md")
+    assert note_key("pkb-a", "./x.md") is first
+    for n in range(2 * _INTERNED_KEYS_SIZE):
+        note_key("pkb-a", f"{n}.md")
+    assert _intern.cache_info().currsize == _INTERNED_KEYS_SIZE
+    assert note_key("pkb-a", "x.md") == first
+
+
+def test_relative_links_need_the_note_dir(tmp_path):
+    load_config_from_vars(
+            {"progirl_collections": [{
+                    "name": "a",
+                    "path": str(tmp_path)
+            }]}
+    )
+    note_dir = str(tmp_path / "notes" / "sub")
+    assert note_key_of_uri(URI("b.md"), "pkb-a") is None
+    assert note_key_of_uri(URI("b.md"), "pkb-a",
+                           note_dir) == note_key("pkb-a", "sub/b.md")
+
+
+def test_keys_follow_the_resolver(tmp_path):
+    load_config_from_vars(
+            {"progirl_collections": [{
+                    "name": "a",
+                    "path": str(tmp_path)
+            }]}
+    )
+    notes_path = str(tmp_path / "notes")
+    relative, rooted = URI("sub/x.md"), URI("/sub/x.md")
+    pkbm = link_resolver(["progirl.pkbm.resolve.resolve_uri_as_path"])
+    assert pkbm is LinkResolver.PKBM
+    assert link_cache_key(relative, "pkb-a", notes_path,
+                          pkbm) == note_key("pkb-a", "sub/x.md")
+    assert link_cache_key(rooted, "pkb-a", notes_path,
+                          pkbm) == note_key("pkb-a", "sub/x.md")
+    # goto's default resolver takes "/sub/x.md" as a filesystem path
+    default = link_resolver([])
+    assert link_cache_key(relative, "pkb-a", notes_path,
+                          default) == note_key("pkb-a", "sub/x.md")
+    assert link_cache_key(rooted, "pkb-a", notes_path,
+                          default) == (notes_path, "/sub/x.md")
+    assert note_key_of_uri(URI("pkb-a:x.md"), "pkb-a", notes_path,
+                           default) is None
+    # links that another resolver may resolve get no note key
+    other = link_resolver(["my.resolver"])
+    assert link_cache_key(relative, "pkb-a", notes_path,
+                          other) == (notes_path, "sub/x.md")
@@ -0,0 +1,116 @@
+"""Fuzz and worst-case timing tests of the link patterns and parsing."""
+import random
+import time
+
+import pytest
+
+from progirl.markdown.links import _LINK_PATTERNS
+from progirl.markdown.links import _MAX_LINKS_PER_LINE
+from progirl.markdown.links import get_line_links
+from progirl.markdown.links import get_links_near
+
+_SOUP_TOKENS = [
+        "[", "]", "(", ")", "<", ">", "[]", "()", "<>", "][", ")(", "](",
+        "]:", ": ", "a", "1", " ", "\t", "http://", "https://", "x.md"
+]
+# Repeated units that make backtracking patterns quadratic.
+_WORST_CASES = [
+        "[", "]", "[a", "[1", "[ab", "[a](", "[a][", "](", "][", "[a]: ",
+        "<http://", "<https://a", "http://", "(", "<", "a"
+]
+_LENGTHS = [10_000, 100_000, 1_000_000]
+# A linear scan grows 10x per step, a quadratic one 100x. The margin
+# absorbs timer noise, and a quadratic scan fails at the 100k step
+# instead of hanging at 1M.
+_MAX_STEP_GROWTH = 40
+
+
+def _soup(rng: random.Random, length: int) -> str:
+    parts = []
+    size = 0
+    while size < length:
+        token = rng.choice(_SOUP_TOKENS)
+        parts.append(token)
+        size += len(token)
+    return "".join(parts)[:length]
+
+
+def _best_time(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _assert_linear(make_line, parse):
+    last_time = None
+    for length in _LENGTHS:
+        line = make_line(length)
+        line_time = _best_time(lambda: parse(line),
+                               3 if length < _LENGTHS[-1] else 1)
+        if last_time is not None:
+            assert line_time <= max(last_time, 1e-4) * _MAX_STEP_GROWTH, (
+                    f"{length} chars took {line_time:.4f}s, "
+                    f"{length // 10} took {last_time:.4f}s"
+            )
+        last_time = line_time
+
+
+def _check_links(line: str, links):
+    last_end = 0
+    for link in links:
+        assert last_end <= link.start < link.end <= len(line)
+        assert link.start <= link.target_start <= link.target_end
+        assert link.target_end <= link.end
+        last_end = link.end
+    assert len(links) <= _MAX_LINKS_PER_LINE
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_fuzz_soup(seed):
+    rng = random.Random(seed)
+    for length in (10, 100, 1_000, 20_000):
+        line = _soup(rng, length)
+        for link_pattern in _LINK_PATTERNS:
+            for link_match in link_pattern.pattern.finditer(line):
+                assert line[link_match.start():link_match.end()] != ""
+        _check_links(line, get_line_links(line))
+        col = rng.randrange(len(line))
+        _check_links(line, get_links_near(line, col))
+
+
+@pytest.mark.parametrize("unit", _WORST_CASES)
+@pytest.mark.parametrize(
+        "link_pattern", _LINK_PATTERNS,
+        ids=[link_pattern.pattern.pattern for link_pattern in _LINK_PATTERNS]
+)
+def test_patterns_linear(link_pattern, unit):
+    _assert_linear(
+            lambda length: (unit * (length // len(unit) + 1))[:length],
+            lambda line: sum(1 for _ in link_pattern.pattern.finditer(line))
+    )
+
+
+@pytest.mark.parametrize("unit", _WORST_CASES)
+def test_get_line_links_linear(unit):
+    # unique lines, the short line parse is memoized by content
+    counter = iter(range(1_000_000))
+    _assert_linear(
+            lambda length: (unit * (length // len(unit) + 1))[:length],
+            lambda line: get_line_links(f"{next(counter)} {line}")
+    )
+
+
+def test_soup_linear():
+    rng = random.Random(0)
+    _assert_linear(lambda length: _soup(rng, length), get_line_links)
+
+
+@pytest.mark.parametrize("length", [4_000, 100_000])
+def test_links_per_line_cap(length):
+    line = ("[a](b) " * (length // 7 + 1))[:length]
+    links = get_line_links(line)
+    assert len(links) == _MAX_LINKS_PER_LINE
+    _check_links(line, links)
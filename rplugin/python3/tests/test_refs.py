@@ -0,0 +1,61 @@
+import random
+
+from progirl.highlight.refs import RefTargetLines
+from progirl.markdown.links import ref_targets_map_from_lines
+
+
+class _Api:
+
+    def __init__(self, lines: list[str]):
+        self.lines = lines
+        self.fetched = 0
+
+    def get_lines(self, first: int, last: int, strict: bool) -> list[str]:
+        self.fetched += last - first
+        return self.lines[first:last]
+
+
+class _Buffer:
+
+    def __init__(self, lines: list[str]):
+        self.api = _Api(lines)
+
+    def __getitem__(self, key: slice) -> list[str]:
+        self.api.fetched += len(self.api.lines)
+        return self.api.lines[key]
+
+
+def _edit(buffer: _Buffer, refs: RefTargetLines, first: int, last: int,
+          new_lines: list[str]):
+    buffer.api.lines[first:last] = new_lines
+    refs.mark_changed(first, last, first + len(new_lines))
+
+
+def test_only_changed_lines_are_fetched():
+    buffer = _Buffer([f"[{n}]: t{n}.md" for n in range(1000)])
+    refs = RefTargetLines()
+    assert refs.get_map(buffer)["999"] == "t999.md"
+    buffer.api.fetched = 0
+    _edit(buffer, refs, 10, 11, ["[10]: new.md"])
+    _edit(buffer, refs, 900, 900, ["[x]: x.md"])
+    ref_targets_map = refs.get_map(buffer)
+    assert ref_targets_map["10"] == "new.md"
+    assert ref_targets_map["x"] == "x.md"
+    assert buffer.api.fetched == 2
+
+
+def test_random_edits_match_a_full_parse():
+    choices = ["text", "```", "[a]: a.md", "[b]: b.md", "[a]: c.md", ""]
+    for seed in range(50):
+        rnd = random.Random(seed)
+        buffer = _Buffer([rnd.choice(choices) for _ in range(30)])
+        refs = RefTargetLines()
+        for _ in range(20):
+            first = rnd.randrange(len(buffer.api.lines) + 1)
+            last = min(first + rnd.randrange(3), len(buffer.api.lines))
+            new_lines = [rnd.choice(choices) for _ in range(rnd.randrange(3))]
+            _edit(buffer, refs, first, last, new_lines)
+            if rnd.random() < 0.5:
+                assert refs.get_map(buffer) == ref_targets_map_from_lines(
+                        buffer.api.lines
+                ), seed
@@ -0,0 +1,60 @@
+import os
+import stat
+
+import pytest
+
+from progirl.path import storage
+from progirl.path.storage import durable_batch
+from progirl.path.storage import write_atomic
+
+
+@pytest.fixture
+def events(monkeypatch):
+    events = []
+    real_fsync = os.fsync
+    real_replace = os.replace
+
+    def fsync(fd):
+        events.append(("fsync", stat.S_ISDIR(os.fstat(fd).st_mode)))
+        real_fsync(fd)
+
+    def replace(src, dst):
+        events.append(("replace", dst))
+        real_replace(src, dst)
+
+    monkeypatch.setattr(storage.os, "fsync", fsync)
+    monkeypatch.setattr(storage.os, "replace", replace)
+    return events
+
+
+def test_batch_syncs_data_before_rename(tmp_path, events):
+    path_str = str(tmp_path / "note.md")
+    with durable_batch():
+        write_atomic(path_str, "x", "batch")
+        # the data, not the directory, is synced before the rename
+        assert events == [("fsync", False), ("replace", path_str)]
+    assert events[-1] == ("fsync", True)
+    with open(path_str) as f:
+        assert f.read() == "x"
+
+
+def test_exclusive_does_not_replace(tmp_path):
+    path_str = str(tmp_path / "note.md")
+    write_atomic(path_str, "x", "none")
+    with pytest.raises(FileExistsError):
+        write_atomic(path_str, "y", "none", exclusive=True)
+    with open(path_str) as f:
+        assert f.read() == "x"
+    assert os.listdir(tmp_path) == ["note.md"]
+
+
+@pytest.mark.parametrize("umask", [0o022, 0o077])
+def test_files_get_the_umask_mode(tmp_path, umask):
+    old_umask = os.umask(umask)
+    try:
+        write_atomic(str(tmp_path / "note.md"), "x", "none")
+    finally:
+        os.umask(old_umask)
+    mode = stat.S_IMODE(os.stat(tmp_path / "note.md").st_mode)
+    assert mode == 0o666 & ~umask
+    assert os.listdir(tmp_path) == ["note.md"]